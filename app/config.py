@@ -18,9 +18,25 @@ FLASK_HOST = os.getenv('FLASK_HOST', '0.0.0.0')
 TEMP_IMAGES_DIR = os.path.join(os.path.dirname(__file__), '..', 'temp_processed_images')
 os.makedirs(TEMP_IMAGES_DIR, exist_ok=True)
 
+# Status das tarefas (quando não usa Redis) - SQLite em modo WAL, compartilhado entre os workers
+TASKS_DB_PATH = os.getenv('TASKS_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'tasks_db.sqlite3'))
+
 BASE_IMAGE_URL = '/processed_images'
 MAX_TEMP_IMAGE_AGE = timedelta(hours=24)  # Imagens expiram após 24h
 
+# Entrega das imagens: 'flask' (o worker envia o arquivo) ou 'nginx' (o Flask só
+# autoriza e resolve o arquivo; o nginx envia via X-Accel-Redirect, com sendfile,
+# Range e ETag - ver a location interna em nginx-config.conf)
+IMAGE_DELIVERY = os.getenv('IMAGE_DELIVERY', 'flask').lower()
+X_ACCEL_PREFIX = os.getenv('X_ACCEL_PREFIX', '/_protected_images/')  # location internal apontando para TEMP_IMAGES_DIR (caminho relativo ao diretório)
+
+# Resultados (app/utils/result_store.py): TEMP_IMAGES_DIR/<xx>/{arquivo}, com xx
+# vindo do hash do task_id. Cada resultado pode ser baixado várias vezes até
+# expirar (MAX_TEMP_IMAGE_AGE desde a gravação); acima do limite em disco, os
+# acessados há mais tempo saem antes (LRU). Uma thread por processo varre a cada SWEEP_INTERVAL segundos
+RESULT_STORE_MAX_BYTES = int(os.getenv('RESULT_STORE_MAX_MB', 2048)) * 1024 * 1024
+SWEEP_INTERVAL = int(os.getenv('SWEEP_INTERVAL', 60))
+
 # ============== Redis/RQ (Para Fila de Tarefas) ==============
 REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
@@ -28,6 +44,40 @@ REDIS_DB = int(os.getenv('REDIS_DB', 0))
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', None)
 
 USE_REDIS = os.getenv('USE_REDIS', 'False').lower() == 'true'
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 32))  # pool por processo (threads do gunicorn + pub/sub)
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', 5))  # espera por uma conexão livre / para conectar (segundos)
+
+# 'thread': renderiza no próprio worker web (pool de threads)
+# 'rq': enfileira no Redis e renderiza em workers separados (python worker.py)
+TASK_QUEUE_BACKEND = os.getenv('TASK_QUEUE_BACKEND', 'thread').lower()
+RQ_QUEUE_NAME = os.getenv('RQ_QUEUE_NAME', 'image-processing')
+RQ_MAX_QUEUED_JOBS = int(os.getenv('RQ_MAX_QUEUED_JOBS', 500))  # acima disso -> 429
+
+# ============== Avisos de Status (long-poll / SSE) ==============
+# GET /api/v1/status/<id>?wait=N segura a resposta até o status mudar; /events é um stream SSE.
+# Cada espera ocupa uma thread do worker: rode o gunicorn com --threads (gthread)
+STATUS_MAX_WAIT = float(os.getenv('STATUS_MAX_WAIT', 25))  # teto do ?wait= (abaixo do --timeout do gunicorn e do proxy)
+STATUS_RECHECK_INTERVAL = float(os.getenv('STATUS_RECHECK_INTERVAL', 1.0))  # releitura do store durante a espera (avisos de outros workers sem Redis)
+STATUS_STREAM_MAX = int(os.getenv('STATUS_STREAM_MAX', 300))  # duração máxima de um stream /events (segundos)
+STATUS_STREAM_KEEPALIVE = float(os.getenv('STATUS_STREAM_KEEPALIVE', 15))  # comentário SSE para o proxy não fechar a conexão
+
+# ============== Webhooks de Conclusão (callback_url) ==============
+# Avisos pendentes numa outbox em SQLite (sobrevive a restarts), entregues por uma thread por processo
+WEBHOOK_DB_PATH = os.getenv('WEBHOOK_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'webhooks.sqlite3'))
+WEBHOOK_TIMEOUT = float(os.getenv('WEBHOOK_TIMEOUT', 10))  # segundos por POST
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', 8))  # depois disso o aviso é descartado (o status continua consultável)
+WEBHOOK_RETRY_BASE = float(os.getenv('WEBHOOK_RETRY_BASE', 5))  # espera da 1ª nova tentativa; dobra a cada falha
+WEBHOOK_RETRY_MAX = float(os.getenv('WEBHOOK_RETRY_MAX', 600))  # teto da espera entre tentativas
+WEBHOOK_BATCH_WINDOW = float(os.getenv('WEBHOOK_BATCH_WINDOW', 0.5))  # espera para juntar avisos da mesma URL num POST
+WEBHOOK_MAX_BATCH = int(os.getenv('WEBHOOK_MAX_BATCH', 50))  # avisos por POST
+WEBHOOK_THREADS = int(os.getenv('WEBHOOK_THREADS', 4))  # POSTs em paralelo por processo
+WEBHOOK_POLL_INTERVAL = float(os.getenv('WEBHOOK_POLL_INTERVAL', 2.0))  # releitura da outbox (novas tentativas, avisos de outros processos)
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # se definido, assina o corpo (header X-Webhook-Signature: sha256=<hmac>)
+WEBHOOK_ALLOWED_HOSTS = [h.strip() for h in os.getenv('WEBHOOK_ALLOWED_HOSTS', '').split(',') if h.strip()]  # vazio = qualquer host
+# Hosts e redes (CIDR) internos aceitos como callback_url; fora desta lista, URLs que
+# resolvem para endereço privado, loopback, link-local, multicast ou reservado são
+# recusadas (SSRF). Ex.: WEBHOOK_PRIVATE_ALLOWLIST=hooks.interno,10.20.0.0/16
+WEBHOOK_PRIVATE_ALLOWLIST = [h.strip() for h in os.getenv('WEBHOOK_PRIVATE_ALLOWLIST', '').split(',') if h.strip()]
 
 # ============== Fontes TrueType ==============
 # Coloque arquivos .ttf no diretório fonts/ ou especifique o caminho completo
@@ -40,6 +90,9 @@ FONT_DESCRIPTION_SIZE = int(os.getenv('FONT_DESCRIPTION_SIZE', 25))  # Reduzido
 FONT_REF_SIZE_PROMO = int(os.getenv('FONT_REF_SIZE_PROMO', 21))  # Reduzido -5% (22 → 21)
 FONT_PRICE_SIZE = int(os.getenv('FONT_PRICE_SIZE', 28))  # Reduzido -5% (29 → 28)
 FONT_ESGOTADO_SIZE = int(os.getenv('FONT_ESGOTADO_SIZE', 36))  # Reduzido -5% (38 → 36)
+FONT_CACHE_SIZE = int(os.getenv('FONT_CACHE_SIZE', 64))  # fontes (arquivo, tamanho) mantidas em memória por worker
+TEXT_BBOX_CACHE_SIZE = int(os.getenv('TEXT_BBOX_CACHE_SIZE', 4096))  # medidas (fonte, texto) memoizadas por worker
+TEXT_RASTER_CACHE_SIZE = int(os.getenv('TEXT_RASTER_CACHE_SIZE', 512))  # linhas de texto rasterizadas (~10KB cada) por worker; 0 desliga
 
 # Sombra do texto (para melhor legibilidade em fundos coloridos)
 TEXT_SHADOW_OFFSET = 2  # pixels de deslocamento da sombra
@@ -60,8 +113,19 @@ COLOR_TEXT_WHITE = (255, 255, 255)         # Branco
 COLOR_ESGOTADO_BACKGROUND = (255, 0, 0, 180)  # Vermelho para faixa de esgotado
 
 # ============== Qualidade de Imagem ==============
-OUTPUT_IMAGE_QUALITY = int(os.getenv('OUTPUT_IMAGE_QUALITY', 90))
-OUTPUT_IMAGE_FORMAT = 'JPEG'
+OUTPUT_IMAGE_QUALITY = int(os.getenv('OUTPUT_IMAGE_QUALITY', 90))  # JPEG
+# Formato padrão das saídas: jpeg | webp | avif (layout_config.formatoSaida sobrescreve)
+OUTPUT_IMAGE_FORMAT = os.getenv('OUTPUT_IMAGE_FORMAT', 'jpeg').lower()
+JPEG_OPTIMIZE = os.getenv('JPEG_OPTIMIZE', 'True').lower() == 'true'  # tabelas Huffman otimizadas: sem perda, ~5-10% menor
+JPEG_PROGRESSIVE = os.getenv('JPEG_PROGRESSIVE', 'False').lower() == 'true'  # carrega em passadas (aparece antes em rede lenta)
+JPEG_SUBSAMPLING = os.getenv('JPEG_SUBSAMPLING', '')  # '4:4:4', '4:2:2', '4:2:0' ou vazio (padrão do Pillow)
+WEBP_QUALITY = int(os.getenv('WEBP_QUALITY', 80))
+WEBP_METHOD = int(os.getenv('WEBP_METHOD', 4))  # 0 (rápido) a 6 (menor arquivo)
+AVIF_QUALITY = int(os.getenv('AVIF_QUALITY', 60))
+AVIF_SPEED = int(os.getenv('AVIF_SPEED', 8))  # 0 (lento, menor arquivo) a 9 (rápido) - encoder aom
+# /processed_images escolhe WebP/AVIF pelo header Accept quando o arquivo salvo é JPEG
+FORMAT_NEGOTIATION = os.getenv('FORMAT_NEGOTIATION', 'True').lower() == 'true'
+SAVE_DEBUG_IMAGES = os.getenv('SAVE_DEBUG_IMAGES', 'False').lower() == 'true'  # grava DEBUG_{task_id}.jpg (qualidade 95) no modo duplo
 
 # ============== Watermark ==============
 WATERMARK_WIDTH_PERCENT = float(os.getenv('WATERMARK_WIDTH_PERCENT', 0.2))
@@ -82,9 +146,55 @@ CLEANUP_INTERVAL_MINUTES = int(os.getenv('CLEANUP_INTERVAL_MINUTES', 60))
 
 # ============== Limites e Timeouts ==============
 REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 30))  # segundos para download
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 10))  # conexões keep-alive por host (por worker)
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', 4))  # hosts distintos mantidos no pool
+DOWNLOAD_THREADS = int(os.getenv('DOWNLOAD_THREADS', 4))  # downloads em paralelo (original + tema)
+MAX_DOWNLOAD_BYTES = int(os.getenv('MAX_DOWNLOAD_MB', 40)) * 1024 * 1024  # download abortado acima disso
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 64_000_000))  # recusada antes de decodificar (48MP do iPhone cabe)
+DECODE_DRAFT = os.getenv('DECODE_DRAFT', 'True').lower() == 'true'  # JPEG decodificado direto em escala reduzida (DCT)
+
+# Perfis de redimensionamento: nome -> (filtro final, reducing_gap)
+# reducing_gap=None desliga o reduce() prévio (resultado idêntico ao LANCZOS puro)
+RESIZE_PROFILES = {
+    'qualidade': ('lanczos', None),  # comportamento original
+    'equilibrado': ('lanczos', 1.0),  # reduce() inteiro até o fator ficar < 2, LANCZOS no resto
+    'rapido': ('bilinear', 1.0),  # ~2x mais rápido, perde nitidez em texturas finas
+}
+RESIZE_PROFILE = os.getenv('RESIZE_PROFILE', 'qualidade')  # padrão; layout_config.perfilRedimensionamento sobrescreve
 TASK_TIMEOUT = int(os.getenv('TASK_TIMEOUT', 300))  # 5 minutos para processar a imagem
 MAX_RETRIES = int(os.getenv('MAX_RETRIES', 3))
 
+# ============== Pool de Renderização ==============
+# Valores por worker do gunicorn (com -w 4, o total é 4x isso)
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 2))  # threads renderizando em paralelo
+RENDER_QUEUE_SIZE = int(os.getenv('RENDER_QUEUE_SIZE', 16))  # tarefas aguardando; acima disso -> 429
+RENDER_RETRY_AFTER = int(os.getenv('RENDER_RETRY_AFTER', 5))  # Retry-After mínimo (segundos)
+ENCODE_THREADS = int(os.getenv('ENCODE_THREADS', 2))  # encodes em paralelo (as duas versões do modo duplo)
+# /api/v1/batches: tarefas de um lote no pool ao mesmo tempo (as avulsas entram na fila entre elas)
+MAX_BATCH_JOBS = int(os.getenv('MAX_BATCH_JOBS', 500))  # tarefas por lote
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', RENDER_WORKERS))
+BATCH_LEASE_SECONDS = int(os.getenv('BATCH_LEASE_SECONDS', 60))  # pool local: sem renovação nesse prazo, outro processo retoma o lote
+# /api/v1/render: espera até esse prazo e devolve a imagem na resposta; depois disso vira tarefa assíncrona
+SYNC_RENDER_DEADLINE = float(os.getenv('SYNC_RENDER_DEADLINE', 3.0))  # segundos (padrão; ?deadline_ms= ajusta)
+SYNC_RENDER_MAX_DEADLINE = float(os.getenv('SYNC_RENDER_MAX_DEADLINE', 10.0))  # teto do ?deadline_ms=
+
+# 'thread': decodifica/desenha/codifica na própria thread do pool (padrão)
+# 'process': download fica no worker web, o resto roda em processos de render (usa todos os núcleos)
+RENDER_MODE = os.getenv('RENDER_MODE', 'thread').lower()
+RENDER_PROCESSES = int(os.getenv('RENDER_PROCESSES', 0))  # 0 = os.cpu_count(); por worker do gunicorn
+
+# ============== Cache de Temas ==============
+# Overlays já decodificados/redimensionados, por worker (uma foto 1080x1440 RGBA ~ 6MB)
+THEME_CACHE_MAX_BYTES = int(os.getenv('THEME_CACHE_MAX_MB', 128)) * 1024 * 1024
+THEME_CACHE_TTL = int(os.getenv('THEME_CACHE_TTL', 300))  # segundos antes de revalidar na origem (ETag/Last-Modified)
+
+# ============== Cache de Downloads (disco) ==============
+# Imagens baixadas, compartilhadas entre os workers do gunicorn (respeita Cache-Control/Expires)
+DOWNLOAD_CACHE_ENABLED = os.getenv('DOWNLOAD_CACHE_ENABLED', 'True').lower() == 'true'
+DOWNLOAD_CACHE_DIR = os.getenv('DOWNLOAD_CACHE_DIR', os.path.join(os.path.dirname(__file__), '..', 'download_cache'))
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv('DOWNLOAD_CACHE_MAX_MB', 512)) * 1024 * 1024
+DOWNLOAD_CACHE_DEFAULT_TTL = int(os.getenv('DOWNLOAD_CACHE_DEFAULT_TTL', 300))  # sem Cache-Control/Expires na resposta
+
 # ============== CORS ==============
 ALLOW_CORS = os.getenv('ALLOW_CORS', 'True').lower() == 'true'
 CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
@@ -92,6 +202,8 @@ CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
 # ============== API ==============
 API_VERSION = '1.0.0'
 MAX_PRODUCTS_PER_REQUEST = int(os.getenv('MAX_PRODUCTS_PER_REQUEST', 10))
+MAX_RENDITIONS = int(os.getenv('MAX_RENDITIONS', 6))  # saídas extras (renditions) por requisição
+MAX_RENDITION_WIDTH = int(os.getenv('MAX_RENDITION_WIDTH', 2160))  # largura máxima de cada rendition
 
 def get_config_summary():
     """Retorna um resumo das configurações"""
@@ -100,7 +212,10 @@ def get_config_summary():
         'debug': DEBUG,
         'flask_port': FLASK_PORT,
         'redis_enabled': USE_REDIS,
+        'task_queue_backend': TASK_QUEUE_BACKEND,
+        'render_mode': RENDER_MODE,
         'temp_images_dir': TEMP_IMAGES_DIR,
+        'image_delivery': IMAGE_DELIVERY,
         'fonts_dir': FONTS_DIR,
         'logs_dir': LOGS_DIR,
         'api_version': API_VERSION,
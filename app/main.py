@@ -2,19 +2,31 @@
 Aplicação Flask Principal
 API REST para processamento de imagens com sobreescrita de dados
 """
+import json
 import os
+import queue
+import time
 import uuid
-import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
 from functools import wraps
-from flask import Flask, request, jsonify, send_from_directory, after_this_request
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 
 from app import config
 from app.utils.logger import get_logger
 from app.utils.validators import validate_process_image_payload, validate_product_data
-from app.utils.task_manager import task_manager
+from app.utils.encoders import ENCODERS, get_encoder, encoder_for_extension, is_available, negotiate, sniff, transcode
+from app.utils.task_manager import task_manager, FINAL_STATUSES, image_url, file_extension, public_status
 from app.utils.image_processor import image_processor
+from app.utils.render_pool import QueueFullError
+from app.utils.job_queue import submit_render_task, submit_batch, submit_sync_render, adopt_render, task_queue_stats, batch_keeper
+from app.utils.font_cache import font_cache
+from app.utils.text_metrics import text_measurer, text_raster_cache
+from app.utils.theme_cache import theme_cache
+from app.utils.download_cache import download_cache
+from app.utils.webhooks import webhook_dispatcher
+from app.utils.result_store import result_store
 
 logger = get_logger(__name__)
 
@@ -41,6 +53,36 @@ def error_handler(f):
             }), 500
     return decorated_function
 
+def _accepted_response(task_id, layout_config=None, renditions=None):
+    """Corpo 202 de uma tarefa assíncrona (URLs com a extensão do formato pedido)"""
+    # layout_config.formatoSaida já foi validado
+    extension = get_encoder((layout_config or {}).get('formatoSaida')).extension
+    response = {
+        "status": "processing",
+        "task_id": task_id,
+        "status_url": f"/api/v1/status/{task_id}",
+        "final_image_url": image_url(task_id, extension)
+    }
+    if renditions:
+        response["renditions"] = {r['name']: image_url(task_id, extension, r['name']) for r in renditions}
+    return response
+
+def _queue_full_response(e):
+    return jsonify({
+        "error": "Fila de processamento cheia",
+        "retry_after": e.retry_after
+    }), 429, {"Retry-After": str(e.retry_after)}
+
+def _job_args(data):
+    """Argumentos de process_image (depois do task_id) a partir de um payload já validado"""
+    products = data.get('products')
+    has_promo = any(p.get('PrecoPromocional', 0) > 0 for p in products)
+    return (
+        products, data.get('original_image_url'), data.get('theme_url') or data.get('watermark_url'), has_promo,
+        data.get('layout_config'), data.get('theme_config'), data.get('desconto_a_vista', 5),
+        data.get('renditions'), data.get('callback_url')
+    )
+
 # ==================== Rotas de Saúde ====================
 
 @app.route('/health', methods=['GET'])
@@ -87,7 +129,9 @@ def process_image_request():
             }
         ],
         "original_image_url": "https://...",
-        "theme_url": "https://..." (opcional)
+        "theme_url": "https://..." (opcional),
+        "renditions": [{"name": "stories", "width": 1080, "aspect": "9:16", "quality": 85}] (opcional),
+        "callback_url": "https://..." (opcional - POST ao terminar, ver app/utils/webhooks.py)
     }
     
     Response (202 Accepted):
@@ -95,8 +139,12 @@ def process_image_request():
         "status": "processing",
         "task_id": "uuid",
         "status_url": "/api/v1/status/{task_id}",
-        "final_image_url": "/processed_images/{task_id}.jpg"
+        "final_image_url": "/processed_images/{task_id}.jpg",
+        "renditions": {"stories": "/processed_images/{task_id}_stories.jpg"} (se pedidas)
     }
+    
+    Response (429 Too Many Requests): fila de renderização cheia,
+    header Retry-After com a espera sugerida em segundos
     """
     
     data = request.get_json()
@@ -120,6 +168,8 @@ def process_image_request():
     layout_config = data.get('layout_config')
     theme_config = data.get('theme_config')
     desconto_a_vista = data.get('desconto_a_vista', 5)  # Default 5%
+    renditions = data.get('renditions')  # Saídas extras (já validadas)
+    callback_url = data.get('callback_url')  # Webhook de conclusão (já validado)
     
     logger.info(f"🔍 DEBUG - theme_url no payload: {theme_url}")
     logger.info(f"🔍 DEBUG - watermark_url no payload: {watermark_url}")
@@ -150,6 +200,10 @@ def process_image_request():
     if theme_config:
         logger.info(f"   🎨 Tema: fonte={theme_config.get('fonte')}")
     logger.info(f"   💰 Desconto à vista: {desconto_a_vista}%")
+    if renditions:
+        logger.info(f"   🖼️ Renditions: {', '.join(r['name'] for r in renditions)}")
+    if callback_url:
+        logger.info(f"   📨 Webhook: {callback_url}")
     
     # Verificar se há produtos promocionais
     has_promo = any(p.get('PrecoPromocional', 0) > 0 for p in products)
@@ -161,22 +215,216 @@ def process_image_request():
         logger.warning(f"   ⚠️ NENHUM TEMA - Verifique payload.theme_url ou payload.watermark_url")
     logger.info(f"========================================")
     
-    # Iniciar processamento em background (thread)
+    # Enfileirar (pool de threads local ou fila RQ, conforme TASK_QUEUE_BACKEND)
     # Passar flag de processamento duplo se houver promoção + configs dinâmicas
-    thread = threading.Thread(
-        target=image_processor.process_image,
-        args=(task_id, products, original_image_url, theme_url, has_promo, layout_config, theme_config, desconto_a_vista),
-        daemon=True
-    )
-    thread.start()
+    try:
+        submit_render_task(
+            task_id, products, original_image_url, theme_url, has_promo, layout_config, theme_config, desconto_a_vista,
+            renditions, callback_url
+        )
+    except QueueFullError as e:
+        task_manager.delete_task_status(task_id)
+        return _queue_full_response(e)
+    
+    return jsonify(_accepted_response(task_id, layout_config, renditions)), 202
+
+@app.route('/api/v1/batches', methods=['POST'])
+@error_handler
+def create_batch_request():
+    """
+    Lote de tarefas numa requisição só (ex.: coleção nova de uma loja)
     
+    Método: POST
+    Content-Type: application/json
+    
+    Body:
+    {
+        "jobs": [{payload de /api/v1/process-image}, ...],
+        "defaults": {"theme_url": "https://...", "layout_config": {...}} (opcional - campos comuns,
+            o que vier no job tem precedência)
+    }
+    
+    Response (202 Accepted):
+    {
+        "batch_id": "uuid",
+        "status_url": "/api/v1/batches/{batch_id}",
+        "total": 200,
+        "tasks": [{corpo 202 de /api/v1/process-image}, ...] (na ordem de "jobs")
+    }
+    
+    Response (400): {"error": "...", "errors": [{"index": 3, "error": "..."}]} - nada é enfileirado
+    Response (429): fila RQ sem espaço para o lote inteiro
+    """
+    data = request.get_json(silent=True)
+    jobs = data.get('jobs') if isinstance(data, dict) else None
+    if not isinstance(jobs, list) or not jobs:
+        return jsonify({"error": "'jobs' deve ser uma lista não vazia"}), 400
+    if len(jobs) > config.MAX_BATCH_JOBS:
+        return jsonify({"error": f"Máximo de {config.MAX_BATCH_JOBS} tarefas por lote"}), 400
+    defaults = data.get('defaults') or {}
+    if not isinstance(defaults, dict):
+        return jsonify({"error": "'defaults' deve ser um objeto"}), 400
+    
+    payloads, errors = [], []
+    for index, job in enumerate(jobs):
+        payload = dict(defaults, **job) if isinstance(job, dict) else None
+        is_valid, error_message = validate_process_image_payload(payload) if payload else (False, "Tarefa deve ser um objeto")
+        if is_valid:
+            payloads.append(payload)
+        else:
+            errors.append({"index": index, "error": error_message})
+    if errors:
+        logger.warning(f"Lote recusado: {len(errors)} de {len(jobs)} tarefas inválidas")
+        return jsonify({"error": f"{len(errors)} de {len(jobs)} tarefas inválidas", "errors": errors[:50]}), 400
+    
+    batch_id = str(uuid.uuid4())
+    task_ids = [str(uuid.uuid4()) for _ in payloads]
+    task_manager.create_batch(batch_id, task_ids)
+    
+    # Tarefas do mesmo tema em sequência: o overlay redimensionado é reaproveitado do cache
+    theme_of = lambda payload: payload.get('theme_url') or payload.get('watermark_url') or ''
+    scheduled = sorted(zip(task_ids, payloads), key=lambda item: theme_of(item[1]))
+    try:
+        submit_batch(batch_id, [(task_id, _job_args(payload)) for task_id, payload in scheduled])
+    except QueueFullError as e:
+        task_manager.delete_batch(batch_id, task_ids)
+        return _queue_full_response(e)
+    
+    logger.info(f"📦 Lote {batch_id}: {len(task_ids)} tarefas, {len(set(map(theme_of, payloads)))} tema(s)")
     return jsonify({
-        "status": "processing",
-        "task_id": task_id,
-        "status_url": f"/api/v1/status/{task_id}",
-        "final_image_url": f"{config.BASE_IMAGE_URL}/{task_id}.jpg"
+        "batch_id": batch_id,
+        "status_url": f"/api/v1/batches/{batch_id}",
+        "total": len(task_ids),
+        "tasks": [
+            _accepted_response(task_id, payload.get('layout_config'), payload.get('renditions'))
+            for task_id, payload in zip(task_ids, payloads)
+        ]
     }), 202
 
+@app.route('/api/v1/batches/<batch_id>', methods=['GET'])
+@error_handler
+def get_batch_status(batch_id):
+    """
+    Progresso de um lote e o resultado de cada tarefa
+    
+    Response (200 OK):
+    {
+        "batch_id": "uuid",
+        "status": "PROCESSING|COMPLETED" (COMPLETED = nenhuma tarefa pendente, mesmo com falhas),
+        "total": 200, "finished": 120, "progress": 0.6,
+        "counts": {"COMPLETED": 110, "FAILED": 10, "PROCESSING": 4, "PENDING": 76},
+        "items": [{"index": 0, mesmo corpo de /api/v1/status}, ...]
+    }
+    Tarefas cujos resultados expiraram (ou foram despejados pelo limite em disco) aparecem como NOT_FOUND
+    """
+    batch, statuses = task_manager.get_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Lote não encontrado ou expirado", "batch_id": batch_id}), 404
+    
+    counts, items = {}, []
+    for index, task_id in enumerate(batch["task_ids"]):
+        status_data = statuses[task_id]
+        counts[status_data["status"]] = counts.get(status_data["status"], 0) + 1
+        if status_data["status"] == "NOT_FOUND":
+            item = {"status": "NOT_FOUND", "task_id": task_id}
+        else:
+            item = public_status(task_id, status_data)
+        items.append(dict(item, index=index))
+    
+    total = len(batch["task_ids"])
+    finished = sum(count for status, count in counts.items() if status in FINAL_STATUSES)
+    return jsonify({
+        "batch_id": batch_id,
+        "status": "COMPLETED" if finished == total else "PROCESSING",
+        "timestamp": batch.get("timestamp"),
+        "total": total,
+        "finished": finished,
+        "progress": round(finished / total, 3),
+        "counts": counts,
+        "items": items
+    }), 200
+
+@app.route('/api/v1/render', methods=['POST'])
+@error_handler
+def render_request():
+    """
+    Renderização síncrona: mesmo payload de /api/v1/process-image, a imagem volta
+    no corpo da resposta direto da memória - sem task store, sem TEMP_IMAGES_DIR e
+    sem polling. Para tarefas pequenas (1-2 produtos) em que as três idas e voltas
+    custam mais que o próprio render. Roda no pool local deste worker
+    
+    Query:
+        deadline_ms (opcional): prazo de espera (padrão SYNC_RENDER_DEADLINE, teto SYNC_RENDER_MAX_DEADLINE)
+        version (opcional): 'final' (padrão) ou 'normal' (modo duplo)
+    
+    Response (200 OK): bytes da imagem (Content-Type do formato)
+    Response (202 Accepted): prazo estourado - o render continua como tarefa
+        assíncrona, mesmo corpo de /api/v1/process-image (callback_url, se
+        houver, só é avisado nesse caso)
+    Response (429 Too Many Requests): pool de renderização cheio
+    """
+    data = request.get_json(silent=True)
+    
+    is_valid, error_message = validate_process_image_payload(data)
+    if not is_valid:
+        return jsonify({"error": error_message}), 400
+    if data.get('renditions'):
+        return jsonify({"error": "'renditions' só no fluxo assíncrono (/api/v1/process-image)"}), 400
+    
+    version = request.args.get('version', 'final')
+    if version not in ('final', 'normal'):
+        return jsonify({"error": "'version' deve ser 'final' ou 'normal'"}), 400
+    
+    deadline = config.SYNC_RENDER_DEADLINE
+    if request.args.get('deadline_ms'):
+        try:
+            deadline = int(request.args['deadline_ms']) / 1000
+        except ValueError:
+            return jsonify({"error": "'deadline_ms' deve ser um inteiro"}), 400
+    deadline = max(0, min(deadline, config.SYNC_RENDER_MAX_DEADLINE))
+    
+    products = data.get('products')
+    theme_url = data.get('theme_url') or data.get('watermark_url')
+    layout_config = data.get('layout_config')
+    
+    # Sem formato fixo no layout_config: escolher pelo Accept antes de renderizar (sem transcode depois)
+    if config.FORMAT_NEGOTIATION and not (layout_config or {}).get('formatoSaida'):
+        negotiated = negotiate(request.headers.get('Accept'), get_encoder())
+        if negotiated.name != get_encoder().name:
+            layout_config = dict(layout_config or {}, formatoSaida=negotiated.name)
+    
+    has_promo = any(p.get('PrecoPromocional', 0) > 0 for p in products)
+    started = time.monotonic()
+    try:
+        future = submit_sync_render(
+            products, data.get('original_image_url'), theme_url, has_promo,
+            layout_config, data.get('theme_config'), data.get('desconto_a_vista', 5)
+        )
+    except QueueFullError as e:
+        return _queue_full_response(e)
+    
+    try:
+        outputs = future.result(timeout=deadline)
+    except FutureTimeoutError:
+        # Prazo estourado: o render em andamento vira tarefa assíncrona
+        task_id = str(uuid.uuid4())
+        adopt_render(task_id, future, data.get('callback_url'))
+        logger.info(f"⏱️ Render síncrono passou de {deadline:.1f}s, seguindo como tarefa {task_id}")
+        return jsonify(_accepted_response(task_id, layout_config)), 202
+    except Exception as e:
+        logger.error(f"Erro no render síncrono: {e}")
+        return jsonify({"error": "Falha ao processar imagem", "error_message": str(e)}), 500
+    
+    # Modo duplo sem oferta só gera a 'normal'; fora do modo duplo só a 'final'
+    body = outputs.get(version) or outputs.get('final') or outputs.get('normal')
+    elapsed_ms = (time.monotonic() - started) * 1000
+    logger.info(f"⚡ Render síncrono em {elapsed_ms:.0f}ms ({len(body)} bytes)")
+    
+    headers = {"Cache-Control": "no-store", "Server-Timing": f"render;dur={elapsed_ms:.0f}"}
+    if config.FORMAT_NEGOTIATION:
+        headers["Vary"] = "Accept"
+    return Response(body, mimetype=sniff(body).mimetype, headers=headers)
+
 @app.route('/api/v1/legend-size', methods=['POST'])
 @error_handler
 def legend_size_request():
@@ -222,18 +470,28 @@ def get_status(task_id):
     Endpoint para consultar status de uma tarefa
     
     Método: GET
-    URL: /api/v1/status/{task_id}
+    URL: /api/v1/status/{task_id}[?wait=25&since=PROCESSING]
+    
+    Query params (long-poll):
+        wait: segundos para segurar a resposta até o status mudar (máx. STATUS_MAX_WAIT)
+        since: status que o cliente já conhece (padrão: o status atual)
     
     Response (200 OK):
     {
         "status": "COMPLETED|PROCESSING|PENDING|FAILED",
         "task_id": "uuid",
         "final_image_url": "/processed_images/{task_id}.jpg" (se COMPLETED),
+        "renditions": {"nome": "/processed_images/{task_id}_nome.jpg"} (se COMPLETED e pedidas),
         "error_message": "..." (se FAILED)
     }
     """
-    
-    status_data = task_manager.get_task_status(task_id)
+    wait = request.args.get('wait', type=float)
+    if wait and wait > 0:
+        status_data = task_manager.wait_for_change(
+            task_id, since=request.args.get('since'), timeout=min(wait, config.STATUS_MAX_WAIT)
+        )
+    else:
+        status_data = task_manager.get_task_status(task_id)
     
     if status_data["status"] == "NOT_FOUND":
         logger.warning(f"Tarefa não encontrada: {task_id}")
@@ -242,23 +500,50 @@ def get_status(task_id):
             "task_id": task_id
         }), 404
     
-    response = {
-        "status": status_data["status"],
-        "task_id": task_id,
-        "timestamp": status_data.get("timestamp")
-    }
+    logger.debug(f"Status consultado para tarefa {task_id}: {status_data['status']}")
+    return jsonify(public_status(task_id, status_data)), 200
+
+@app.route('/api/v1/status/<task_id>/events', methods=['GET'])
+@error_handler
+def stream_status(task_id):
+    """
+    Stream SSE (text/event-stream) com as mudanças de status de uma tarefa
     
-    if status_data["status"] == "COMPLETED":
-        response["final_image_url"] = f"{config.BASE_IMAGE_URL}/{task_id}.jpg"
-        # Se houver versão normal (sem tema), incluir também
-        if status_data.get("normal_path"):
-            response["normal_image_url"] = f"{config.BASE_IMAGE_URL}/{task_id}_normal.jpg"
-            logger.info(f"✅ Dupla versão disponível: promocional + normal")
-    elif status_data["status"] == "FAILED":
-        response["error_message"] = status_data.get("error")
+    Método: GET
+    URL: /api/v1/status/{task_id}/events
     
-    logger.info(f"Status consultado para tarefa {task_id}: {status_data['status']}")
-    return jsonify(response), 200
+    Cada mudança vira um `event: status` com o mesmo JSON de /api/v1/status;
+    o stream fecha em COMPLETED/FAILED, se a tarefa sumir (`event: not_found`)
+    ou depois de STATUS_STREAM_MAX segundos (o EventSource reconecta sozinho)
+    """
+    def events():
+        deadline = time.monotonic() + config.STATUS_STREAM_MAX
+        with task_manager.events.subscribe(task_id) as subscription:
+            status_data = task_manager.get_task_status(task_id)
+            last_sent = None
+            while True:
+                if status_data["status"] == "NOT_FOUND":
+                    yield f"event: not_found\ndata: {json.dumps({'task_id': task_id})}\n\n"
+                    return
+                current = (status_data["status"], status_data.get("timestamp"))
+                if current != last_sent:
+                    yield f"event: status\ndata: {json.dumps(public_status(task_id, status_data))}\n\n"
+                    last_sent, last_write = current, time.monotonic()
+                if status_data["status"] in FINAL_STATUSES or time.monotonic() >= deadline:
+                    return
+                try:
+                    status_data = subscription.get(timeout=config.STATUS_RECHECK_INTERVAL)
+                except queue.Empty:
+                    # Sem aviso: relê o store (atualizações de outros processos quando não há Redis)
+                    status_data = task_manager.get_task_status(task_id)
+                if time.monotonic() - last_write >= config.STATUS_STREAM_KEEPALIVE:
+                    yield ": keepalive\n\n"
+                    last_write = time.monotonic()
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-store",
+        "X-Accel-Buffering": "no",  # nginx: repassa cada evento sem bufferizar
+    })
 
 @app.route('/processed_images/<filename>', methods=['GET'])
 @error_handler
@@ -267,22 +552,27 @@ def serve_image(filename):
     Endpoint para servir a imagem processada
     
     Método: GET
-    URL: /processed_images/{filename}.jpg
+    URL: /processed_images/{filename}.jpg (ou .webp/.avif)
     
     Behavior:
     - Verifica se a imagem está completa
-    - Serve a imagem
-    - Remove o arquivo após o download
-    - Limpa o status da tarefa
+    - Serve a imagem - no formato da extensão pedida ou, se o arquivo salvo for
+      JPEG, em WebP/AVIF quando o header Accept aceitar (FORMAT_NEGOTIATION)
+    - Entrega pelo próprio worker ou, com IMAGE_DELIVERY=nginx, só autoriza e
+      devolve X-Accel-Redirect para o nginx enviar o arquivo
+    - O arquivo continua disponível para novos downloads até expirar
+      (MAX_TEMP_IMAGE_AGE) ou ser despejado pelo limite em disco do result_store
     """
     
-    # Extrair task_id do filename, removendo sufixos como _normal
-    task_id_from_filename = filename.replace('.jpg', '').replace('_normal', '')
-    is_normal_version = '_normal' in filename
+    # Extrair task_id do filename: {task_id}.jpg, {task_id}_normal.jpg ou {task_id}_{rendition}.jpg
+    stem, requested_extension = os.path.splitext(filename)
+    task_id_from_filename, _, suffix = stem.partition('_')
+    is_normal_version = suffix == 'normal'
+    rendition_name = suffix if suffix and not is_normal_version else None
     
     status_data = task_manager.get_task_status(task_id_from_filename)
     
-    logger.info(f"[v2.2] Servindo arquivo: {filename}, task_id: {task_id_from_filename}, is_normal: {is_normal_version}")
+    logger.info(f"[v2.2] Servindo arquivo: {filename}, task_id: {task_id_from_filename}, versão: {suffix or 'final'}")
     
     # Verificar status
     if status_data["status"] == "PROCESSING" or status_data["status"] == "PENDING":
@@ -299,7 +589,14 @@ def serve_image(filename):
         }), 404
     
     # Escolher o caminho correto baseado na versão solicitada
-    if is_normal_version:
+    rendition_paths = status_data.get('renditions') or {}
+    if rendition_name:
+        file_path = rendition_paths.get(rendition_name)
+        if not file_path:
+            return jsonify({
+                "error": f"Rendition '{rendition_name}' não existe nesta tarefa"
+            }), 404
+    elif is_normal_version:
         # Versão normal solicitada
         file_path = status_data.get('normal_path')
         if not file_path:
@@ -312,10 +609,10 @@ def serve_image(filename):
     
     logger.info(f"[v2.2] Caminho escolhido: {file_path}")
     
-    # Verificar se arquivo existe
+    # Verificar se arquivo existe (o status fica: a varredura despeja um arquivo por
+    # vez e os demais da tarefa continuam servíveis; ela remove o status quando nenhum sobra)
     if not os.path.exists(file_path):
         logger.error(f"Arquivo não encontrado no disco: {file_path}")
-        task_manager.delete_task_status(task_id_from_filename)
         return jsonify({
             "error": "Arquivo não encontrado"
         }), 404
@@ -324,40 +621,79 @@ def serve_image(filename):
     actual_filename = os.path.basename(file_path)
     logger.info(f"[v2.2] Servindo imagem: {actual_filename} (solicitado: {filename})")
     
-    # Verificar se existe versão dual (normal + promo)
-    has_dual_version = status_data.get('normal_path') is not None
+    # Formato entregue: o da extensão pedida na URL, senão o negociado pelo Accept
+    stored_encoder = encoder_for_extension(file_extension(file_path)) or ENCODERS['jpeg']
+    requested_encoder = encoder_for_extension(requested_extension)
+    if requested_encoder is not None and requested_encoder.name != stored_encoder.name and is_available(requested_encoder.name):
+        target_encoder = requested_encoder
+    elif config.FORMAT_NEGOTIATION:
+        target_encoder = negotiate(request.headers.get('Accept'), stored_encoder)
+    else:
+        target_encoder = stored_encoder
     
-    @after_this_request
-    def cleanup_after_serve(response):
-        """Remove a imagem e limpa o status após servir"""
+    # Formato diferente do salvo: converte aqui. No modo nginx a conversão fica
+    # no disco ao lado do original, para o nginx entregar e o próximo pedido não converter de novo
+    serve_path, serve_encoder, body = file_path, stored_encoder, None
+    if target_encoder.name != stored_encoder.name:
         try:
-            # Remover o arquivo que foi servido
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"[v2.2] Arquivo servido removido: {file_path}")
-            
-            # Se tem versão dual, não deletar o status ainda - aguardar segunda requisição
-            if has_dual_version:
-                # Verificar se ambos os arquivos foram servidos
-                normal_exists = status_data.get('normal_path') and os.path.exists(status_data['normal_path'])
-                promo_exists = status_data.get('final_path') and os.path.exists(status_data['final_path'])
-                
-                if not normal_exists and not promo_exists:
-                    # Ambos foram servidos, pode limpar o status
-                    task_manager.delete_task_status(task_id_from_filename)
-                    logger.info(f"[v2.2] Status da tarefa removido (dual completo): {task_id_from_filename}")
-                else:
-                    logger.info(f"[v2.2] Aguardando segunda requisição (normal={normal_exists}, promo={promo_exists})")
+            if config.IMAGE_DELIVERY == 'nginx':
+                serve_path = _transcoded_copy(task_id_from_filename, file_path, target_encoder)
             else:
-                # Versão única, pode limpar o status
-                task_manager.delete_task_status(task_id_from_filename)
-                logger.info(f"[v2.2] Status da tarefa removido: {task_id_from_filename}")
+                with open(file_path, 'rb') as f:
+                    body = transcode(f.read(), target_encoder)
+            serve_encoder = target_encoder
+            logger.info(f"[v2.2] Convertido {stored_encoder.name} -> {target_encoder.name} na entrega")
         except Exception as e:
-            logger.error(f"Erro ao limpar arquivo/status {task_id_from_filename}: {e}")
-        
-        return response
-    
-    return send_from_directory(config.TEMP_IMAGES_DIR, actual_filename, mimetype='image/jpeg')
+            logger.warning(f"⚠️ Falha ao converter para {target_encoder.name}, servindo o original: {e}")
+    
+    # Download registrado para o LRU; quem apaga é a varredura do result_store
+    result_store.touch(file_path)
+    if serve_path != file_path:
+        result_store.touch(serve_path)
+    
+    if body is not None:
+        response = Response(body, mimetype=serve_encoder.mimetype)
+    elif config.IMAGE_DELIVERY == 'nginx':
+        # O Flask só autorizou e resolveu o arquivo; o envio (sendfile, Range, ETag) é do nginx
+        response = Response(mimetype=serve_encoder.mimetype)
+        response.headers['X-Accel-Redirect'] = config.X_ACCEL_PREFIX + result_store.relative_path(serve_path)
+    else:
+        response = send_from_directory(config.TEMP_IMAGES_DIR, result_store.relative_path(serve_path), mimetype=serve_encoder.mimetype)
+    if config.FORMAT_NEGOTIATION:
+        response.headers['Vary'] = 'Accept'
+    return response
+
+def _transcoded_copy(task_id, file_path, encoder):
+    """
+    Caminho da imagem convertida para outro formato ({nome}.webp ao lado do
+    {nome}.jpg), gravada no result_store na primeira vez - com a mesma validade do original
+    """
+    variant_name = os.path.splitext(os.path.basename(file_path))[0] + encoder.extension
+    variant_path = result_store.path_for(task_id, variant_name)
+    if not os.path.exists(variant_path):
+        with open(file_path, 'rb') as f:
+            data = transcode(f.read(), encoder)
+        variant_path = result_store.put(task_id, variant_name, data, created_at=os.stat(file_path).st_mtime)
+    return variant_path
+
+@app.route('/api/v1/metrics', methods=['GET'])
+@error_handler
+def get_metrics():
+    """
+    Métricas deste worker: fila de renderização (profundidade e tarefas em
+    execução) e caches. Útil para monitoramento e ajuste de RENDER_WORKERS/RENDER_QUEUE_SIZE
+    """
+    return jsonify({
+        "task_queue": task_queue_stats(),
+        "font_cache": font_cache.stats(),
+        "text_metrics": text_measurer.stats(),
+        "text_raster": text_raster_cache.stats(),
+        "theme_cache": theme_cache.stats(),
+        "download_cache": download_cache.stats(),
+        "status_waiters": task_manager.events.waiting(),
+        "webhooks": webhook_dispatcher.stats(),
+        "result_store": result_store.stats()
+    }), 200
 
 @app.route('/api/v1/tasks', methods=['GET'])
 @error_handler
@@ -389,9 +725,11 @@ def cleanup_old_tasks():
     
     max_age_hours = request.args.get('max_age_hours', 24, type=int)
     task_manager.cleanup_old_tasks(max_age_hours)
+    removed_files = result_store.sweep()
     
     return jsonify({
-        "message": f"Limpeza concluída (tarefas com mais de {max_age_hours}h removidas)"
+        "message": f"Limpeza concluída (tarefas com mais de {max_age_hours}h removidas)",
+        "removed_files": removed_files
     }), 200
 
 # ==================== Tratamento de Erros ====================
@@ -426,7 +764,16 @@ def internal_server_error(error):
 @app.before_request
 def log_request():
     """Log das requisições recebidas"""
-    if request.path not in ['/health', '/favicon.ico']:
+    # Entrega de webhooks deste worker (sobe na primeira requisição e retoma a outbox)
+    webhook_dispatcher.start()
+    # Varredura do result_store (expiração e limite em disco)
+    result_store.start()
+    # Leases dos lotes deste worker e retomada dos lotes de um worker que caiu (pool local)
+    batch_keeper.start()
+    if request.method == 'GET' and request.path.startswith(('/api/v1/status/', '/api/v1/batches/')):
+        # Consultas de status se repetem a cada poucos segundos por tarefa/lote
+        logger.debug(f"{request.method} {request.full_path}")
+    elif request.path not in ['/health', '/favicon.ico']:
         logger.info(f"{request.method} {request.path}")
 
 @app.teardown_appcontext
@@ -0,0 +1,114 @@
+"""
+Composição por região (ROI)
+A foto fica em RGB (3 bytes/pixel) do decode até o encode, sem cópias RGBA do
+frame inteiro. O tema é guardado recortado na caixa dos pixels não
+transparentes (getbbox do canal alpha) e misturado só nesse retângulo, no
+próprio frame; os blocos de legenda são desenhados direto no frame RGB
+
+A versão promocional do modo duplo sempre saiu com as partes translúcidas do
+tema clareadas (o frame RGBA ficava com alpha < 255 ali e era composto sobre
+branco). O mesmo efeito é reproduzido com o "matte": máscara alpha*(255-alpha)/255
+aplicada com branco só dentro da caixa do tema
+"""
+from collections import namedtuple
+from PIL import Image
+
+WHITE = (255, 255, 255)
+
+
+class Overlay(namedtuple('Overlay', ['image', 'offset', 'frame_size', 'matte'])):
+    """
+    Overlay RGBA recortado: `image` é colado em `offset` num frame de tamanho
+    `frame_size`. `image` é None quando o overlay é todo transparente; `matte`
+    é None quando não há pixels translúcidos
+    Compartilhado pelo cache de temas - somente leitura
+    """
+    __slots__ = ()
+
+    @property
+    def nbytes(self):
+        if self.image is None:
+            return 0
+        return self.image.width * self.image.height * (5 if self.matte is not None else 4)
+
+    @property
+    def box(self):
+        x, y = self.offset
+        return (x, y, x + self.image.width, y + self.image.height)
+
+
+def crop_overlay(image):
+    """
+    Imagem RGBA do tamanho do frame -> Overlay recortado na área não transparente
+
+    Args:
+        image (PIL.Image): Overlay no tamanho exato do frame
+
+    Returns:
+        Overlay: recorte + posição
+    """
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    bbox = image.getchannel("A").getbbox()
+    if bbox is None:
+        return Overlay(None, (0, 0), image.size, None)
+    frame_size = image.size
+    if bbox != (0, 0) + frame_size:
+        image = image.crop(bbox)
+
+    alpha = image.getchannel("A")
+    histogram = alpha.histogram()
+    matte = None
+    if sum(histogram[1:255]):
+        matte = alpha.point(lambda a: round(a * (255 - a) / 255))
+    return Overlay(image, bbox[:2], frame_size, matte)
+
+
+def composite_overlay(frame, overlay, matte_color=None):
+    """
+    Mistura o overlay no frame RGB, in-place, só dentro da caixa do overlay
+
+    Args:
+        frame (PIL.Image): Frame RGB (alterado)
+        overlay (Overlay): Overlay do mesmo tamanho de frame
+        matte_color (tuple): Clarear as partes translúcidas com essa cor (versão promocional)
+
+    Returns:
+        PIL.Image: o próprio frame
+    """
+    if tuple(overlay.frame_size) != frame.size:
+        raise ValueError(f"Overlay para {overlay.frame_size}, frame {frame.size}")
+    if overlay.image is None:
+        return frame
+    # paste RGBA -> RGB com o próprio alpha como máscara: "over" sem converter o frame
+    frame.paste(overlay.image, overlay.offset, overlay.image)
+    if matte_color is not None and overlay.matte is not None:
+        frame.paste(matte_color, overlay.box, overlay.matte)
+    return frame
+
+
+def flatten(image, background=WHITE):
+    """
+    Imagem em qualquer modo -> RGB; a transparência é composta sobre `background`
+
+    Args:
+        image (PIL.Image): Imagem decodificada
+        background (tuple): Cor de fundo onde houver transparência
+
+    Returns:
+        PIL.Image: Imagem RGB (a própria imagem se já for RGB)
+    """
+    if image.mode == "RGB":
+        return image
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if not has_alpha:
+        return image.convert("RGB")
+
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    alpha = image.getchannel("A")
+    if alpha.getextrema()[0] == 255:
+        return image.convert("RGB")
+    frame = Image.new("RGB", image.size, background)
+    frame.paste(image, (0, 0), alpha)
+    return frame
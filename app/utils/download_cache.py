@@ -0,0 +1,379 @@
+"""
+Cache em disco das imagens baixadas, compartilhado entre os workers do gunicorn
+- Conteúdo endereçado por hash (blobs/<xx>/<sha256>): a mesma imagem em URLs
+  diferentes ocupa espaço uma vez só
+- Índice por URL (index/<sha256 da URL>.json) com os validadores HTTP e a
+  validade calculada de Cache-Control/Expires
+- Lock de arquivo por URL (fcntl.flock): downloads simultâneos da mesma URL,
+  em qualquer worker, viram um só (single-flight) - quem espera lê do disco
+- Limite de tamanho (DOWNLOAD_CACHE_MAX_MB) com despejo LRU pela data de acesso
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from app import config
+from app.utils.logger import get_logger
+from app.utils.http_client import http_get
+from app.utils.ingest import read_image_response
+
+try:
+    import fcntl
+except ImportError:  # Windows - sem lock entre processos, só entre threads
+    fcntl = None
+
+logger = get_logger(__name__)
+
+CachedDownload = namedtuple('CachedDownload', ['data', 'digest', 'etag', 'last_modified'])
+
+_MAX_AGE_RE = re.compile(r'max-age\s*=\s*(\d+)')
+
+
+def _freshness_lifetime(headers, default_ttl):
+    """
+    Validade da resposta em segundos, pelos cabeçalhos HTTP
+
+    Returns:
+        int: segundos de validade (0 = revalidar sempre) ou None se não pode ser guardada (no-store)
+    """
+    cache_control = (headers.get('Cache-Control') or '').lower()
+    if 'no-store' in cache_control:
+        return None
+    if 'no-cache' in cache_control:
+        return 0
+    match = _MAX_AGE_RE.search(cache_control)
+    if match:
+        return int(match.group(1))
+    expires = headers.get('Expires')
+    if expires:
+        try:
+            return max(0, int(parsedate_to_datetime(expires).timestamp() - time.time()))
+        except (TypeError, ValueError):
+            return 0  # Expires inválido = já expirado
+    return default_ttl
+
+
+class DownloadCache:
+    """Cache de downloads em disco com lock por URL e limite de tamanho"""
+
+    def __init__(self, cache_dir=None, max_bytes=None, default_ttl=None, enabled=None):
+        self.cache_dir = cache_dir or config.DOWNLOAD_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else config.DOWNLOAD_CACHE_MAX_BYTES
+        self.default_ttl = default_ttl if default_ttl is not None else config.DOWNLOAD_CACHE_DEFAULT_TTL
+        self.enabled = config.DOWNLOAD_CACHE_ENABLED if enabled is None else enabled
+        self._thread_lock = threading.Lock()  # só usado sem fcntl
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.coalesced = 0
+        self.uncacheable = 0
+        self.evictions = 0
+        self._disk_bytes = None  # total da última varredura de blobs feita neste processo
+
+        if self.enabled:
+            for sub in ('index', 'blobs', 'locks'):
+                os.makedirs(os.path.join(self.cache_dir, sub), exist_ok=True)
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    # ---------- caminhos e arquivos ----------
+
+    def _url_key(self, url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _meta_path(self, url_key):
+        return os.path.join(self.cache_dir, 'index', f"{url_key}.json")
+
+    def _lock_path(self, url_key):
+        return os.path.join(self.cache_dir, 'locks', f"{url_key}.lock")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.cache_dir, 'blobs', digest[:2], digest)
+
+    def _write_atomic(self, path, data):
+        """Grava num temporário do mesmo diretório e renomeia (leitores nunca veem arquivo pela metade)"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _read_meta(self, url_key):
+        try:
+            with open(self._meta_path(url_key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_blob(self, meta):
+        """Bytes do blob (e marca o acesso para o LRU), ou None se foi despejado"""
+        path = self._blob_path(meta['digest'])
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    @contextmanager
+    def _locked(self, url_key):
+        """Lock exclusivo por URL, entre threads e entre processos"""
+        if fcntl is None:
+            with self._thread_lock:
+                yield
+            return
+        lock_path = self._lock_path(url_key)
+        while True:
+            lock_file = open(lock_path, 'a+')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # O despejo pode ter apagado um lock sem dono enquanto esperávamos: só vale
+            # o lock do arquivo que ainda está no caminho (senão dois processos "teriam" o lock)
+            try:
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    # ---------- download ----------
+
+    def _result(self, data, meta):
+        return CachedDownload(data, meta['digest'], meta.get('etag'), meta.get('last_modified'))
+
+    def _cached_if_fresh(self, url_key):
+        meta = self._read_meta(url_key)
+        if meta and meta.get('expires_at', 0) > time.time():
+            data = self._read_blob(meta)
+            if data is not None:
+                return self._result(data, meta)
+        return None
+
+    def _download(self, url, headers=None):
+        return http_get(url, headers=headers or None, stream=True)
+
+    def fetch(self, url):
+        """
+        Bytes da URL (do disco se ainda válidos, senão baixa ou revalida na origem)
+
+        Returns:
+            CachedDownload: (data, digest, etag, last_modified)
+
+        Raises:
+            requests.exceptions.RequestException: se o download falhar
+            ImageTooLargeError: se passar de MAX_DOWNLOAD_MB ou MAX_IMAGE_PIXELS
+        """
+        if not self.enabled:
+            with self._download(url) as response:  # devolve a conexão ao pool mesmo em erro
+                response.raise_for_status()
+                data = read_image_response(response, url)
+            return CachedDownload(data, hashlib.sha256(data).hexdigest(),
+                                  response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+        url_key = self._url_key(url)
+        cached = self._cached_if_fresh(url_key)
+        if cached is not None:
+            self._count('hits')
+            return cached
+
+        with self._locked(url_key):
+            # Outro worker pode ter baixado enquanto esperávamos o lock
+            cached = self._cached_if_fresh(url_key)
+            if cached is not None:
+                self._count('coalesced')
+                return cached
+
+            meta = self._read_meta(url_key)
+            stale_data = self._read_blob(meta) if meta else None
+            headers = {}
+            if stale_data is not None:
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+
+            response = self._download(url, headers)
+
+            if response.status_code == 304 and stale_data is not None:
+                response.close()
+                lifetime = _freshness_lifetime(response.headers, self.default_ttl)
+                meta['expires_at'] = time.time() + (lifetime or 0)
+                meta['etag'] = response.headers.get('ETag', meta.get('etag'))
+                meta['last_modified'] = response.headers.get('Last-Modified', meta.get('last_modified'))
+                self._write_atomic(self._meta_path(url_key), json.dumps(meta).encode('utf-8'))
+                self._count('revalidated')
+                return self._result(stale_data, meta)
+
+            with response:  # devolve a conexão ao pool mesmo em erro
+                response.raise_for_status()
+                data = read_image_response(response, url)
+            self._count('misses')
+
+            meta = {
+                'url': url,
+                'digest': hashlib.sha256(data).hexdigest(),
+                'size': len(data),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'stored_at': time.time(),
+            }
+            lifetime = _freshness_lifetime(response.headers, self.default_ttl)
+            if lifetime is None or len(data) > self.max_bytes:
+                self._count('uncacheable')
+                return self._result(data, meta)
+
+            meta['expires_at'] = time.time() + lifetime
+            blob_path = self._blob_path(meta['digest'])
+            if not os.path.exists(blob_path):
+                self._write_atomic(blob_path, data)
+            self._write_atomic(self._meta_path(url_key), json.dumps(meta).encode('utf-8'))
+
+        self._evict_if_needed()
+        return self._result(data, meta)
+
+    # ---------- limite de tamanho ----------
+
+    def _scan_blobs(self):
+        blobs = []
+        blobs_dir = os.path.join(self.cache_dir, 'blobs')
+        for shard in os.scandir(blobs_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith('.tmp-'):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                blobs.append((st.st_mtime, st.st_size, entry.path))
+        return blobs
+
+    def _evict_if_needed(self):
+        """Despeja os blobs acessados há mais tempo até ficar em 90% do limite"""
+        if fcntl is None:
+            return self._evict()
+        evict_lock = os.path.join(self.cache_dir, 'locks', 'evict.lock')
+        with open(evict_lock, 'a+') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return  # outro worker já está despejando
+            try:
+                self._evict()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _evict(self):
+        blobs = self._scan_blobs()
+        total = sum(size for _, size, _ in blobs)
+        self._disk_bytes = total
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        removed = set()
+        for _, size, path in sorted(blobs):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                removed.add(os.path.basename(path))
+                total -= size
+                self._count('evictions')
+            except OSError:
+                pass
+
+        self._disk_bytes = total
+
+        # Entradas do índice que apontavam pros blobs removidos (temporários de
+        # _write_atomic em andamento em outro worker não são entradas)
+        index_dir = os.path.join(self.cache_dir, 'index')
+        live_keys = set()
+        for entry in os.scandir(index_dir):
+            if not entry.name.endswith('.json') or entry.name.startswith('.tmp-'):
+                continue
+            url_key = entry.name[:-len('.json')]
+            meta = self._read_meta(url_key)
+            if meta is None or meta.get('digest') in removed:
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+            else:
+                live_keys.add(url_key)
+        self._remove_idle_locks(live_keys)
+        logger.info(f"🧹 Cache de downloads: {len(removed)} arquivos despejados ({total} bytes em disco)")
+
+    def _remove_idle_locks(self, live_keys):
+        """
+        Apaga os locks de URLs que saíram do índice, só se ninguém os segura
+        (chamado com o lock de despejo; _locked descarta um lock apagado depois de aberto)
+        """
+        if fcntl is None:
+            return
+        for entry in os.scandir(os.path.join(self.cache_dir, 'locks')):
+            if not entry.name.endswith('.lock') or entry.name == 'evict.lock':
+                continue
+            if entry.name[:-len('.lock')] in live_keys:
+                continue
+            try:
+                with open(entry.path, 'a+') as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    try:
+                        os.unlink(entry.path)
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            except OSError:
+                pass  # em uso (ou já apagado por outro worker)
+
+    def stats(self):
+        disk_bytes = None
+        if self.enabled:
+            # Valor da última varredura de despejo (feita a cada download novo); sem
+            # percorrer o cache a cada consulta de /metrics
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._scan_blobs())
+            disk_bytes = self._disk_bytes
+        with self._stats_lock:
+            lookups = self.hits + self.coalesced + self.revalidated + self.misses
+            return {
+                "enabled": self.enabled,
+                "disk_bytes": disk_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "uncacheable": self.uncacheable,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.coalesced + self.revalidated) / lookups, 4) if lookups else None,
+            }
+
+# Instância global
+download_cache = DownloadCache()
@@ -0,0 +1,180 @@
+"""
+Estágio de codificação das saídas
+Cada formato (jpeg, webp, avif) é um Encoder com extensão, mimetype e as
+opções de save() do Pillow. O formato vem do layout_config (formatoSaida) ou
+do padrão OUTPUT_IMAGE_FORMAT; o AVIF só existe se o libheif do pillow_heif
+tiver encoder AV1. Na entrega (/processed_images), um JPEG salvo pode sair
+como WebP/AVIF para clientes que aceitam (header Accept)
+"""
+from collections import namedtuple
+from io import BytesIO
+from PIL import Image
+from app import config
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from pillow_heif import register_avif_opener
+    register_avif_opener()
+except ImportError:  # pillow_heif antigo/sem AVIF - o formato só fica indisponível
+    register_avif_opener = None
+
+# Ordem de preferência na negociação pelo Accept (o primeiro aceito e disponível vence)
+NEGOTIATION_ORDER = ('avif', 'webp')
+
+
+def _jpeg_options(quality):
+    options = {
+        'quality': quality or config.OUTPUT_IMAGE_QUALITY,
+        'optimize': config.JPEG_OPTIMIZE,
+        'progressive': config.JPEG_PROGRESSIVE,
+    }
+    if config.JPEG_SUBSAMPLING:
+        options['subsampling'] = config.JPEG_SUBSAMPLING
+    return options
+
+
+def _webp_options(quality):
+    return {'quality': quality or config.WEBP_QUALITY, 'method': config.WEBP_METHOD}
+
+
+def _avif_options(quality):
+    return {'quality': quality or config.AVIF_QUALITY, 'enc_params': {'speed': str(config.AVIF_SPEED)}}
+
+
+class Encoder(namedtuple('Encoder', ['name', 'pil_format', 'extension', 'mimetype', 'options'])):
+    """Um formato de saída: save(pil_format, **options(quality))"""
+    __slots__ = ()
+
+    def encode(self, image, quality=None):
+        """Codifica a imagem (bytes, em memória)"""
+        buffer = BytesIO()
+        image.save(buffer, self.pil_format, **self.options(quality))
+        return buffer.getvalue()
+
+
+ENCODERS = {
+    'jpeg': Encoder('jpeg', 'JPEG', '.jpg', 'image/jpeg', _jpeg_options),
+    'webp': Encoder('webp', 'WEBP', '.webp', 'image/webp', _webp_options),
+    'avif': Encoder('avif', 'AVIF', '.avif', 'image/avif', _avif_options),
+}
+ALIASES = {'jpg': 'jpeg'}
+
+_available = {}
+
+
+def is_available(name):
+    """O Pillow deste processo consegue gravar o formato? (testado uma vez, numa imagem 8x8)"""
+    if name not in _available:
+        try:
+            ENCODERS[name].encode(Image.new('RGB', (8, 8)))
+            _available[name] = True
+        except Exception as e:
+            logger.warning(f"⚠️ Formato de saída '{name}' indisponível: {e}")
+            _available[name] = False
+    return _available[name]
+
+
+def available_formats():
+    """Nomes dos formatos que este processo consegue gravar"""
+    return [name for name in ENCODERS if is_available(name)]
+
+
+def get_encoder(name=None):
+    """
+    Nome do formato -> Encoder (validação do payload)
+
+    Raises:
+        ValueError: formato desconhecido ou indisponível neste servidor
+    """
+    key = str(name or config.OUTPUT_IMAGE_FORMAT).lower()
+    key = ALIASES.get(key, key)
+    if key not in ENCODERS or not is_available(key):
+        raise ValueError(f"Formato de saída '{name}' não suportado (use: {', '.join(available_formats())})")
+    return ENCODERS[key]
+
+
+def resolve_encoder(name=None):
+    """
+    Nome do formato -> Encoder, no render
+    Formato desconhecido/indisponível cai no JPEG (com aviso) em vez de falhar a tarefa
+    """
+    try:
+        return get_encoder(name)
+    except ValueError as e:
+        logger.warning(f"⚠️ {e} - usando JPEG")
+        return ENCODERS['jpeg']
+
+
+def encode(image, name=None, quality=None):
+    """Codifica a imagem no formato pedido (padrão OUTPUT_IMAGE_FORMAT)"""
+    return resolve_encoder(name).encode(image, quality)
+
+
+def encoder_for_extension(extension):
+    """'.webp' -> Encoder (None se a extensão não for de nenhum formato)"""
+    extension = extension.lower()
+    if extension == '.jpeg':
+        extension = '.jpg'
+    for encoder in ENCODERS.values():
+        if encoder.extension == extension:
+            return encoder
+    return None
+
+
+def sniff(data):
+    """Encoder do formato dos bytes já codificados (pela assinatura do arquivo)"""
+    if data[:3] == b'\xff\xd8\xff':
+        return ENCODERS['jpeg']
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return ENCODERS['webp']
+    if data[4:12] in (b'ftypavif', b'ftypavis'):
+        return ENCODERS['avif']
+    return ENCODERS['jpeg']
+
+
+def _accepted_types(accept_header):
+    """Header Accept -> {mimetype: q} (só os tipos listados explicitamente)"""
+    accepted = {}
+    for part in (accept_header or '').split(','):
+        media, _, params = part.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media:
+            accepted[media.strip().lower()] = q
+    return accepted
+
+
+def negotiate(accept_header, current):
+    """
+    Formato para entregar um arquivo salvo em `current`, conforme o header Accept
+    Só troca JPEG (que todo cliente aceita) por WebP/AVIF quando o cliente lista
+    o tipo explicitamente - curingas (*/*, image/*) não contam
+
+    Returns:
+        Encoder: o formato a entregar (o próprio `current` se não houver troca)
+    """
+    if current.name != 'jpeg' or not accept_header:
+        return current
+    accepted = _accepted_types(accept_header)
+    for name in NEGOTIATION_ORDER:
+        encoder = ENCODERS[name]
+        if accepted.get(encoder.mimetype, 0) > 0 and is_available(name):
+            return encoder
+    return current
+
+
+def transcode(data, encoder, quality=None):
+    """Bytes já codificados -> mesmos pixels em outro formato"""
+    image = Image.open(BytesIO(data))
+    image.load()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return encoder.encode(image, quality)
@@ -0,0 +1,106 @@
+"""
+Cache de fontes TrueType por processo
+ImageFont.truetype lê e interpreta o arquivo .ttf a cada chamada; aqui cada
+(arquivo, tamanho) é carregado uma vez por worker e reaproveitado entre
+tarefas, com limite LRU. Os nomes de fonte são resolvidos por um índice do
+FONTS_DIR em vez de vários os.path.exists por requisição
+"""
+import os
+import threading
+from collections import OrderedDict
+from PIL import ImageFont
+from app import config
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class FontCache:
+    """Cache LRU thread-safe de ImageFont.FreeTypeFont, chaveado por (caminho, tamanho)"""
+
+    def __init__(self, fonts_dir=None, max_size=None):
+        self.fonts_dir = fonts_dir or config.FONTS_DIR
+        self.max_size = max_size or config.FONT_CACHE_SIZE
+        self._fonts = OrderedDict()
+        self._lock = threading.Lock()
+        self._index = {}
+        self._index_mtime = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._refresh_index()
+
+    def _refresh_index(self):
+        """(Re)monta o índice nome do arquivo -> caminho se o FONTS_DIR mudou"""
+        try:
+            mtime = os.stat(self.fonts_dir).st_mtime
+        except OSError:
+            self._index, self._index_mtime = {}, None
+            return
+        if mtime == self._index_mtime:
+            return
+        index = {}
+        for entry in os.scandir(self.fonts_dir):
+            if entry.is_file():
+                index[entry.name] = entry.path
+        self._index, self._index_mtime = index, mtime
+        logger.info(f"Índice de fontes montado: {len(index)} arquivos em {self.fonts_dir}")
+
+    def resolve(self, font_name=None):
+        """
+        Retorna o caminho da fonte baseado no nome (mesma ordem de busca de sempre:
+        "<nome>.ttf", "<nome>bd.ttf", "<nome em minúsculas>.ttf"), ou o padrão
+        """
+        self._refresh_index()
+        if font_name:
+            for candidate in (f"{font_name}.ttf", f"{font_name}bd.ttf", f"{font_name.lower()}.ttf"):
+                path = self._index.get(candidate)
+                if path:
+                    return path
+        return config.DEFAULT_FONT_PATH
+
+    def exists(self, font_path):
+        """Se o arquivo existe (pelo índice, quando está no FONTS_DIR)"""
+        if os.path.dirname(os.path.abspath(font_path)) == os.path.abspath(self.fonts_dir):
+            self._refresh_index()
+            return os.path.basename(font_path) in self._index
+        return os.path.exists(font_path)
+
+    def get(self, font_path, size):
+        """Fonte carregada (do cache, ou lida do disco na primeira vez)"""
+        key = (font_path, size)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+            self.misses += 1
+
+        # Leitura do .ttf fora do lock - duas threads podem carregar a mesma fonte ao
+        # mesmo tempo na primeira vez, o que é inofensivo (a segunda sobrescreve)
+        font = ImageFont.truetype(font_path, size)
+
+        with self._lock:
+            self._fonts[key] = font
+            self._fonts.move_to_end(key)
+            while len(self._fonts) > self.max_size:
+                self._fonts.popitem(last=False)
+                self.evictions += 1
+        return font
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._fonts),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "indexed_files": len(self._index),
+            }
+
+# Instância global
+font_cache = FontCache()
@@ -0,0 +1,65 @@
+"""
+Cliente HTTP compartilhado por worker
+Uma requests.Session com pool de conexões keep-alive: downloads seguidos para o
+mesmo host (Supabase storage) reaproveitam a conexão em vez de pagar DNS, TCP e
+TLS de novo a cada imagem. Também oferece um pequeno pool de threads para baixar
+a foto original e o tema ao mesmo tempo
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from app import config
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+_executor = None
+_executor_pid = None
+
+
+def _create_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_HOSTS, pool_maxsize=config.HTTP_POOL_SIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = f"image-microservice/{config.API_VERSION}"
+    return session
+
+
+def get_session():
+    """Session do processo (recriada depois de um fork - conexões não atravessam o fork)"""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _lock:
+            if _session is None or _session_pid != os.getpid():
+                _session = _create_session()
+                _session_pid = os.getpid()
+                logger.info(f"Sessão HTTP criada (pool de {config.HTTP_POOL_SIZE} conexões por host)")
+    return _session
+
+
+def http_get(url, headers=None, stream=False):
+    """GET pela sessão compartilhada, com o timeout padrão (REQUEST_TIMEOUT)"""
+    return get_session().get(url, headers=headers, stream=stream, timeout=config.REQUEST_TIMEOUT)
+
+
+def http_post(url, data, headers=None, timeout=None):
+    """POST pela sessão compartilhada (webhooks); redirecionamentos não são seguidos"""
+    return get_session().post(url, data=data, headers=headers, timeout=timeout or config.REQUEST_TIMEOUT,
+                              allow_redirects=False)
+
+
+def submit_download(fn, *args, **kwargs):
+    """Roda um download em paralelo (pool de threads do processo) e devolve o Future"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=config.DOWNLOAD_THREADS, thread_name_prefix='download')
+                _executor_pid = os.getpid()
+    return _executor.submit(fn, *args, **kwargs)
@@ -3,14 +3,33 @@ Módulo principal de processamento de imagem
 Responsável por download, manipulação, renderização de textos e salvamento
 """
 import os
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from types import MappingProxyType
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
 from datetime import datetime
 from app import config
 from app.utils.logger import get_logger
 from app.utils.task_manager import task_manager
+from app.utils.webhooks import webhook_dispatcher
+from app.utils.result_store import result_store
 from app.utils.validators import validate_product_data
+from app.utils.render_context import RenderContext
+from app.utils.layout import TextLine, BlockMetrics, BlockPlan, LayoutPlan
+from app.utils.render_engine import render_engine
+from app.utils.font_cache import font_cache
+from app.utils.text_metrics import text_measurer, text_raster_cache
+from app.utils.theme_cache import theme_cache
+from app.utils.download_cache import download_cache
+from app.utils.http_client import submit_download
+from app.utils.ingest import check_pixel_limit
+from app.utils.resize import resize
+from app.utils.compositing import WHITE, crop_overlay, composite_overlay, flatten
+from app.utils.renditions import parse_renditions, crop_box, output_size
+from app.utils.encoders import encode, sniff
 
 # Registra o HEIC/HEIF no Pillow (fotos de iPhone) - sem isso, Image.open()
 # falha nesse formato. Precisa acontecer uma vez, antes de qualquer Image.open().
@@ -27,30 +46,34 @@ logger = get_logger(__name__)
 # valor mudar de novo, os tamanhos de fonte/padding lá também precisam escalar junto.
 MAX_ORIGINAL_WIDTH = 1080
 
+_encode_lock = threading.Lock()
+_encode_executor = None
+_encode_executor_pid = None
+
+
+def submit_encode(fn, *args, **kwargs):
+    """
+    Roda um encode em paralelo (pool de threads do processo) e devolve o Future
+    O encoder do Pillow solta o GIL, então as duas versões do modo duplo codificam juntas
+    """
+    global _encode_executor, _encode_executor_pid
+    if _encode_executor is None or _encode_executor_pid != os.getpid():
+        with _encode_lock:
+            if _encode_executor is None or _encode_executor_pid != os.getpid():
+                _encode_executor = ThreadPoolExecutor(max_workers=config.ENCODE_THREADS, thread_name_prefix='encode')
+                _encode_executor_pid = os.getpid()
+    return _encode_executor.submit(fn, *args, **kwargs)
+
 class ImageProcessor:
     """Processador de imagens com suporte a múltiplos produtos"""
     
     def __init__(self):
+        # Fontes padrão (somente leitura) - configs dinâmicas vão num RenderContext por tarefa
         self.fonts = self._load_fonts()
-        # Configs dinâmicas (serão sobrescritas a cada processo se recebidas)
-        self.layout_config = None
-        self.theme_config = None
-        self.desconto_a_vista = 5  # Default 5%
     
     def _get_font_path(self, font_name=None):
-        """Retorna o caminho da fonte baseado no nome"""
-        if font_name:
-            font_file = f"{font_name}.ttf"
-            font_path = os.path.join(config.FONTS_DIR, font_file)
-            if os.path.exists(font_path):
-                return font_path
-            # Tentar variações comuns
-            variations = [f"{font_name}bd.ttf", f"{font_name.lower()}.ttf"]
-            for var in variations:
-                var_path = os.path.join(config.FONTS_DIR, var)
-                if os.path.exists(var_path):
-                    return var_path
-        return config.DEFAULT_FONT_PATH
+        """Retorna o caminho da fonte baseado no nome (via índice do FONTS_DIR)"""
+        return font_cache.resolve(font_name)
     
     def _load_fonts_with_config(self, layout_config=None, theme_config=None):
         """Carrega fontes com tamanhos dinâmicos baseados em layout_config"""
@@ -78,12 +101,12 @@ class ImageProcessor:
         font_path = self._get_font_path(font_name)
 
         try:
-            if os.path.exists(font_path):
-                fonts['description'] = ImageFont.truetype(font_path, desc_size)
-                fonts['ref_promo'] = ImageFont.truetype(font_path, ref_size)
-                fonts['price'] = ImageFont.truetype(font_path, price_size)
-                fonts['price_promo'] = ImageFont.truetype(font_path, price_promo_size)
-                fonts['esgotado'] = ImageFont.truetype(font_path, esgotado_size)
+            if font_cache.exists(font_path):
+                fonts['description'] = font_cache.get(font_path, desc_size)
+                fonts['ref_promo'] = font_cache.get(font_path, ref_size)
+                fonts['price'] = font_cache.get(font_path, price_size)
+                fonts['price_promo'] = font_cache.get(font_path, price_promo_size)
+                fonts['esgotado'] = font_cache.get(font_path, esgotado_size)
                 logger.info(f"Fontes carregadas: {font_path} (desc={desc_size}, price={price_size}, price_promo={price_promo_size})")
             else:
                 logger.warning(f"Fonte não encontrada em {font_path}. Usando fonte padrão.")
@@ -102,51 +125,51 @@ class ImageProcessor:
 
         return fonts
     
-    def _get_padding_x(self):
-        """Retorna padding X interno do bloco (usa layout_config se disponível)"""
-        if self.layout_config:
-            return self.layout_config.get('blocoPaddingX', config.PADDING_X)
-        return config.PADDING_X
-    
-    def _get_bloco_x(self):
-        """Retorna posição X do início do bloco (distância da borda esquerda)"""
-        if self.layout_config:
-            return self.layout_config.get('blocoX', config.PADDING_X)
-        return config.PADDING_X
-    
-    def _get_bloco_padding_y(self):
-        """Retorna padding Y interno do bloco (usa layout_config se disponível)"""
-        if self.layout_config:
-            return self.layout_config.get('blocoPaddingY', 8)
-        return 8  # Valor padrão original
-    
-    def _get_padding_y(self):
-        """Retorna padding Y - distância da borda inferior (usa layout_config se disponível)"""
-        if self.layout_config:
-            return self.layout_config.get('blocoY', config.PADDING_Y)
-        return config.PADDING_Y
-    
-    def _get_block_spacing(self):
-        """Retorna espaçamento entre blocos (usa layout_config se disponível)"""
-        if self.layout_config:
-            return self.layout_config.get('blocoEspacamento', config.BLOCK_SPACING)
-        return config.BLOCK_SPACING
+    def create_render_context(self, layout_config=None, theme_config=None, desconto_a_vista=5):
+        """
+        Monta o contexto imutável de uma tarefa (fontes, cores, paddings, espaçamentos)
+        
+        Args:
+            layout_config (dict): Configurações de layout (blocoX, blocoY, fontes, etc.)
+            theme_config (dict): Configurações de tema (cores, fonte)
+            desconto_a_vista (float): Percentual de desconto à vista
+        
+        Returns:
+            RenderContext: Contexto seguro pra compartilhar entre threads
+        """
+        # Recarregar fontes com tamanhos dinâmicos só se houver config - senão as padrão
+        if layout_config or theme_config:
+            fonts = self._load_fonts_with_config(layout_config, theme_config)
+        else:
+            fonts = self.fonts
+        return RenderContext.from_configs(fonts, layout_config, theme_config, desconto_a_vista)
     
-    def _get_line_height(self):
-        """Retorna multiplicador de altura de linha (usa layout_config se disponível)"""
-        if self.layout_config:
-            return self.layout_config.get('linhaAltura', config.LINE_HEIGHT_MULTIPLIER)
-        return config.LINE_HEIGHT_MULTIPLIER
-
-    def _padroniza_largura_bloco(self):
-        """Opt-in por chamador (não muda comportamento de quem não manda essa flag no
-        layout_config, ex: photo-monitor) — padroniza a largura da caixa de informações
-        entre fotos diferentes, que hoje varia conforme o texto de cada produto."""
-        if self.layout_config:
-            return bool(self.layout_config.get('padronizarLarguraBloco', False))
-        return False
+    def _scale_render_context(self, ctx, factor):
+        """
+        Contexto com fontes, paddings e espaçamentos multiplicados por `factor`
+        (legenda de uma rendition: largura da rendition / largura da imagem principal)
+        """
+        if factor == 1:
+            return ctx
+        fonts = {}
+        for name, font in ctx.fonts.items():
+            path, size = getattr(font, 'path', None), getattr(font, 'size', None)
+            # Fonte bitmap padrão (load_default) não tem tamanho - fica como está
+            fonts[name] = font_cache.get(path, max(1, round(size * factor))) if path and size else font
+        scale = lambda value: int(round(value * factor))
+        return replace(
+            ctx,
+            fonts=MappingProxyType(fonts),
+            padding_x=scale(ctx.padding_x),
+            bloco_x=scale(ctx.bloco_x),
+            bloco_padding_y=scale(ctx.bloco_padding_y),
+            padding_y=scale(ctx.padding_y),
+            block_spacing=scale(ctx.block_spacing),
+            word_spacing=scale(ctx.word_spacing),
+            strike_width=max(1, scale(ctx.strike_width)),
+        )
 
-    def _calculate_standard_block_width(self, draw):
+    def _calculate_standard_block_width(self, draw, ctx):
         """
         Largura "padrão" do bloco, calculada com textos de referência no PIOR CASO
         (não com o texto real de um produto) — usada como largura MÍNIMA quando
@@ -169,80 +192,34 @@ class ImageProcessor:
             'Ref 9999',
         ]
         for texto in referencias:
-            bbox = self._calculate_text_bbox(draw, texto, self.fonts['description'])
+            bbox = self._calculate_text_bbox(draw, texto, ctx.fonts['description'])
             max_width = max(max_width, bbox[2] - bbox[0])
 
         # Preço promocional (3 linhas — a mais larga costuma ser "DE ... POR", fonte description)
-        bbox = self._calculate_text_bbox(draw, 'DE R$999,90 POR', self.fonts['description'])
+        bbox = self._calculate_text_bbox(draw, 'DE R$999,90 POR', ctx.fonts['description'])
         max_width = max(max_width, bbox[2] - bbox[0])
         for texto in ['R$999,90 no cartão', 'R$999,90 à vista']:
-            bbox = self._calculate_text_bbox(draw, texto, self.fonts['price_promo'])
+            bbox = self._calculate_text_bbox(draw, texto, ctx.fonts['price_promo'])
             max_width = max(max_width, bbox[2] - bbox[0])
 
         # Preço normal (sem promoção)
-        bbox = self._calculate_text_bbox(draw, 'R$999,90', self.fonts['price'])
+        bbox = self._calculate_text_bbox(draw, 'R$999,90', ctx.fonts['price'])
         max_width = max(max_width, bbox[2] - bbox[0])
 
-        padding_x_interno = self._get_padding_x()
+        padding_x_interno = ctx.padding_x
         return int(max_width + (2 * padding_x_interno))
 
-    def _parse_rgba(self, rgba_str):
-        """Converte string rgba(r, g, b, a) para tupla (r, g, b, a)"""
-        if not rgba_str or not isinstance(rgba_str, str):
-            return None
-        try:
-            # rgba(220, 20, 60, 0.86)
-            rgba_str = rgba_str.replace('rgba(', '').replace(')', '')
-            parts = [p.strip() for p in rgba_str.split(',')]
-            r, g, b = int(parts[0]), int(parts[1]), int(parts[2])
-            a = int(float(parts[3]) * 255)  # Converter 0-1 para 0-255
-            return (r, g, b, a)
-        except:
-            return None
-    
-    def _get_promo_bg_color(self):
-        """Retorna cor de fundo para promoção (usa theme_config se disponível)"""
-        if self.theme_config:
-            color = self._parse_rgba(self.theme_config.get('corFundoPromocao'))
-            if color:
-                return color
-        return config.COLOR_PROMO_BACKGROUND
-    
-    def _get_normal_bg_color(self):
-        """Retorna cor de fundo normal (usa theme_config se disponível)"""
-        if self.theme_config:
-            color = self._parse_rgba(self.theme_config.get('corFundoPadrao'))
-            if color:
-                return color
-        return config.COLOR_NORMAL_BACKGROUND
-    
-    def _get_promo_text_color(self):
-        """Retorna cor de texto para promoção (usa theme_config se disponível)"""
-        if self.theme_config:
-            color = self._parse_rgba(self.theme_config.get('corTextoPromocao'))
-            if color:
-                return color[:3]  # RGB sem alpha para texto
-        return config.COLOR_TEXT_WHITE
-    
-    def _get_normal_text_color(self):
-        """Retorna cor de texto normal (usa theme_config se disponível)"""
-        if self.theme_config:
-            color = self._parse_rgba(self.theme_config.get('corTextoPadrao'))
-            if color:
-                return color[:3]  # RGB sem alpha para texto
-        return config.COLOR_TEXT_WHITE
-    
     def _load_fonts(self):
         """Carrega as fontes TrueType necessárias"""
         fonts = {}
         
         try:
-            if os.path.exists(config.DEFAULT_FONT_PATH):
-                fonts['description'] = ImageFont.truetype(config.DEFAULT_FONT_PATH, config.FONT_DESCRIPTION_SIZE)
-                fonts['ref_promo'] = ImageFont.truetype(config.DEFAULT_FONT_PATH, config.FONT_REF_SIZE_PROMO)
-                fonts['price'] = ImageFont.truetype(config.DEFAULT_FONT_PATH, config.FONT_PRICE_SIZE)
+            if font_cache.exists(config.DEFAULT_FONT_PATH):
+                fonts['description'] = font_cache.get(config.DEFAULT_FONT_PATH, config.FONT_DESCRIPTION_SIZE)
+                fonts['ref_promo'] = font_cache.get(config.DEFAULT_FONT_PATH, config.FONT_REF_SIZE_PROMO)
+                fonts['price'] = font_cache.get(config.DEFAULT_FONT_PATH, config.FONT_PRICE_SIZE)
                 fonts['price_promo'] = fonts['price']
-                fonts['esgotado'] = ImageFont.truetype(config.DEFAULT_FONT_PATH, config.FONT_ESGOTADO_SIZE)
+                fonts['esgotado'] = font_cache.get(config.DEFAULT_FONT_PATH, config.FONT_ESGOTADO_SIZE)
                 logger.info(f"Fontes carregadas de: {config.DEFAULT_FONT_PATH}")
             else:
                 logger.warning(f"Fonte não encontrada em {config.DEFAULT_FONT_PATH}. Usando fonte padrão.")
@@ -261,15 +238,15 @@ class ImageProcessor:
 
         return fonts
 
-    def _download_image(self, url):
+    def _fetch_image_bytes(self, url):
         """
-        Download de imagem de uma URL
+        Download dos bytes de uma imagem (só I/O, sem decodificar)
         
         Args:
             url (str): URL da imagem
         
         Returns:
-            PIL.Image: Imagem carregada
+            bytes: Conteúdo baixado
         
         Raises:
             Exception: Se falhar no download
@@ -277,23 +254,57 @@ class ImageProcessor:
         logger.info(f"Iniciando download de: {url}")
         
         try:
-            response = requests.get(url, stream=True, timeout=config.REQUEST_TIMEOUT)
-            response.raise_for_status()
+            # Do cache em disco compartilhado entre os workers quando ainda válido
+            return download_cache.fetch(url).data
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Erro ao baixar imagem {url}: {e}")
+            raise
+    
+    def _decode_image(self, image_data, resize_profile=None, keep_alpha=False):
+        """
+        Decodifica bytes de imagem, já limitada a MAX_ORIGINAL_WIDTH
+        
+        O decodificador já sabe a largura final: JPEG usa o modo draft (escala
+        1/2, 1/4 ou 1/8 no domínio DCT, sempre >= alvo) e só o resize final
+        pequeno usa o filtro do perfil (app/utils/resize.py). Fotos saem em RGB
+        (transparência composta sobre branco) e ficam assim até o encode;
+        só o tema (keep_alpha) sai em RGBA
+        
+        Args:
+            image_data (bytes): Conteúdo da imagem (JPEG, PNG, HEIC...)
+            resize_profile (str): Perfil de redimensionamento (padrão RESIZE_PROFILE)
+            keep_alpha (bool): Devolver RGBA (overlay de tema) em vez de RGB
+        
+        Returns:
+            PIL.Image: Imagem carregada (RGB, ou RGBA com keep_alpha)
+        """
+        image = Image.open(BytesIO(image_data))
+        # Só o cabeçalho foi lido até aqui - recusar antes de alocar os pixels
+        check_pixel_limit(image.size)
+        original_size = image.size
 
-            image_bytes = BytesIO(response.content)
-            image = Image.open(image_bytes).convert("RGBA")
+        target_size = None
+        if image.width > MAX_ORIGINAL_WIDTH:
+            nova_altura = round(image.height * (MAX_ORIGINAL_WIDTH / image.width))
+            target_size = (MAX_ORIGINAL_WIDTH, nova_altura)
+            if config.DECODE_DRAFT and image.format in ('JPEG', 'MPO'):
+                image.draft(image.mode, target_size)
 
-            logger.info(f"Imagem baixada com sucesso: {image.size}")
+        # Transparência (tema PNG) ou modos sem resize de qualidade (P, CMYK...): RGBA antes
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert("RGBA")
 
-            if image.width > MAX_ORIGINAL_WIDTH:
-                nova_altura = round(image.height * (MAX_ORIGINAL_WIDTH / image.width))
-                logger.info(f"Redimensionando de {image.size} para ({MAX_ORIGINAL_WIDTH}, {nova_altura})")
-                image = image.resize((MAX_ORIGINAL_WIDTH, nova_altura), Image.Resampling.LANCZOS)
+        logger.info(f"Imagem decodificada com sucesso: {original_size} (decodificada em {image.size})")
 
-            return image
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erro ao baixar imagem {url}: {e}")
-            raise
+        if target_size:
+            logger.info(f"Redimensionando de {image.size} para {target_size}")
+            image = resize(image, target_size, resize_profile)
+
+        if not keep_alpha:
+            return flatten(image)
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+        return image
     
     def _format_numeracao_utilizada(self, numeracao_raw):
         """
@@ -326,37 +337,72 @@ class ImageProcessor:
         # Se diferentes (ex: "G3 (52/54)"), mantém o formato original
         return numeracao_raw
     
-    def _apply_theme(self, base_image, theme_image):
+    def _prepare_theme_overlay(self, theme_data, size, resize_profile=None):
         """
-        Aplica tema na imagem base
+        Decodifica o tema e redimensiona para o tamanho exato da imagem original
         
         Args:
-            base_image (PIL.Image): Imagem base
-            theme_image (PIL.Image): Imagem de tema
+            theme_data (bytes): PNG do tema
+            size (tuple): (largura, altura) da imagem original
+            resize_profile (str): Perfil de redimensionamento (padrão RESIZE_PROFILE)
         
         Returns:
-            PIL.Image: Imagem com tema aplicado
+            Overlay: Tema recortado na área não transparente, pronto para _apply_theme
         """
-        logger.info("Aplicando tema")
+        theme_image = self._decode_image(theme_data, resize_profile, keep_alpha=True)
+        if theme_image.size != tuple(size):
+            theme_image = resize(theme_image, size, resize_profile)
+        return crop_overlay(theme_image)
+    
+    def _apply_theme(self, base_image, overlay, matte=False):
+        """
+        Aplica tema na imagem base, in-place
+        Só o retângulo não transparente do tema é misturado; o resto do frame não é tocado
+        
+        Args:
+            base_image (PIL.Image): Imagem base RGB (alterada)
+            overlay (Overlay): Tema recortado (_prepare_theme_overlay)
+            matte (bool): Clarear as partes translúcidas com branco (visual da versão promocional)
+        
+        Returns:
+            PIL.Image: A própria base_image, com o tema aplicado
+        """
+        logger.info(f"Aplicando tema (região {overlay.offset} {overlay.image.size if overlay.image else 'vazia'})")
         
         try:
-            theme_image = theme_image.convert("RGBA")
-            base_width, base_height = base_image.size
-            
-            # Redimensionar tema para o tamanho exato da imagem original
-            theme_image = theme_image.resize((base_width, base_height), Image.Resampling.LANCZOS)
-            
-            # Criar imagem temporária para composição
-            temp_composite = Image.new("RGBA", base_image.size)
-            temp_composite.paste(base_image, (0, 0))
-            temp_composite.paste(theme_image, (0, 0), theme_image)
-            
+            composite_overlay(base_image, overlay, WHITE if matte else None)
             logger.info("Tema aplicado com sucesso")
-            return temp_composite
+            return base_image
         except Exception as e:
             logger.error(f"Erro ao aplicar tema: {e}")
             raise
     
+    def _apply_theme_data(self, ctx, base_image, theme_data, theme_key=None, matte=False):
+        """
+        Prepara (ou pega do cache) o overlay do tema e aplica na imagem base, in-place
+        Falha no tema não derruba a tarefa - segue só com os blocos de produto
+        
+        Args:
+            ctx (RenderContext): Contexto da tarefa (perfil de redimensionamento)
+            base_image (PIL.Image): Imagem base RGB (alterada)
+            theme_data (bytes): Imagem de tema (None se não houver ou se o download falhou)
+            theme_key (tuple): ThemeSource.key - reaproveita o overlay já redimensionado (opcional)
+            matte (bool): Visual da versão promocional (ver _apply_theme)
+        """
+        if theme_data is None:
+            return
+        try:
+            overlay = theme_cache.overlay(
+                theme_key and theme_key + (ctx.resize_profile,), base_image.size,
+                lambda: self._prepare_theme_overlay(theme_data, base_image.size, ctx.resize_profile)
+            )
+            logger.info(f"✅ Tema pronto: {overlay.frame_size}")
+            self._apply_theme(base_image, overlay, matte=matte)
+            logger.info(f"✅ TEMA APLICADO COM SUCESSO na imagem base")
+        except Exception as e:
+            logger.warning(f"⚠️ FALHA ao aplicar tema: {e}")
+            logger.warning(f"⚠️ Continuando processamento sem tema - apenas blocos de produto")
+    
     def _extract_dominant_color(self, image, region_y_start, region_y_end, product_description=""):
         """
         Extrai a cor predominante de uma região específica da imagem baseada no tipo de produto
@@ -488,17 +534,9 @@ class ImageProcessor:
     def _calculate_text_bbox(self, draw, text, font):
         """
         Calcula a caixa delimitadora de um texto
-        Compatível com diferentes versões do Pillow
+        Memoizada por (fonte, texto) no text_measurer do processo
         """
-        try:
-            # Tenta a API mais recente (Pillow 8.0+)
-            bbox = draw.textbbox((0, 0), text, font=font)
-        except (AttributeError, TypeError):
-            # Fallback para versões antigas
-            width, height = draw.textsize(text, font=font)
-            bbox = (0, 0, width, height)
-        
-        return bbox
+        return text_measurer.bbox(draw, text, font)
     
     def _draw_text_with_shadow(self, draw, position, text, font, fill, shadow=True):
         """
@@ -515,10 +553,10 @@ class ImageProcessor:
         if shadow:
             # Desenhar sombra primeiro (offset)
             shadow_pos = (position[0] + config.TEXT_SHADOW_OFFSET, position[1] + config.TEXT_SHADOW_OFFSET)
-            draw.text(shadow_pos, text, font=font, fill=config.TEXT_SHADOW_COLOR)
+            text_raster_cache.draw_text(draw, shadow_pos, text, font, config.TEXT_SHADOW_COLOR)
         
-        # Desenhar texto principal
-        draw.text(position, text, font=font, fill=fill)
+        # Desenhar texto principal (máscara compartilhada com a sombra e com a outra versão)
+        text_raster_cache.draw_text(draw, position, text, font, fill)
     
     def _format_price_text(self, price):
         """Formata preço para formato brasileiro (R$ X.XXX,XX)"""
@@ -558,7 +596,7 @@ class ImageProcessor:
         
         return [line1, line2]
     
-    def _calculate_min_width_for_product(self, draw, product, is_promotional=False):
+    def _calculate_min_width_for_product(self, draw, ctx, product, is_promotional=False, description_lines=None):
         """
         Calcula a largura MÍNIMA necessária para um produto específico,
         baseada no texto mais largo de cada linha.
@@ -567,6 +605,7 @@ class ImageProcessor:
             draw: Objeto de desenho
             product (dict): Dados do produto
             is_promotional (bool): Se é um produto promocional
+            description_lines (list): Descrição já quebrada em linhas (opcional)
         
         Returns:
             int: Largura mínima necessária em pixels (sem padding extra)
@@ -574,59 +613,57 @@ class ImageProcessor:
         max_width = 0
         
         # 1. Descrição (pode ter 2 linhas)
-        reference_text = "Tam: ESGOTADO"
-        bbox_ref = self._calculate_text_bbox(draw, reference_text, self.fonts['description'])
-        max_desc_width = bbox_ref[2] - bbox_ref[0]
-        
-        description_lines = self._split_description(product['DescricaoFinal'], max_desc_width, self.fonts['description'], draw)
+        if description_lines is None:
+            max_desc_width = text_measurer.font_metrics(draw, ctx.fonts['description']).description_max_width
+            description_lines = self._split_description(product['DescricaoFinal'], max_desc_width, ctx.fonts['description'], draw)
         for line in description_lines:
-            bbox = self._calculate_text_bbox(draw, line, self.fonts['description'])
+            bbox = self._calculate_text_bbox(draw, line, ctx.fonts['description'])
             max_width = max(max_width, bbox[2] - bbox[0])
         
         # 2. Referência
         ref_text = f"Ref {product['Referencia']}"
-        bbox = self._calculate_text_bbox(draw, ref_text, self.fonts['description'])
+        bbox = self._calculate_text_bbox(draw, ref_text, ctx.fonts['description'])
         max_width = max(max_width, bbox[2] - bbox[0])
         
         # 3. Tamanhos disponíveis
         if product['TamanhosDisponiveis'] and product['TamanhosDisponiveis'] != 'N/A':
             tam_text = f"Tam: {product['TamanhosDisponiveis']}"
-            bbox = self._calculate_text_bbox(draw, tam_text, self.fonts['description'])
+            bbox = self._calculate_text_bbox(draw, tam_text, ctx.fonts['description'])
             max_width = max(max_width, bbox[2] - bbox[0])
         
         # 4. Usei (numeração utilizada) - formatada (pula se não informada)
         if product['NumeracaoUtilizada'] and product['NumeracaoUtilizada'] != 'N/A':
             numeracao_formatada = self._format_numeracao_utilizada(product['NumeracaoUtilizada'])
             usei_text = f"Usei: {numeracao_formatada}"
-            bbox = self._calculate_text_bbox(draw, usei_text, self.fonts['description'])
+            bbox = self._calculate_text_bbox(draw, usei_text, ctx.fonts['description'])
             max_width = max(max_width, bbox[2] - bbox[0])
 
         # 5. Preços
         if is_promotional and product['PrecoPromocional'] > 0:
             # DE R$XX,XX POR (fonte description)
             de_por_text = f"DE {self._format_price_text(product['Preco'])} POR"
-            bbox = self._calculate_text_bbox(draw, de_por_text, self.fonts['description'])
+            bbox = self._calculate_text_bbox(draw, de_por_text, ctx.fonts['description'])
             max_width = max(max_width, bbox[2] - bbox[0])
             
             # R$XX,XX no cartão (fonte price_promo)
             promo_text = f"{self._format_price_text(product['PrecoPromocional'])} no cartão"
-            bbox = self._calculate_text_bbox(draw, promo_text, self.fonts['price_promo'])
+            bbox = self._calculate_text_bbox(draw, promo_text, ctx.fonts['price_promo'])
             max_width = max(max_width, bbox[2] - bbox[0])
 
             # R$XX,XX à vista (fonte price_promo)
             if product['PrecoPromocionalAVista'] > 0:
                 vista_text = f"{self._format_price_text(product['PrecoPromocionalAVista'])} à vista"
-                bbox = self._calculate_text_bbox(draw, vista_text, self.fonts['price_promo'])
+                bbox = self._calculate_text_bbox(draw, vista_text, ctx.fonts['price_promo'])
                 max_width = max(max_width, bbox[2] - bbox[0])
         else:
             # Preço normal
             price_text = self._format_price_text(product['Preco'])
-            bbox = self._calculate_text_bbox(draw, price_text, self.fonts['price'])
+            bbox = self._calculate_text_bbox(draw, price_text, ctx.fonts['price'])
             max_width = max(max_width, bbox[2] - bbox[0])
         
         return int(max_width)
     
-    def _calculate_uniform_block_width(self, draw, products, check_promotional=True):
+    def _calculate_uniform_block_width(self, draw, ctx, products, check_promotional=True, metrics=None):
         """
         Calcula a largura UNIFORME para todos os blocos de produtos.
         Encontra a maior largura mínima necessária entre todos os produtos.
@@ -635,31 +672,35 @@ class ImageProcessor:
             draw: Objeto de desenho
             products (list): Lista de produtos
             check_promotional (bool): Se deve verificar se cada produto é promocional
+            metrics (list): BlockMetrics já medidos dos produtos (opcional)
         
         Returns:
             int: Largura uniforme para todos os blocos (com padding horizontal interno)
         """
         max_width = 0
         
-        for product in products:
-            is_promo = check_promotional and product['PrecoPromocional'] > 0
-            width = self._calculate_min_width_for_product(draw, product, is_promo)
-            max_width = max(max_width, width)
+        if metrics is not None:
+            max_width = max((m.min_width for m in metrics), default=0)
+        else:
+            for product in products:
+                is_promo = check_promotional and product['PrecoPromocional'] > 0
+                width = self._calculate_min_width_for_product(draw, ctx, product, is_promo)
+                max_width = max(max_width, width)
         
         # Adicionar padding horizontal interno (blocoPaddingX de cada lado)
-        padding_x_interno = self._get_padding_x()
+        padding_x_interno = ctx.padding_x
         block_width = max_width + (2 * padding_x_interno)
         logger.info(f"   📐 Largura bloco: texto={max_width}px + (2 * paddingX={padding_x_interno}) = {block_width}px")
 
-        if self._padroniza_largura_bloco():
-            largura_padrao = self._calculate_standard_block_width(draw)
+        if ctx.padroniza_largura_bloco:
+            largura_padrao = self._calculate_standard_block_width(draw, ctx)
             if largura_padrao > block_width:
                 logger.info(f"   📐 Largura padronizada: {block_width}px -> {largura_padrao}px")
             block_width = max(block_width, largura_padrao)
 
         return int(block_width)
     
-    def _calculate_dynamic_block_width(self, draw, product, is_promotional=False):
+    def _calculate_dynamic_block_width(self, draw, ctx, product, is_promotional=False):
         """
         DEPRECATED: Mantido para compatibilidade.
         Use _calculate_uniform_block_width para largura uniforme entre produtos.
@@ -684,58 +725,40 @@ class ImageProcessor:
             ]
             max_text_width = 0
             for text in reference_texts:
-                bbox = self._calculate_text_bbox(draw, text, self.fonts['price'])
+                bbox = self._calculate_text_bbox(draw, text, ctx.fonts['price'])
                 text_width = bbox[2] - bbox[0]
                 max_text_width = max(max_text_width, text_width)
         else:
             # Texto de referência normal: "Tam: ESGOTADO"
-            reference_text = "Tam: ESGOTADO"
-            bbox = self._calculate_text_bbox(draw, reference_text, self.fonts['description'])
-            max_text_width = bbox[2] - bbox[0]
+            max_text_width = text_measurer.font_metrics(draw, ctx.fonts['description']).description_max_width
         
         # Adicionar padding (2x PADDING_X para esquerda e direita)
-        padding_x_interno = self._get_padding_x()
+        padding_x_interno = ctx.padding_x
         block_width = max_text_width + (2 * padding_x_interno)
         logger.info(f"   📐 Largura bloco: texto={max_text_width}px + (2 * paddingX={padding_x_interno}) = {block_width}px")
         
         return int(block_width)
     
-    def _draw_product_block(self, draw, product, block_x_start, block_y_start, block_width, block_total_height, is_promotional):
+    def _plan_block_lines(self, draw, ctx, product, block_x_start, block_y_start, block_width, is_promotional, description_lines=None):
         """
-        Desenha um bloco de produto na imagem
+        Posiciona as linhas de texto de um bloco de produto (sem desenhar nada)
         
         Args:
-            draw (PIL.ImageDraw): Objeto de desenho
+            draw (PIL.ImageDraw): Objeto de desenho (só pra medir texto)
             product (dict): Dados do produto
             block_x_start (int): Posição X inicial do bloco
             block_y_start (int): Posição Y inicial do bloco
             block_width (int): Largura do bloco
-            block_total_height (int): Altura total do bloco
             is_promotional (bool): Se é uma promoção
-        """
-        block_x_end = block_x_start + block_width
-        block_y_end = block_y_start + block_total_height
+            description_lines (list): Descrição já quebrada em linhas (opcional)
         
-        # Cores dinâmicas (do theme_config se disponível)
-        if is_promotional:
-            bg_color = self._get_promo_bg_color()
-            text_color = self._get_promo_text_color()
-        else:
-            bg_color = self._get_normal_bg_color()
-            text_color = self._get_normal_text_color()
-        
-        logger.info(f"      🔲 _draw_product_block: coords=({block_x_start},{block_y_start}) -> ({block_x_end},{block_y_end})")
-        logger.info(f"      🎨 bg_color={bg_color}, text_color={text_color}, is_promo={is_promotional}")
-        
-        # Desenhar fundo do bloco
-        draw.rectangle(
-            [(block_x_start, block_y_start), (block_x_end, block_y_end)],
-            fill=bg_color
-        )
-        logger.info(f"      ✅ Retângulo de fundo desenhado")
+        Returns:
+            tuple: TextLine na ordem de desenho
+        """
+        lines = []
         
         # Inicializar cursor de posição Y para texto (usa padding interno vertical)
-        padding_y_interno = self._get_bloco_padding_y()
+        padding_y_interno = ctx.bloco_padding_y
         text_cursor_y = block_y_start + padding_y_interno
         
         # Dados do produto
@@ -750,40 +773,38 @@ class ImageProcessor:
         # Formatar numeração utilizada - remover duplicação tipo "52 (52)"
         numeracao_utilizada = self._format_numeracao_utilizada(numeracao_utilizada_raw)
         
-        # Helper para centralizar texto (com sombra se promocional)
-        def draw_centered_text(text, y_pos, font, use_shadow=is_promotional):
+        # Helper para centralizar texto
+        def centered_line(text, y_pos, font):
             bbox = self._calculate_text_bbox(draw, text, font)
             text_width = bbox[2] - bbox[0]
             text_x = block_x_start + (block_width - text_width) / 2
-            self._draw_text_with_shadow(draw, (text_x, y_pos), text, font, text_color, shadow=use_shadow)
+            lines.append(TextLine(text, font, text_x, y_pos))
             return bbox
         
         # Texto: Descrição Final (quebrar em até 2 linhas se necessário)
-        reference_text = "Tam: ESGOTADO"
-        bbox_ref = self._calculate_text_bbox(draw, reference_text, self.fonts['description'])
-        max_width = bbox_ref[2] - bbox_ref[0]
-        
-        description_lines = self._split_description(descricao_final, max_width, self.fonts['description'], draw)
+        if description_lines is None:
+            max_width = text_measurer.font_metrics(draw, ctx.fonts['description']).description_max_width
+            description_lines = self._split_description(descricao_final, max_width, ctx.fonts['description'], draw)
         for line in description_lines:
-            bbox = draw_centered_text(line, text_cursor_y, self.fonts['description'])
-            text_cursor_y += (bbox[3] - bbox[1]) * self._get_line_height()
+            bbox = centered_line(line, text_cursor_y, ctx.fonts['description'])
+            text_cursor_y += (bbox[3] - bbox[1]) * ctx.line_height
         
         # Texto: Referência
         ref_text = f"Ref {referencia}"
-        bbox = draw_centered_text(ref_text, text_cursor_y, self.fonts['description'])
-        text_cursor_y += (bbox[3] - bbox[1]) * self._get_line_height()
+        bbox = centered_line(ref_text, text_cursor_y, ctx.fonts['description'])
+        text_cursor_y += (bbox[3] - bbox[1]) * ctx.line_height
         
         # Texto: Tamanhos Disponíveis (não numeração utilizada!)
         if tamanhos_disponiveis and tamanhos_disponiveis != 'N/A':
             tam_text = f"Tam: {tamanhos_disponiveis}"
-            bbox = draw_centered_text(tam_text, text_cursor_y, self.fonts['description'])
-            text_cursor_y += (bbox[3] - bbox[1]) * self._get_line_height()
+            bbox = centered_line(tam_text, text_cursor_y, ctx.fonts['description'])
+            text_cursor_y += (bbox[3] - bbox[1]) * ctx.line_height
         
         # Texto: Usei (numeração utilizada) - pula se não informada
         if numeracao_utilizada_raw and numeracao_utilizada_raw != 'N/A':
             usei_text = f"Usei: {numeracao_utilizada}"
-            bbox = draw_centered_text(usei_text, text_cursor_y, self.fonts['description'])
-            text_cursor_y += (bbox[3] - bbox[1]) * self._get_line_height()
+            bbox = centered_line(usei_text, text_cursor_y, ctx.fonts['description'])
+            text_cursor_y += (bbox[3] - bbox[1]) * ctx.line_height
 
         # Seção de Preço (centralizado)
         if preco_promocional > 0:
@@ -793,54 +814,152 @@ class ImageProcessor:
             por_text = "POR"
             
             # Calcular larguras usando fonte description (menor)
-            de_bbox = self._calculate_text_bbox(draw, de_text, self.fonts['description'])
-            preco_antigo_bbox = self._calculate_text_bbox(draw, preco_antigo_text, self.fonts['description'])
-            por_bbox = self._calculate_text_bbox(draw, por_text, self.fonts['description'])
+            de_bbox = self._calculate_text_bbox(draw, de_text, ctx.fonts['description'])
+            preco_antigo_bbox = self._calculate_text_bbox(draw, preco_antigo_text, ctx.fonts['description'])
+            por_bbox = self._calculate_text_bbox(draw, por_text, ctx.fonts['description'])
             de_width = de_bbox[2] - de_bbox[0]
             preco_antigo_width = preco_antigo_bbox[2] - preco_antigo_bbox[0]
             por_width = por_bbox[2] - por_bbox[0]
-            spacing = 6  # Espaço entre palavras
+            spacing = ctx.word_spacing  # Espaço entre palavras
             total_width = de_width + spacing + preco_antigo_width + spacing + por_width
             
             # Centralizar a linha completa
             line_x_start = block_x_start + (block_width - total_width) / 2
             
-            # Desenhar "DE" (sem risco)
-            self._draw_text_with_shadow(draw, (line_x_start, text_cursor_y), de_text, self.fonts['description'], text_color, shadow=is_promotional)
+            # "DE" (sem risco)
+            lines.append(TextLine(de_text, ctx.fonts['description'], line_x_start, text_cursor_y))
             
-            # Desenhar "R$XX,XX" (com risco) - posição após "DE"
+            # "R$XX,XX" (com risco APENAS sobre o preço antigo) - posição após "DE"
             preco_x = line_x_start + de_width + spacing
-            self._draw_text_with_shadow(draw, (preco_x, text_cursor_y), preco_antigo_text, self.fonts['description'], text_color, shadow=is_promotional)
-            
-            # Desenhar linha riscada APENAS sobre o preço antigo
             strike_y = text_cursor_y + (preco_antigo_bbox[3] - preco_antigo_bbox[1]) / 2 - 1
-            draw.line(
-                [(preco_x, int(strike_y)), (preco_x + preco_antigo_width, int(strike_y))],
-                fill=text_color,
-                width=2
-            )
+            lines.append(TextLine(
+                preco_antigo_text, ctx.fonts['description'], preco_x, text_cursor_y,
+                strike=[(preco_x, int(strike_y)), (preco_x + preco_antigo_width, int(strike_y))]
+            ))
             
-            # Desenhar "POR" ao lado
+            # "POR" ao lado
             por_x = preco_x + preco_antigo_width + spacing
-            self._draw_text_with_shadow(draw, (por_x, text_cursor_y), por_text, self.fonts['description'], text_color, shadow=is_promotional)
+            lines.append(TextLine(por_text, ctx.fonts['description'], por_x, text_cursor_y))
             
-            text_cursor_y += (de_bbox[3] - de_bbox[1]) * self._get_line_height()
+            text_cursor_y += (de_bbox[3] - de_bbox[1]) * ctx.line_height
             
             # Linha 2: Preço promocional (no cartão)
             promo_text = f"{self._format_price_text(preco_promocional)} no cartão"
-            bbox = draw_centered_text(promo_text, text_cursor_y, self.fonts['price_promo'])
-            text_cursor_y += (bbox[3] - bbox[1]) * self._get_line_height()
+            bbox = centered_line(promo_text, text_cursor_y, ctx.fonts['price_promo'])
+            text_cursor_y += (bbox[3] - bbox[1]) * ctx.line_height
 
             # Linha 3: Preço à vista (última linha - não incrementa cursor)
             if preco_promocional_a_vista > 0:
                 vista_text = f"{self._format_price_text(preco_promocional_a_vista)} à vista"
-                draw_centered_text(vista_text, text_cursor_y, self.fonts['price_promo'])
+                centered_line(vista_text, text_cursor_y, ctx.fonts['price_promo'])
         else:
             # Preço normal (última linha - não incrementa cursor)
             price_text = self._format_price_text(preco)
-            draw_centered_text(price_text, text_cursor_y, self.fonts['price'])
+            centered_line(price_text, text_cursor_y, ctx.fonts['price'])
+        
+        return tuple(lines)
     
-    def _draw_esgotado_flag(self, image, block_x_start, block_y_start, block_width, block_total_height):
+    def measure_products(self, draw, ctx, products):
+        """
+        Mede cada produto uma vez: quebra da descrição, largura mínima e altura
+        
+        Args:
+            draw (PIL.ImageDraw): Objeto de desenho (só pra medir texto)
+            ctx (RenderContext): Contexto da tarefa
+            products (list): Produtos já normalizados
+        
+        Returns:
+            tuple: BlockMetrics, na mesma ordem de products
+        """
+        max_desc_width = text_measurer.font_metrics(draw, ctx.fonts['description']).description_max_width
+        metrics = []
+        for product in products:
+            is_promotional = product['PrecoPromocional'] > 0
+            description_lines = tuple(self._split_description(product['DescricaoFinal'], max_desc_width, ctx.fonts['description'], draw))
+            metrics.append(BlockMetrics(
+                product,
+                is_promotional,
+                self._calculate_min_width_for_product(draw, ctx, product, is_promotional, description_lines),
+                description_lines,
+                self._calculate_block_height(draw, ctx, product, description_lines),
+            ))
+        return tuple(metrics)
+    
+    def build_layout_plan(self, draw, ctx, products, bottom_y=0, metrics=None):
+        """
+        Mede e posiciona todos os blocos de uma vez (ver app/utils/layout.py)
+        
+        Args:
+            draw (PIL.ImageDraw): Objeto de desenho (só pra medir texto)
+            ctx (RenderContext): Contexto da tarefa
+            products (list): Produtos já normalizados, de cima pra baixo
+            bottom_y (int): Y da borda inferior do último bloco (altura da imagem - paddingY)
+            metrics (tuple): BlockMetrics de products, já medidos (opcional - senão mede aqui)
+        
+        Returns:
+            LayoutPlan: blocos de baixo pra cima, prontos pra desenhar
+        """
+        if metrics is None:
+            metrics = self.measure_products(draw, ctx, products)
+        block_width = self._calculate_uniform_block_width(draw, ctx, products, check_promotional=True, metrics=metrics)
+        
+        blocks = []
+        current_y_offset = bottom_y
+        for measured in reversed(metrics):
+            product = measured.product
+            block_height = measured.height
+            block_y_start = current_y_offset - block_height
+            block_x_start = ctx.bloco_x
+            
+            lines = self._plan_block_lines(
+                draw, ctx, product, block_x_start, block_y_start, block_width, measured.is_promotional, measured.description_lines
+            )
+            blocks.append(BlockPlan(product, measured.is_promotional, block_x_start, block_y_start, block_width, block_height, lines))
+            
+            # Próximo bloco acima (BLOCK_SPACING entre blocos)
+            current_y_offset = block_y_start - ctx.block_spacing
+        
+        total_height = sum(block.height for block in blocks) + ctx.block_spacing * max(len(blocks) - 1, 0)
+        has_promo = any(block.is_promotional for block in blocks)
+        return LayoutPlan(tuple(blocks), int(block_width), int(total_height), has_promo)
+    
+    def _draw_product_block(self, draw, ctx, block):
+        """
+        Desenha um bloco de produto já posicionado na imagem
+        
+        Args:
+            draw (PIL.ImageDraw): Objeto de desenho
+            ctx (RenderContext): Contexto da tarefa (cores)
+            block (BlockPlan): Bloco do LayoutPlan
+        """
+        # Cores dinâmicas (do theme_config se disponível)
+        if block.is_promotional:
+            bg_color = ctx.promo_bg_color
+            text_color = ctx.promo_text_color
+        else:
+            bg_color = ctx.normal_bg_color
+            text_color = ctx.normal_text_color
+        
+        (block_x_start, block_y_start), (block_x_end, block_y_end) = block.box
+        logger.info(f"      🔲 _draw_product_block: coords=({block_x_start},{block_y_start}) -> ({block_x_end},{block_y_end})")
+        logger.info(f"      🎨 bg_color={bg_color}, text_color={text_color}, is_promo={block.is_promotional}")
+        
+        # Desenhar fundo do bloco
+        draw.rectangle(block.box, fill=bg_color)
+        
+        # Linhas de texto (com sombra se promocional)
+        for line in block.lines:
+            self._draw_text_with_shadow(draw, (line.x, line.y), line.text, line.font, text_color, shadow=block.is_promotional)
+            if line.strike:
+                draw.line(line.strike, fill=text_color, width=ctx.strike_width)
+    
+    def _draw_layout_plan(self, draw, ctx, plan):
+        """Desenha todos os blocos de um LayoutPlan"""
+        for block in plan.blocks:
+            self._draw_product_block(draw, ctx, block)
+            # Faixa ESGOTADO removida - mantida apenas a indicação "Tam: ESGOTADO" no texto
+    
+    def _draw_esgotado_flag(self, image, ctx, block_x_start, block_y_start, block_width, block_total_height):
         """
         Desenha a faixa "ESGOTADO" sobre o bloco do produto
         
@@ -867,14 +986,14 @@ class ImageProcessor:
             
             # Centralizar texto "ESGOTADO"
             esgotado_text = "ESGOTADO"
-            bbox = self._calculate_text_bbox(strip_draw, esgotado_text, self.fonts['esgotado'])
+            bbox = self._calculate_text_bbox(strip_draw, esgotado_text, ctx.fonts['esgotado'])
             text_x = (strip_image.width - (bbox[2] - bbox[0])) / 2
             text_y = (strip_image.height - (bbox[3] - bbox[1])) / 2
             
             strip_draw.text(
                 (text_x, text_y),
                 esgotado_text,
-                font=self.fonts['esgotado'],
+                font=ctx.fonts['esgotado'],
                 fill=(255, 255, 255, 255)
             )
             
@@ -888,74 +1007,72 @@ class ImageProcessor:
             logger.error(f"Erro ao desenhar faixa 'ESGOTADO': {e}")
             return image
     
-    def _calculate_block_height(self, draw, product):
+    def _calculate_block_height(self, draw, ctx, product, description_lines=None):
         """
         Calcula a altura necessária para renderizar um bloco de produto
         
         Args:
             draw (PIL.ImageDraw): Objeto de desenho
             product (dict): Dados do produto
+            description_lines (list): Descrição já quebrada em linhas (opcional)
         
         Returns:
             int: Altura total do bloco
         """
-        padding_y_interno = self._get_bloco_padding_y()
-        line_height = self._get_line_height()
+        padding_y_interno = ctx.bloco_padding_y
+        line_height = ctx.line_height
         
         # Iniciar com padding superior
         height = padding_y_interno
         
         # Descrição (pode ter 1 ou 2 linhas)
-        reference_text = "Tam: ESGOTADO"
-        bbox_ref = self._calculate_text_bbox(draw, reference_text, self.fonts['description'])
-        max_width = bbox_ref[2] - bbox_ref[0]
-        
-        description_lines = self._split_description(product['DescricaoFinal'], max_width, self.fonts['description'], draw)
-        bbox = self._calculate_text_bbox(draw, "X", self.fonts['description'])
-        text_height = bbox[3] - bbox[1]
+        if description_lines is None:
+            max_width = text_measurer.font_metrics(draw, ctx.fonts['description']).description_max_width
+            description_lines = self._split_description(product['DescricaoFinal'], max_width, ctx.fonts['description'], draw)
+        text_height = text_measurer.font_metrics(draw, ctx.fonts['description']).x_height
         
         # Todas as linhas de descrição
         height += len(description_lines) * text_height * line_height
         
         # Referência
         ref_text = f"Ref {product['Referencia']}"
-        bbox = self._calculate_text_bbox(draw, ref_text, self.fonts['description'])
+        bbox = self._calculate_text_bbox(draw, ref_text, ctx.fonts['description'])
         height += (bbox[3] - bbox[1]) * line_height
         
         # Tamanhos disponíveis (se houver)
         if product['TamanhosDisponiveis'] and product['TamanhosDisponiveis'] != 'N/A':
             tam_text = f"Tam: {product['TamanhosDisponiveis']}"
-            bbox = self._calculate_text_bbox(draw, tam_text, self.fonts['description'])
+            bbox = self._calculate_text_bbox(draw, tam_text, ctx.fonts['description'])
             height += (bbox[3] - bbox[1]) * line_height
         
         # Usei (numeração utilizada) - formatada (pula se não informada)
         if product['NumeracaoUtilizada'] and product['NumeracaoUtilizada'] != 'N/A':
             numeracao_formatada = self._format_numeracao_utilizada(product['NumeracaoUtilizada'])
             usei_text = f"Usei: {numeracao_formatada}"
-            bbox = self._calculate_text_bbox(draw, usei_text, self.fonts['description'])
+            bbox = self._calculate_text_bbox(draw, usei_text, ctx.fonts['description'])
             height += (bbox[3] - bbox[1]) * line_height
         
         # Preço (múltiplas linhas se promoção)
         if product['PrecoPromocional'] > 0:
             # Linha 1: "DE XX POR" com fonte description (menor)
-            bbox_desc = self._calculate_text_bbox(draw, "DE R$99,90 POR", self.fonts['description'])
+            bbox_desc = self._calculate_text_bbox(draw, "DE R$99,90 POR", ctx.fonts['description'])
             height += (bbox_desc[3] - bbox_desc[1]) * line_height
             
             # Linha 2: preço no cartão (com fonte price_promo)
-            bbox_price = self._calculate_text_bbox(draw, "R$69,90 no cartão", self.fonts['price_promo'])
+            bbox_price = self._calculate_text_bbox(draw, "R$69,90 no cartão", ctx.fonts['price_promo'])
             height += (bbox_price[3] - bbox_price[1]) * line_height
 
             # Linha 3 (última): preço à vista (com fonte price_promo)
-            bbox_vista = self._calculate_text_bbox(draw, "R$64,31 à vista", self.fonts['price_promo'])
+            bbox_vista = self._calculate_text_bbox(draw, "R$64,31 à vista", ctx.fonts['price_promo'])
             price_text_height = bbox_vista[3] - bbox_vista[1]
             height += price_text_height
-            ultima_linha_fonte = self.fonts['price_promo']
+            ultima_linha_fonte = ctx.fonts['price_promo']
         else:
             # Preço normal (última linha) - apenas altura do texto, sem line_height
-            bbox = self._calculate_text_bbox(draw, "R$239,90", self.fonts['price'])
+            bbox = self._calculate_text_bbox(draw, "R$239,90", ctx.fonts['price'])
             price_text_height = bbox[3] - bbox[1]
             height += price_text_height
-            ultima_linha_fonte = self.fonts['price']
+            ultima_linha_fonte = ctx.fonts['price']
 
         # Padding inferior + ajuste baseado nas métricas reais da fonte da ÚLTIMA linha
         # (price_promo pode ter tamanho diferente de price agora)
@@ -971,7 +1088,7 @@ class ImageProcessor:
         height += padding_y_interno + ajuste_metrica_fonte
         return int(round(height))
     
-    def process_image(self, task_id, products_data, original_image_url, theme_url=None, generate_dual_version=False, layout_config=None, theme_config=None, desconto_a_vista=5):
+    def process_image(self, task_id, products_data, original_image_url, theme_url=None, generate_dual_version=False, layout_config=None, theme_config=None, desconto_a_vista=5, renditions=None, callback_url=None, raise_errors=False, will_retry=False):
         """
         Processa uma imagem com os dados de produtos
         Se generate_dual_version=True, processa 2 versões (com e sem tema)
@@ -985,22 +1102,23 @@ class ImageProcessor:
             layout_config (dict): Configurações de layout (blocoX, blocoY, fontes, etc.)
             theme_config (dict): Configurações de tema (cores, fonte)
             desconto_a_vista (float): Percentual de desconto à vista (default 5%)
+            renditions (list): Saídas extras do payload (ver app/utils/renditions.py)
+            callback_url (str): Webhook avisado no COMPLETED/FAILED (opcional)
+            raise_errors (bool): Propaga a exceção depois de atualizar o status (fila RQ)
+            will_retry (bool): Haverá nova tentativa - em caso de erro a tarefa volta
+                para PENDING em vez de FAILED
         
         Returns:
             str: Caminho do arquivo salvo ou None em caso de erro
         """
-        # Aplicar configs dinâmicas
-        self.layout_config = layout_config
-        self.theme_config = theme_config
-        self.desconto_a_vista = desconto_a_vista or 5
+        # Aplicar configs dinâmicas (contexto próprio da tarefa, nada é gravado em self)
+        ctx = self.create_render_context(layout_config, theme_config, desconto_a_vista)
         
-        # Recarregar fontes com tamanhos dinâmicos se layout_config foi fornecido
         if layout_config or theme_config:
-            self.fonts = self._load_fonts_with_config(layout_config, theme_config)
-            logger.info(f"   📐 Layout dinâmico aplicado: blocoX={self._get_bloco_x()}, blocoY={self._get_padding_y()}, spacing={self._get_block_spacing()}")
-            logger.info(f"   📐 Padding interno: paddingX={self._get_padding_x()}, paddingY={self._get_bloco_padding_y()}")
-            logger.info(f"   🎨 Cores dinâmicas aplicadas: promo_bg={self._get_promo_bg_color()}")
-            logger.info(f"   💰 Desconto à vista: {self.desconto_a_vista}%")
+            logger.info(f"   📐 Layout dinâmico aplicado: blocoX={ctx.bloco_x}, blocoY={ctx.padding_y}, spacing={ctx.block_spacing}")
+            logger.info(f"   📐 Padding interno: paddingX={ctx.padding_x}, paddingY={ctx.bloco_padding_y}")
+            logger.info(f"   🎨 Cores dinâmicas aplicadas: promo_bg={ctx.promo_bg_color}")
+            logger.info(f"   💰 Desconto à vista: {ctx.desconto_a_vista}%")
         
         logger.info(f"========================================")
         logger.info(f"🚀 Iniciando processamento de imagem")
@@ -1014,237 +1132,273 @@ class ImageProcessor:
         task_manager.update_task_status(task_id, "PROCESSING")
         
         try:
-            # 1. Download da imagem original
-            logger.info(f"📥 Baixando imagem original...")
-            base_image = self._download_image(original_image_url)
-            width, height = base_image.size
-            logger.info(f"✅ Imagem original carregada: {width}x{height}")
-            
-            # 2. Preparar versões (com e sem tema)
-            base_image_no_theme = None
-            if generate_dual_version and theme_url:
-                # Salvar cópia sem tema para versão normal
-                base_image_no_theme = base_image.copy()
-                logger.info(f"💾 Salvando cópia da imagem original (sem tema) para versão normal")
-            
-            # Aplicar tema (se fornecido e disponível)
-            if theme_url:
-                try:
-                    logger.info(f"🎨 TEMA DETECTADO - Iniciando download...")
-                    logger.info(f"   URL completa do tema: {theme_url}")
-                    theme_image = self._download_image(theme_url)
-                    logger.info(f"✅ Tema baixado com sucesso: {theme_image.size}")
-                    base_image = self._apply_theme(base_image, theme_image)
-                    logger.info(f"✅ TEMA APLICADO COM SUCESSO na imagem base")
-                except Exception as e:
-                    logger.warning(f"⚠️ FALHA ao aplicar tema: {e}")
-                    logger.warning(f"⚠️ Continuando processamento sem tema - apenas blocos de produto")
+            outputs = self.render_job(
+                products_data, original_image_url, theme_url, generate_dual_version,
+                layout_config, theme_config, desconto_a_vista, renditions, ctx=ctx
+            )
+            final_path = self.complete_task(task_id, outputs)
+            if callback_url:
+                webhook_dispatcher.notify(task_id, callback_url)
+            return final_path
+        
+        except Exception as e:
+            logger.error(f"Erro ao processar imagem para tarefa {task_id}: {e}", exc_info=True)
+            if will_retry:
+                task_manager.update_task_status(task_id, "PENDING", error_message=str(e))
             else:
-                logger.warning("⚠️ NENHUM TEMA FORNECIDO - Processando apenas com overlay de blocos")
+                task_manager.update_task_status(task_id, "FAILED", error_message=str(e))
+                if callback_url:
+                    webhook_dispatcher.notify(task_id, callback_url)
+            if raise_errors:
+                raise
+            return None
+
+    def render_job(self, products_data, original_image_url, theme_url=None, generate_dual_version=False, layout_config=None, theme_config=None, desconto_a_vista=5, renditions=None, ctx=None):
+        """
+        Baixa as imagens e renderiza, sem tocar no status da tarefa nem no disco
+        (process_image grava o resultado; /api/v1/render devolve direto na resposta)
+        
+        Args:
+            (mesmos de process_image)
+            ctx (RenderContext): Contexto já montado (opcional - senão monta aqui)
+        
+        Returns:
+            dict: Saída de render_outputs
+        """
+        if ctx is None:
+            ctx = self.create_render_context(layout_config, theme_config, desconto_a_vista)
+        
+        # 1. Download (I/O) - sempre neste processo, mesmo no modo RENDER_MODE=process
+        # Tema e original baixam ao mesmo tempo (o tema numa thread de download)
+        theme_future = None
+        if theme_url:
+            logger.info(f"🎨 TEMA DETECTADO - Iniciando download...")
+            logger.info(f"   URL completa do tema: {theme_url}")
+            theme_future = submit_download(theme_cache.fetch, theme_url)
+        else:
+            logger.warning("⚠️ NENHUM TEMA FORNECIDO - Processando apenas com overlay de blocos")
+        
+        logger.info(f"📥 Baixando imagem original...")
+        try:
+            original_data = self._fetch_image_bytes(original_image_url)
+        except Exception:
+            if theme_future is not None:
+                theme_future.cancel()
+            raise
+        
+        theme_data, theme_key = None, None
+        if theme_future is not None:
+            try:
+                theme_source = theme_future.result()
+                theme_data, theme_key = theme_source.data, theme_source.key
+            except Exception as e:
+                logger.warning(f"⚠️ FALHA ao baixar tema: {e}")
+                logger.warning(f"⚠️ Continuando processamento sem tema - apenas blocos de produto")
+        
+        # 2. Decodificar, compor, desenhar e codificar (CPU) - nesta thread ou num processo de render
+        dual_version = bool(generate_dual_version and theme_url)
+        parsed_renditions = parse_renditions(renditions)
+        if config.RENDER_MODE == 'process':
+            return render_engine.render(
+                original_data, theme_data, products_data, dual_version,
+                layout_config, theme_config, desconto_a_vista, theme_key, parsed_renditions
+            )
+        return self.render_outputs(ctx, original_data, theme_data, products_data, dual_version, theme_key, parsed_renditions)
+
+    def complete_task(self, task_id, outputs):
+        """
+        Grava a saída de render_job e marca a tarefa como COMPLETED
+        
+        Returns:
+            str: Caminho da imagem principal
+        """
+        final_path, normal_path, rendition_paths = self._save_outputs(task_id, outputs)
+        task_manager.update_task_status(
+            task_id, 
+            "COMPLETED", 
+            final_path=final_path,
+            normal_path=normal_path,
+            renditions=rendition_paths or None
+        )
+        return final_path
+
+    def render_outputs(self, ctx, original_data, theme_data, products_data, dual_version=False, theme_key=None, renditions=()):
+        """
+        Decodifica, aplica o tema, desenha os blocos e codifica o resultado
+        Só CPU, sem I/O de rede/disco - roda numa thread do pool ou num processo de render
+        
+        Args:
+            ctx (RenderContext): Contexto da tarefa
+            original_data (bytes): Imagem original (bytes baixados)
+            theme_data (bytes): Imagem de tema (None se não houver ou se o download falhou)
+            products_data (list): Lista de produtos
+            dual_version (bool): Se deve gerar versão normal (sem tema) + promocional (com tema)
+            theme_key (tuple): ThemeSource.key - reaproveita o overlay já redimensionado (opcional)
+            renditions (tuple): Rendition - saídas extras cortadas da imagem principal
+        
+        Returns:
+            dict: Imagens codificadas - 'final' (principal), 'normal' (modo duplo), 'debug'
+                (SAVE_DEBUG_IMAGES) e 'rendition:<nome>' para cada rendition
+        """
+        # RGB do decode ao encode: tema e blocos são compostos no próprio frame
+        base_image = self._decode_image(original_data, ctx.resize_profile)
+        width, height = base_image.size
+        logger.info(f"✅ Imagem original carregada: {width}x{height}")
+        
+        # 1. Normalizar dados dos produtos
+        normalized_products = []
+        for product in products_data:
+            try:
+                normalized_products.append(validate_product_data(product))
+            except ValueError as e:
+                logger.error(f"Erro ao normalizar produto: {e}")
+                raise
+        
+        # 2. Medir cada produto UMA vez - as duas versões do modo duplo usam as mesmas medidas
+        measure_draw = ImageDraw.Draw(base_image)
+        metrics = self.measure_products(measure_draw, ctx, normalized_products)
+        bottom_y = height - ctx.padding_y
+        
+        if not dual_version:
+            # MODO SIMPLES: tema + TODOS os produtos
+            logger.info(f"📦 MODO SIMPLES: Processando imagem única...")
+            self._apply_theme_data(ctx, base_image, theme_data, theme_key)
+            rendition_futures = self._render_renditions(ctx, base_image, normalized_products, metrics, renditions)
             
-            # 3. Normalizar dados dos produtos
-            normalized_products = []
-            for product in products_data:
-                try:
-                    normalized_products.append(validate_product_data(product))
-                except ValueError as e:
-                    logger.error(f"Erro ao normalizar produto: {e}")
-                    raise
+            draw = ImageDraw.Draw(base_image)
+            plan = self.build_layout_plan(draw, ctx, normalized_products, bottom_y=bottom_y, metrics=metrics)
+            logger.info(f"📏 Largura uniforme calculada: {plan.block_width}px para {len(normalized_products)} produtos")
+            self._draw_layout_plan(draw, ctx, plan)
             
-            # 4. Criar imagem final com blocos de produtos
-            # Se gerar dupla versão: processar NORMAL primeiro (todos produtos, sem tema)
-            # Depois processar PROMOCIONAL (só produtos em oferta, com tema)
+            outputs = {'final': self._encode(base_image, ctx)}
+            outputs.update((key, future.result()) for key, future in rendition_futures.items())
+            logger.info(f"✅ Imagem pronta ({len(normalized_products)} produtos)")
+            return outputs
+        
+        # MODO DUPLO: NORMAL (todos os produtos, sem tema) + PROMOCIONAL (só ofertas, com tema)
+        # Mesmo decode e mesmas medidas; as duas versões são codificadas em paralelo
+        promo_metrics = tuple(m for m in metrics if m.is_promotional)
+        if not promo_metrics:
+            logger.warning(f"⚠️ Nenhum produto promocional encontrado! Pulando versão promocional.")
+        
+        # Cópia sem tema só quando as duas versões existem (a única cópia do frame)
+        normal_image = base_image.copy() if promo_metrics else base_image
+        
+        # Renditions saem da versão principal: a promocional, ou a normal se não houver oferta
+        rendition_futures = {}
+        if not promo_metrics:
+            rendition_futures = self._render_renditions(ctx, normal_image, normalized_products, metrics, renditions)
+        
+        logger.info(f"🎨 MODO DUPLO: Processando versão NORMAL (todos produtos, sem tema)...")
+        draw_normal = ImageDraw.Draw(normal_image)
+        plan_normal = self.build_layout_plan(draw_normal, ctx, normalized_products, bottom_y=bottom_y, metrics=metrics)
+        logger.info(f"📏 Largura uniforme calculada (NORMAL): {plan_normal.block_width}px para {len(normalized_products)} produtos")
+        self._draw_layout_plan(draw_normal, ctx, plan_normal)
+        normal_future = submit_encode(self._encode, normal_image, ctx)
+        
+        # Sem 'final' (nenhuma oferta) - _save_outputs usa a versão normal como padrão
+        outputs = {}
+        if promo_metrics:
+            logger.info(f"🎁 Processando versão PROMOCIONAL ({len(promo_metrics)} produto(s) em oferta, com tema)...")
+            self._apply_theme_data(ctx, base_image, theme_data, theme_key, matte=True)
             
-            # Verificar se há produtos promocionais
-            has_promo = any(p['PrecoPromocional'] > 0 for p in normalized_products)
+            draw_promo = ImageDraw.Draw(base_image)
+            promo_products = [m.product for m in promo_metrics]
+            rendition_futures = self._render_renditions(ctx, base_image, promo_products, promo_metrics, renditions)
+            plan_promo = self.build_layout_plan(draw_promo, ctx, promo_products, bottom_y=bottom_y, metrics=promo_metrics)
+            logger.info(f"   📏 Largura uniforme (PROMO): {plan_promo.block_width}px")
+            self._draw_layout_plan(draw_promo, ctx, plan_promo)
             
-            if generate_dual_version and base_image_no_theme:
-                logger.info(f"🎨 MODO DUPLO: Processando versão NORMAL (todos produtos, sem tema)...")
-                
-                # VERSÃO NORMAL: Base sem tema + TODOS os produtos
-                final_image_normal = base_image_no_theme.copy()
-                draw_normal = ImageDraw.Draw(final_image_normal)
-                
-                current_y_offset_normal = height - self._get_padding_y()
-                
-                # Calcular largura UNIFORME baseada em TODOS os produtos
-                product_block_width_normal = self._calculate_uniform_block_width(draw_normal, normalized_products, check_promotional=True)
-                logger.info(f"📏 Largura uniforme calculada (NORMAL): {product_block_width_normal}px para {len(normalized_products)} produtos")
-                
-                for idx, product in enumerate(reversed(normalized_products)):
-                    is_promotional = product['PrecoPromocional'] > 0
-                    block_height = self._calculate_block_height(draw_normal, product)
-                    block_y_start = current_y_offset_normal - block_height
-                    block_x_start = self._get_bloco_x()
-                    
-                    self._draw_product_block(
-                        draw_normal,
-                        product,
-                        block_x_start,
-                        block_y_start,
-                        product_block_width_normal,
-                        block_height,
-                        is_promotional
-                    )
-                    
-                    # Faixa ESGOTADO removida - mantida apenas a indicação "Tam: ESGOTADO" no texto
-                    
-                    current_y_offset_normal = block_y_start - self._get_block_spacing()
-                
-                # Salvar versão NORMAL
-                output_filename_normal = f"{task_id}_normal.jpg"
-                normal_path = os.path.join(config.TEMP_IMAGES_DIR, output_filename_normal)
-                final_image_normal_rgb = final_image_normal.convert("RGB")
-                final_image_normal_rgb.save(normal_path, "JPEG", quality=config.OUTPUT_IMAGE_QUALITY)
-                logger.info(f"✅ Versão NORMAL salva: {normal_path} ({len(normalized_products)} produtos)")
-                
-                # VERSÃO PROMOCIONAL: Base com tema + APENAS produtos em oferta
-                logger.info(f"🎁 Processando versão PROMOCIONAL (só produtos em oferta, com tema)...")
-                
-                # Filtrar apenas produtos promocionais
-                promo_products = [p for p in normalized_products if p['PrecoPromocional'] > 0]
-                
-                if not promo_products:
-                    logger.warning(f"⚠️ Nenhum produto promocional encontrado! Pulando versão promocional.")
-                    final_path = normal_path  # Usar versão normal como padrão
-                else:
-                    # Criar uma nova imagem RGB a partir da base_image
-                    # Não usar máscara alpha - simplesmente copiar os pixels visíveis
-                    logger.info(f"   🔄 Preparando imagem para desenho (modo: {base_image.mode})...")
-                    
-                    # Compor base_image sobre fundo branco usando alpha_composite
-                    if base_image.mode == 'RGBA':
-                        background = Image.new("RGBA", base_image.size, (255, 255, 255, 255))
-                        composite = Image.alpha_composite(background, base_image)
-                        final_image_promo = composite.convert("RGB")
-                        logger.info(f"   ✅ Imagem composta e convertida para RGB")
-                    else:
-                        final_image_promo = base_image.convert("RGB")
-                        logger.info(f"   ✅ Imagem convertida para RGB diretamente")
-                    
-                    draw_promo = ImageDraw.Draw(final_image_promo)
-                    
-                    current_y_offset_promo = height - self._get_padding_y()
-                    
-                    # Calcular largura UNIFORME baseada apenas nos produtos promocionais
-                    product_block_width_promo = self._calculate_uniform_block_width(draw_promo, promo_products, check_promotional=True)
-                    
-                    logger.info(f"   Processando {len(promo_products)} produto(s) promocional(is)")
-                    logger.info(f"   📏 Largura uniforme (PROMO): {product_block_width_promo}px")
-                    logger.info(f"   📏 Offset Y inicial: {current_y_offset_promo}px")
-                    
-                    for idx, product in enumerate(reversed(promo_products)):
-                        block_height = self._calculate_block_height(draw_promo, product)
-                        block_y_start = current_y_offset_promo - block_height
-                        block_x_start = self._get_bloco_x()
-                        
-                        logger.info(f"   🎯 Desenhando produto {idx+1}: pos=({block_x_start}, {block_y_start}), altura={block_height}px")
-                        
-                        self._draw_product_block(
-                            draw_promo,
-                            product,
-                            block_x_start,
-                            block_y_start,
-                            product_block_width_promo,
-                            block_height,
-                            True  # Sempre promocional
-                        )
-                        
-                        logger.info(f"   ✅ Bloco do produto {idx+1} desenhado")
-                        
-                        # Faixa ESGOTADO removida - mantida apenas a indicação "Tam: ESGOTADO" no texto
-                        
-                        current_y_offset_promo = block_y_start - self._get_block_spacing()
-                    
-                    # Salvar versão PROMOCIONAL
-                    output_filename_promo = f"{task_id}.jpg"
-                    final_path = os.path.join(config.TEMP_IMAGES_DIR, output_filename_promo)
-                    logger.info(f"   📷 [v2.1] Imagem promo antes de salvar: modo={final_image_promo.mode}, tamanho={final_image_promo.size}")
-                    
-                    # DEBUG: Salvar uma cópia de debug para verificar se a imagem está correta
-                    debug_path = os.path.join(config.TEMP_IMAGES_DIR, f"DEBUG_{task_id}.jpg")
-                    final_image_promo.save(debug_path, "JPEG", quality=95)
-                    logger.info(f"   🐞 DEBUG: Imagem de debug salva em: {debug_path}")
-                    
-                    # Se ainda for RGBA (não deveria), converter para RGB
-                    if final_image_promo.mode == 'RGBA':
-                        rgb_image = Image.new("RGB", final_image_promo.size, (255, 255, 255))
-                        rgb_image.paste(final_image_promo, mask=final_image_promo.split()[3])
-                        final_image_promo = rgb_image
-                    
-                    logger.info(f"   📷 [v2.1] Salvando imagem final: modo={final_image_promo.mode}, path={final_path}")
-                    final_image_promo.save(final_path, "JPEG", quality=config.OUTPUT_IMAGE_QUALITY)
-                    
-                    # Verificar se o arquivo foi salvo corretamente
-                    import os as os_check
-                    if os_check.path.exists(final_path):
-                        file_size = os_check.path.getsize(final_path)
-                        logger.info(f"✅ [v2.1] Versão PROMOCIONAL salva: {final_path} (tamanho: {file_size} bytes)")
-                    else:
-                        logger.error(f"❌ ERRO: Arquivo não foi salvo: {final_path}")
-                
-            else:
-                # MODO SIMPLES: Processar normalmente com TODOS os produtos
-                logger.info(f"📦 MODO SIMPLES: Processando imagem única...")
-                
-                final_image = base_image.copy()
-                draw = ImageDraw.Draw(final_image)
-                
-                # Calcular espaço necessário e posições dos blocos
-                current_y_offset = height - self._get_padding_y()
-                
-                # Calcular largura UNIFORME baseada em TODOS os produtos
-                product_block_width = self._calculate_uniform_block_width(draw, normalized_products, check_promotional=True)
-                logger.info(f"📏 Largura uniforme calculada: {product_block_width}px para {len(normalized_products)} produtos")
-                
-                for idx, product in enumerate(reversed(normalized_products)):
-                    is_promotional = product['PrecoPromocional'] > 0
-                    
-                    # Calcular altura do bloco
-                    block_height = self._calculate_block_height(draw, product)
-                    
-                    # Posicionar bloco
-                    block_y_start = current_y_offset - block_height
-                    block_x_start = self._get_bloco_x()
-                    
-                    # Desenhar bloco com cores padrão (preto ou vermelho se promoção)
-                    self._draw_product_block(
-                        draw,
-                        product,
-                        block_x_start,
-                        block_y_start,
-                        product_block_width,
-                        block_height,
-                        is_promotional
-                    )
-                    
-                    # Faixa ESGOTADO removida - mantida apenas a indicação "Tam: ESGOTADO" no texto
-                    
-                    # Atualizar offset para próximo bloco (usar BLOCK_SPACING entre blocos)
-                    current_y_offset = block_y_start - self._get_block_spacing()
-                
-                # Salvar versão SIMPLES (FORA do loop - após processar TODOS os produtos)
-                output_filename = f"{task_id}.jpg"
-                final_path = os.path.join(config.TEMP_IMAGES_DIR, output_filename)
-                final_image_rgb = final_image.convert("RGB")
-                final_image_rgb.save(final_path, "JPEG", quality=config.OUTPUT_IMAGE_QUALITY)
-                logger.info(f"✅ Imagem salva: {final_path} ({len(normalized_products)} produtos)")
-                normal_path = None
+            if config.SAVE_DEBUG_IMAGES:
+                outputs['debug'] = encode(base_image, 'jpeg', quality=95)
+            outputs['final'] = self._encode(base_image, ctx)
+            logger.info(f"✅ Versão PROMOCIONAL pronta (tamanho: {len(outputs['final'])} bytes)")
+        
+        outputs['normal'] = normal_future.result()
+        logger.info(f"✅ Versão NORMAL pronta ({len(normalized_products)} produtos)")
+        outputs.update((key, future.result()) for key, future in rendition_futures.items())
+        
+        return outputs
+
+    def _render_renditions(self, ctx, frame, products, metrics, renditions):
+        """
+        Recorta/redimensiona o frame (já com tema, ainda sem legenda) para cada
+        rendition, desenha a legenda na escala dela e manda codificar em paralelo
+        Renditions com a mesma largura compartilham fontes e medidas
+        
+        Args:
+            ctx (RenderContext): Contexto da tarefa
+            frame (PIL.Image): Frame RGB da imagem principal, antes dos blocos
+            products (list): Produtos da imagem principal
+            metrics (tuple): BlockMetrics de products na escala do frame
+            renditions (tuple): Rendition
+        
+        Returns:
+            dict: 'rendition:<nome>' -> Future com a imagem codificada
+        """
+        futures = {}
+        scaled = {1: (ctx, metrics)}
+        for rendition in renditions:
+            box = crop_box(frame.size, rendition.aspect)
+            size = output_size(rendition, box)
+            image = resize(frame, size, ctx.resize_profile, box=box)
+            draw = ImageDraw.Draw(image)
             
-            # Atualizar status da tarefa
-            task_manager.update_task_status(
-                task_id, 
-                "COMPLETED", 
-                final_path=final_path,
-                normal_path=normal_path
-            )
+            factor = rendition.width / frame.width
+            if factor not in scaled:
+                scaled_ctx = self._scale_render_context(ctx, factor)
+                scaled[factor] = (scaled_ctx, self.measure_products(draw, scaled_ctx, products))
+            rendition_ctx, rendition_metrics = scaled[factor]
             
-            return final_path
+            plan = self.build_layout_plan(draw, rendition_ctx, products, bottom_y=size[1] - rendition_ctx.padding_y, metrics=rendition_metrics)
+            self._draw_layout_plan(draw, rendition_ctx, plan)
+            futures[rendition.output_key()] = submit_encode(self._encode, image, ctx, rendition.quality)
+            logger.info(f"🖼️ Rendition '{rendition.name}': {size[0]}x{size[1]} (recorte {box}, escala {factor:.2f})")
+        return futures
+
+    def _encode(self, image, ctx, quality=None):
+        """Codifica a imagem no formato da tarefa (ctx.output_format), em memória"""
+        return encode(image, ctx.output_format, quality)
+
+    def _save_outputs(self, task_id, outputs):
+        """
+        Grava no result_store as imagens geradas por render_outputs
+        (extensão pelo formato dos bytes: .jpg, .webp ou .avif)
         
-        except Exception as e:
-            logger.error(f"Erro ao processar imagem para tarefa {task_id}: {e}", exc_info=True)
-            task_manager.update_task_status(task_id, "FAILED", error_message=str(e))
-            return None
+        Args:
+            task_id (str): ID único da tarefa
+            outputs (dict): Saída de render_outputs
+        
+        Returns:
+            tuple: (final_path, normal_path, renditions) - normal_path é None fora do
+                modo duplo; renditions é {nome: caminho}
+        """
+        normal_path = None
+        final_path = None
+        rendition_paths = {}
+        
+        if outputs.get('normal') is not None:
+            normal_path = result_store.put(task_id, f"{task_id}_normal{sniff(outputs['normal']).extension}", outputs['normal'])
+            logger.info(f"✅ Versão NORMAL salva: {normal_path}")
+        
+        if outputs.get('debug') is not None:
+            debug_path = result_store.put(task_id, f"DEBUG_{task_id}.jpg", outputs['debug'])
+            logger.info(f"   🐞 DEBUG: Imagem de debug salva em: {debug_path}")
+        
+        if outputs.get('final') is not None:
+            final_path = result_store.put(task_id, f"{task_id}{sniff(outputs['final']).extension}", outputs['final'])
+            logger.info(f"✅ Imagem salva: {final_path} (tamanho: {len(outputs['final'])} bytes)")
+        else:
+            final_path = normal_path  # Usar versão normal como padrão
+        
+        for key, data in outputs.items():
+            if not key.startswith('rendition:'):
+                continue
+            name = key.split(':', 1)[1]
+            rendition_paths[name] = result_store.put(task_id, f"{task_id}_{name}{sniff(data).extension}", data)
+            logger.info(f"✅ Rendition '{name}' salva: {rendition_paths[name]} ({len(data)} bytes)")
+        
+        return final_path, normal_path, rendition_paths
 
     def calculate_legend_size(self, products, layout_config=None):
         """
@@ -1263,25 +1417,16 @@ class ImageProcessor:
         Returns:
             tuple: (width, height, tem_promocao)
         """
-        self.layout_config = layout_config
-        if layout_config:
-            self.fonts = self._load_fonts_with_config(layout_config, None)
+        ctx = self.create_render_context(layout_config)
 
         # Imagem/draw "fake" só pra medir texto (bbox) — nunca é salva nem exibida
         dummy_img = Image.new('RGB', (10, 10))
         draw = ImageDraw.Draw(dummy_img)
 
-        width = self._calculate_uniform_block_width(draw, products, check_promotional=True)
-
-        total_height = 0
-        for idx, product in enumerate(products):
-            total_height += self._calculate_block_height(draw, product)
-            if idx > 0:
-                total_height += self._get_block_spacing()
-
-        tem_promocao = any(p['PrecoPromocional'] > 0 for p in products)
+        # Mesmo plano que o render usa (a posição vertical não importa aqui)
+        plan = self.build_layout_plan(draw, ctx, products)
 
-        return int(width), int(total_height), tem_promocao
+        return plan.width, plan.height, plan.has_promo
 
 # Instância global
 image_processor = ImageProcessor()
@@ -0,0 +1,93 @@
+"""
+Leitura em streaming das imagens baixadas
+O corpo da resposta é lido em blocos com limite de bytes (MAX_DOWNLOAD_MB),
+abortando logo pelo Content-Length quando a origem informa. Nos primeiros KB o
+cabeçalho da imagem já é inspecionado (Image.open é preguiçoso: só lê o
+cabeçalho), então largura/altura são conhecidas cedo e uma imagem com pixels
+demais (MAX_IMAGE_PIXELS) é recusada antes de terminar o download
+"""
+from io import BytesIO
+from PIL import Image
+from app import config
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# Tentativas de ler o cabeçalho (em bytes acumulados) - poucas, para não reabrir o buffer a cada bloco
+HEADER_PROBE_POINTS = (16 * 1024, 64 * 1024, 256 * 1024)
+
+
+class ImageTooLargeError(ValueError):
+    """Imagem acima do limite de bytes ou de pixels"""
+
+
+def check_pixel_limit(size, source="imagem"):
+    """Recusa imagens com mais pixels que MAX_IMAGE_PIXELS (antes de decodificar)"""
+    width, height = size
+    if width * height > config.MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(
+            f"Imagem muito grande ({source}): {width}x{height} = {width * height} pixels, "
+            f"limite {config.MAX_IMAGE_PIXELS}"
+        )
+
+
+def probe_image_size(data):
+    """(largura, altura) pelo cabeçalho, ou None se ainda não há bytes suficientes"""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            return image.size
+    except Image.DecompressionBombError:
+        raise ImageTooLargeError("Imagem muito grande (limite de pixels do Pillow)")
+    except Exception:
+        return None
+
+
+def read_image_response(response, url, max_bytes=None):
+    """
+    Lê o corpo de uma resposta (requests, stream=True) com limites de tamanho
+
+    Args:
+        response (requests.Response): resposta aberta com stream=True
+        url (str): URL (só para as mensagens)
+        max_bytes (int): limite de bytes (padrão MAX_DOWNLOAD_BYTES)
+
+    Returns:
+        bytes: conteúdo completo
+
+    Raises:
+        ImageTooLargeError: se passar do limite de bytes ou de pixels
+    """
+    max_bytes = max_bytes or config.MAX_DOWNLOAD_BYTES
+    try:
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise ImageTooLargeError(
+                f"Download recusado ({content_length} bytes, limite {max_bytes}): {url}"
+            )
+
+        buffer = bytearray()
+        probes = list(HEADER_PROBE_POINTS)
+        size = None
+        for chunk in response.iter_content(CHUNK_SIZE):
+            buffer += chunk
+            if len(buffer) > max_bytes:
+                raise ImageTooLargeError(f"Download passou de {max_bytes} bytes, abortado: {url}")
+
+            if size is None and probes and len(buffer) >= probes[0]:
+                while probes and len(buffer) >= probes[0]:
+                    probes.pop(0)
+                size = probe_image_size(bytes(buffer))
+                if size is not None:
+                    logger.info(f"📐 Dimensões conhecidas após {len(buffer)} bytes: {size[0]}x{size[1]}")
+                    check_pixel_limit(size, url)
+
+        data = bytes(buffer)
+        if size is None:
+            # Arquivo pequeno (ou formato que só abre completo, ex: HEIC)
+            size = probe_image_size(data)
+            if size is not None:
+                check_pixel_limit(size, url)
+        return data
+    finally:
+        response.close()
@@ -0,0 +1,375 @@
+"""
+Fila de tarefas de renderização
+- 'thread' (padrão): pool de threads dentro de cada worker do gunicorn
+- 'rq': o worker web só enfileira no Redis; processos `python worker.py` separados
+  renderizam, com retries (MAX_RETRIES) e timeout por tarefa (TASK_TIMEOUT).
+  Um restart do gunicorn não perde mais as tarefas em andamento
+"""
+import collections
+import os
+import threading
+import time
+from app import config
+from app.utils.logger import get_logger
+from app.utils.image_processor import image_processor
+from app.utils.render_pool import render_pool, QueueFullError
+from app.utils.task_manager import task_manager
+from app.utils.webhooks import webhook_dispatcher
+
+logger = get_logger(__name__)
+
+# Espera entre tentativas (segundos) - precisa do worker com scheduler (worker.py já sobe assim)
+RETRY_INTERVALS = [5, 15, 60]
+
+
+def get_redis_connection():
+    """Conexão Redis para o RQ (bytes, sem decode_responses - exigência do RQ)"""
+    import redis
+    return redis.Redis(
+        host=config.REDIS_HOST,
+        port=config.REDIS_PORT,
+        db=config.REDIS_DB,
+        password=config.REDIS_PASSWORD
+    )
+
+
+def run_process_image_job(task_id, products, original_image_url, theme_url=None, generate_dual_version=False,
+                          layout_config=None, theme_config=None, desconto_a_vista=5, renditions=None,
+                          callback_url=None):
+    """
+    Ponto de entrada executado pelo worker RQ
+
+    Propaga a exceção para o RQ agendar a próxima tentativa; enquanto houver
+    tentativas sobrando a tarefa fica PENDING, e só a última marca FAILED.
+    """
+    from rq import get_current_job
+
+    job = get_current_job()
+    will_retry = bool(job is not None and job.retries_left)
+    if job is not None and job.retries_left is not None and job.retries_left < config.MAX_RETRIES:
+        logger.info(f"🔁 Nova tentativa da tarefa {task_id} (restam {job.retries_left})")
+
+    return image_processor.process_image(
+        task_id, products, original_image_url, theme_url, generate_dual_version,
+        layout_config, theme_config, desconto_a_vista, renditions, callback_url,
+        raise_errors=True, will_retry=will_retry
+    )
+
+
+class RQJobQueue:
+    """Fila durável no Redis consumida por workers RQ separados"""
+
+    def __init__(self, connection=None, name=None):
+        # connection injetável: aceita um redis-server local ou fakeredis.FakeStrictRedis()
+        self._connection = connection
+        self.name = name or config.RQ_QUEUE_NAME
+        self._queue = None
+        self._lock = threading.Lock()
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    from rq import Queue
+                    connection = self._connection or get_redis_connection()
+                    self._queue = Queue(self.name, connection=connection, default_timeout=config.TASK_TIMEOUT)
+        return self._queue
+
+    def submit(self, task_id, *args):
+        """
+        Enfileira uma tarefa (o job RQ usa o próprio task_id como ID)
+
+        Raises:
+            QueueFullError: se já houver RQ_MAX_QUEUED_JOBS aguardando
+        """
+        self._check_capacity(1)
+        return self.queue.enqueue_call(run_process_image_job, args=(task_id,) + args, **self._job_options(task_id))
+
+    def submit_many(self, jobs):
+        """
+        Enfileira um lote inteiro num pipeline só (ou nada, se não couber)
+
+        Args:
+            jobs (list): [(task_id, args)] - args como em submit()
+
+        Raises:
+            QueueFullError: se o lote passar de RQ_MAX_QUEUED_JOBS aguardando
+        """
+        from rq import Queue
+
+        self._check_capacity(len(jobs))
+        return self.queue.enqueue_many([
+            Queue.prepare_data(run_process_image_job, args=(task_id,) + args, **self._job_options(task_id))
+            for task_id, args in jobs
+        ])
+
+    def _check_capacity(self, count):
+        if self.queue.count + count > config.RQ_MAX_QUEUED_JOBS:
+            logger.warning(f"Fila RQ '{self.name}' cheia ({config.RQ_MAX_QUEUED_JOBS}), rejeitando")
+            raise QueueFullError(config.RENDER_RETRY_AFTER)
+
+    def _job_options(self, task_id):
+        """Timeout, retries e TTLs de cada job (o job RQ usa o próprio task_id como ID)"""
+        from rq import Retry
+
+        retry = None
+        if config.MAX_RETRIES > 0:
+            retry = Retry(max=config.MAX_RETRIES, interval=RETRY_INTERVALS[:config.MAX_RETRIES])
+        return dict(
+            job_id=task_id,
+            timeout=config.TASK_TIMEOUT,
+            retry=retry,
+            result_ttl=3600,
+            failure_ttl=86400,
+            description=f"process_image {task_id}"
+        )
+
+    def stats(self):
+        """Tamanho da fila, tarefas em execução e workers conectados"""
+        from rq import Worker
+        from rq.registry import StartedJobRegistry, FailedJobRegistry, ScheduledJobRegistry
+
+        queue = self.queue
+        return {
+            "backend": "rq",
+            "queue": self.name,
+            "queue_depth": queue.count,
+            "queue_capacity": config.RQ_MAX_QUEUED_JOBS,
+            "in_flight": StartedJobRegistry(queue=queue).count,
+            "scheduled_retries": ScheduledJobRegistry(queue=queue).count,
+            "failed": FailedJobRegistry(queue=queue).count,
+            "workers": Worker.count(queue=queue),
+        }
+
+# Instância global (só conecta no Redis se TASK_QUEUE_BACKEND=rq)
+rq_job_queue = RQJobQueue()
+
+
+def submit_render_task(task_id, *args):
+    """
+    Envia a tarefa para o backend configurado em TASK_QUEUE_BACKEND
+
+    Args:
+        task_id (str): ID da tarefa
+        *args: mesmos argumentos de ImageProcessor.process_image depois do task_id
+
+    Raises:
+        QueueFullError: se o backend estiver sem capacidade
+    """
+    if config.TASK_QUEUE_BACKEND == 'rq':
+        return rq_job_queue.submit(task_id, *args)
+    return render_pool.submit(image_processor.process_image, task_id, *args)
+
+
+class _BatchFeeder:
+    """
+    Alimenta o render_pool com as tarefas de um lote, no máximo BATCH_CONCURRENCY
+    por vez: cada tarefa que termina libera a próxima, e as requisições avulsas
+    continuam entrando na fila entre elas em vez de esperar o lote inteiro
+
+    As tarefas a despachar também ficam no registro do lote, sob um lease deste
+    processo (renovado pelo batch_keeper): se o processo cair no meio do lote, outro
+    processo retoma as que não terminaram quando o lease vencer
+    """
+
+    def __init__(self, batch_id, jobs, lease_until=None):
+        self.batch_id = batch_id
+        self.lease_until = lease_until
+        self._pending = collections.deque(jobs)
+        self._in_flight = 0
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        batch_keeper.register(self)
+        for _ in range(max(1, config.BATCH_CONCURRENCY)):
+            self._submit_next()
+
+    def renew(self):
+        """Renova o lease; se outro processo tomou o lote, para de despachar"""
+        if self.lease_until is None:
+            return
+        new_lease_until = time.time() + config.BATCH_LEASE_SECONDS
+        if task_manager.renew_batch_lease(self.batch_id, self.lease_until, new_lease_until):
+            self.lease_until = new_lease_until
+            return
+        logger.warning(f"Lote {self.batch_id} assumido por outro processo; parando de despachar")
+        with self._lock:
+            self._stopped = True
+            self._pending.clear()
+        batch_keeper.unregister(self)
+
+    def _submit_next(self, done=None):
+        with self._lock:
+            if done is not None:
+                self._in_flight -= 1
+            if self._stopped:
+                return
+            if not self._pending:
+                if self._in_flight:
+                    return
+                self._stopped = True  # tudo despachado e terminado
+                job = None
+            else:
+                job = self._pending.popleft()
+                self._in_flight += 1
+        if job is None:
+            batch_keeper.unregister(self)
+            if self.lease_until is not None:
+                task_manager.finish_batch_feed(self.batch_id, self.lease_until)
+            return
+
+        task_id, args = job
+        future = render_pool.try_submit(image_processor.process_image, task_id, *args)
+        if future is None:
+            # Fila tomada por requisições avulsas: a tarefa volta para a frente e tenta depois
+            with self._lock:
+                self._pending.appendleft((task_id, args))
+                self._in_flight -= 1
+            timer = threading.Timer(render_pool.retry_after(), self._submit_next)
+            timer.daemon = True
+            timer.start()
+            return
+        future.add_done_callback(self._submit_next)
+
+
+class _BatchKeeper:
+    """
+    Thread por processo (pool local) que renova os leases dos lotes que este
+    processo alimenta e retoma os lotes cujo lease venceu (processo que caiu)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._feeders = {}  # batch_id -> _BatchFeeder
+        self._pid = None
+        self._resumed = 0
+
+    def register(self, feeder):
+        with self._lock:
+            self._feeders[feeder.batch_id] = feeder
+
+    def unregister(self, feeder):
+        with self._lock:
+            if self._feeders.get(feeder.batch_id) is feeder:
+                del self._feeders[feeder.batch_id]
+
+    def start(self):
+        """Sobe a thread (chamada barata; uma vez por processo, só no pool local)"""
+        if config.TASK_QUEUE_BACKEND == 'rq' or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._feeders = {}  # os de antes do fork são do processo pai
+            threading.Thread(target=self._run, name='batch-keeper', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                with self._lock:
+                    feeders = list(self._feeders.values())
+                for feeder in feeders:
+                    feeder.renew()
+                self._resume_orphans()
+            except Exception as e:
+                logger.error(f"Erro ao manter os lotes em alimentação: {e}")
+            time.sleep(config.BATCH_LEASE_SECONDS / 3)
+
+    def _resume_orphans(self):
+        now = time.time()
+        for batch_id, batch in task_manager.unfed_batches().items():
+            lease_until = batch.get('lease_until')
+            with self._lock:
+                if batch_id in self._feeders:
+                    continue
+            if lease_until is None or lease_until > now:
+                continue
+            new_lease_until = now + config.BATCH_LEASE_SECONDS
+            if not task_manager.renew_batch_lease(batch_id, lease_until, new_lease_until):
+                continue  # outro processo chegou antes
+            # PROCESSING também volta: o processo que renderizava não existe mais
+            statuses = task_manager.get_tasks([task_id for task_id, _ in batch['jobs']])
+            jobs = [
+                (task_id, args) for task_id, args in batch['jobs']
+                if statuses.get(task_id, {}).get('status') in ('PENDING', 'PROCESSING')
+            ]
+            with self._lock:
+                self._resumed += 1
+            logger.info(f"♻️ Lote {batch_id} retomado: {len(jobs)} tarefa(s) sem terminar")
+            _BatchFeeder(batch_id, jobs, new_lease_until).start()
+
+    def stats(self):
+        with self._lock:
+            return {"feeding": len(self._feeders), "resumed": self._resumed}
+
+# Instância global
+batch_keeper = _BatchKeeper()
+
+
+def submit_batch(batch_id, jobs):
+    """
+    Envia as tarefas de um lote (já criado com task_manager.create_batch) para o
+    backend configurado
+
+    Args:
+        batch_id (str): ID do lote
+        jobs (list): [(task_id, args)] - args como em submit_render_task
+
+    Raises:
+        QueueFullError: só no backend rq, se o lote não couber na fila (no pool
+            local as tarefas esperam a vez em vez de serem recusadas)
+    """
+    if config.TASK_QUEUE_BACKEND == 'rq':
+        return rq_job_queue.submit_many(jobs)
+    lease_until = time.time() + config.BATCH_LEASE_SECONDS
+    if not task_manager.start_batch_feed(batch_id, jobs, lease_until):
+        lease_until = None  # sem store compartilhado: só em memória, como antes
+    batch_keeper.start()
+    _BatchFeeder(batch_id, jobs, lease_until).start()
+
+
+def submit_sync_render(*args):
+    """
+    Renderiza no pool local deste worker, sem task store nem disco (/api/v1/render)
+    Sempre local, qualquer que seja o TASK_QUEUE_BACKEND: a resposta sai deste processo
+
+    Args:
+        *args: mesmos argumentos de ImageProcessor.render_job
+
+    Returns:
+        concurrent.futures.Future: saída de render_job
+
+    Raises:
+        QueueFullError: se o pool estiver sem capacidade
+    """
+    return render_pool.submit(image_processor.render_job, *args)
+
+
+def adopt_render(task_id, future, callback_url=None):
+    """
+    Prazo do /api/v1/render estourado: o render que já está rodando vira uma
+    tarefa assíncrona comum - PROCESSING agora, COMPLETED/FAILED quando terminar
+    (o trabalho feito até aqui não é descartado nem refeito)
+    """
+    task_manager.update_task_status(task_id, "PROCESSING")
+
+    def finish(done):
+        try:
+            image_processor.complete_task(task_id, done.result())
+        except Exception as e:
+            logger.error(f"Erro ao processar imagem para tarefa {task_id}: {e}")
+            task_manager.update_task_status(task_id, "FAILED", error_message=str(e))
+        if callback_url:
+            webhook_dispatcher.notify(task_id, callback_url)
+
+    future.add_done_callback(finish)
+
+
+def task_queue_stats():
+    """Métricas do backend de fila em uso"""
+    if config.TASK_QUEUE_BACKEND == 'rq':
+        return rq_job_queue.stats()
+    return dict(render_pool.stats(), backend="thread", batches=batch_keeper.stats())
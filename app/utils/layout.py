@@ -0,0 +1,68 @@
+"""
+Plano de layout da legenda
+Medição e posicionamento dos blocos de produto acontecem UMA vez e viram um
+LayoutPlan explícito (retângulos dos blocos + posição/fonte de cada linha).
+O desenho, o /api/v1/legend-size e as duas versões do modo duplo consomem o
+mesmo plano - o tamanho que o editor vê é exatamente o que vai ser desenhado.
+As medidas de cada produto (BlockMetrics) não dependem da posição: no modo
+duplo são feitas uma vez e servem aos planos das duas versões
+"""
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class TextLine:
+    """Uma linha (ou trecho de linha) de texto já posicionada"""
+
+    text: str
+    font: Any
+    x: float
+    y: float
+    strike: Optional[list] = None  # [(x0, y), (x1, y)] do risco desenhado sobre o texto (preço antigo)
+
+
+@dataclass(frozen=True)
+class BlockMetrics:
+    """Medidas de um produto que não dependem de onde o bloco vai ficar"""
+
+    product: dict
+    is_promotional: bool
+    min_width: int  # maior linha de texto (sem padding)
+    description_lines: Tuple[str, ...]
+    height: int
+
+
+@dataclass(frozen=True)
+class BlockPlan:
+    """Bloco de um produto: retângulo de fundo + linhas na ordem de desenho"""
+
+    product: dict
+    is_promotional: bool
+    x: int
+    y: int
+    width: int
+    height: int
+    lines: Tuple[TextLine, ...]
+
+    @property
+    def box(self):
+        """Retângulo [(x0, y0), (x1, y1)] no formato de draw.rectangle"""
+        return [(self.x, self.y), (self.x + self.width, self.y + self.height)]
+
+
+@dataclass(frozen=True)
+class LayoutPlan:
+    """Legenda completa (blocos de baixo pra cima, na ordem em que são desenhados)"""
+
+    blocks: Tuple[BlockPlan, ...]
+    block_width: int
+    height: int  # altura total: blocos + espaçamento entre eles
+    has_promo: bool
+
+    @property
+    def width(self):
+        return self.block_width
+
+    def __len__(self):
+        return len(self.blocks)
@@ -0,0 +1,92 @@
+"""
+Contexto de renderização por tarefa
+Tudo que depende de layout_config/theme_config (fontes, cores, paddings,
+espaçamentos) é resolvido UMA vez por tarefa e passado adiante, em vez de
+ficar gravado no ImageProcessor global - assim várias renderizações (e
+chamadas de legend-size) rodam em paralelo no mesmo processo sem se pisar
+"""
+from dataclasses import dataclass
+from types import MappingProxyType
+from app import config
+
+
+def parse_rgba(rgba_str):
+    """Converte string rgba(r, g, b, a) para tupla (r, g, b, a)"""
+    if not rgba_str or not isinstance(rgba_str, str):
+        return None
+    try:
+        # rgba(220, 20, 60, 0.86)
+        rgba_str = rgba_str.replace('rgba(', '').replace(')', '')
+        parts = [p.strip() for p in rgba_str.split(',')]
+        r, g, b = int(parts[0]), int(parts[1]), int(parts[2])
+        a = int(float(parts[3]) * 255)  # Converter 0-1 para 0-255
+        return (r, g, b, a)
+    except:
+        return None
+
+
+@dataclass(frozen=True)
+class RenderContext:
+    """Configuração imutável de uma renderização (uma instância por tarefa)"""
+
+    fonts: MappingProxyType
+    padding_x: int  # padding X interno do bloco
+    bloco_x: int  # posição X do início do bloco (distância da borda esquerda)
+    bloco_padding_y: int  # padding Y interno do bloco
+    padding_y: int  # distância da borda inferior
+    block_spacing: int  # espaçamento entre blocos
+    line_height: float  # multiplicador de altura de linha
+    padroniza_largura_bloco: bool
+    promo_bg_color: tuple
+    normal_bg_color: tuple
+    promo_text_color: tuple
+    normal_text_color: tuple
+    desconto_a_vista: float = 5
+    word_spacing: int = 6  # espaço entre "DE", o preço riscado e "POR"
+    strike_width: int = 2  # espessura do risco no preço antigo
+    resize_profile: str = config.RESIZE_PROFILE  # perfil de redimensionamento (app/utils/resize.py)
+    output_format: str = config.OUTPUT_IMAGE_FORMAT  # formato das saídas (app/utils/encoders.py)
+
+    @classmethod
+    def from_configs(cls, fonts, layout_config=None, theme_config=None, desconto_a_vista=5):
+        """
+        Resolve layout_config/theme_config nos valores finais de renderização
+
+        Args:
+            fonts (dict): fontes já carregadas pra esse layout/tema
+            layout_config (dict): configurações de layout (blocoX, blocoY, fontes, etc.)
+            theme_config (dict): configurações de tema (cores, fonte)
+            desconto_a_vista (float): percentual de desconto à vista
+
+        Returns:
+            RenderContext: contexto pronto pra ser compartilhado entre threads
+        """
+        layout = layout_config or {}
+        theme = theme_config or {}
+
+        def color(key, default, rgb_only=False):
+            parsed = parse_rgba(theme.get(key))
+            if not parsed:
+                return default
+            return parsed[:3] if rgb_only else parsed  # RGB sem alpha para texto
+
+        return cls(
+            fonts=MappingProxyType(dict(fonts)),
+            padding_x=layout.get('blocoPaddingX', config.PADDING_X),
+            bloco_x=layout.get('blocoX', config.PADDING_X),
+            bloco_padding_y=layout.get('blocoPaddingY', 8),  # 8 = valor padrão original
+            padding_y=layout.get('blocoY', config.PADDING_Y),
+            block_spacing=layout.get('blocoEspacamento', config.BLOCK_SPACING),
+            line_height=layout.get('linhaAltura', config.LINE_HEIGHT_MULTIPLIER),
+            # Opt-in por chamador (não muda comportamento de quem não manda essa flag no
+            # layout_config, ex: photo-monitor) — padroniza a largura da caixa de informações
+            # entre fotos diferentes, que hoje varia conforme o texto de cada produto.
+            padroniza_largura_bloco=bool(layout.get('padronizarLarguraBloco', False)),
+            promo_bg_color=color('corFundoPromocao', config.COLOR_PROMO_BACKGROUND),
+            normal_bg_color=color('corFundoPadrao', config.COLOR_NORMAL_BACKGROUND),
+            promo_text_color=color('corTextoPromocao', config.COLOR_TEXT_WHITE, rgb_only=True),
+            normal_text_color=color('corTextoPadrao', config.COLOR_TEXT_WHITE, rgb_only=True),
+            desconto_a_vista=desconto_a_vista or 5,
+            resize_profile=layout.get('perfilRedimensionamento') or config.RESIZE_PROFILE,
+            output_format=layout.get('formatoSaida') or config.OUTPUT_IMAGE_FORMAT,
+        )
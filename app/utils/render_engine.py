@@ -0,0 +1,180 @@
+"""
+Motor de renderização em processos separados (RENDER_MODE=process)
+O download continua no processo web; decodificação, composição, desenho e
+codificação rodam em processos de render pré-criados, fora do GIL do worker.
+Os buffers de imagem (bytes baixados na ida, imagens codificadas na volta) trafegam por
+multiprocessing.shared_memory - só metadados pequenos passam por pickle
+
+Os blocos levam os bytes codificados, não pixels decodificados: decodificar no
+processo web (ou codificar lá na volta) devolveria ao GIL justamente o trabalho de
+CPU que este modo tira dele, e um frame RGB de 1080x1440 tem ~4.5MB contra algumas
+centenas de KB do JPEG/PNG
+"""
+import os
+import multiprocessing
+import threading
+import uuid
+from multiprocessing import shared_memory
+from app import config
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _write_shared_buffers(buffers, name=None):
+    """
+    Copia vários buffers para um único bloco de memória compartilhada
+
+    Args:
+        buffers (dict): nome -> bytes (None é ignorado)
+        name (str): nome do bloco (padrão: gerado pelo sistema)
+
+    Returns:
+        tuple: (SharedMemory, layout) - layout é nome -> (offset, tamanho)
+    """
+    layout = {}
+    total = 0
+    for key, data in buffers.items():
+        if data is None:
+            continue
+        layout[key] = (total, len(data))
+        total += len(data)
+
+    shm = shared_memory.SharedMemory(name=name, create=True, size=max(total, 1))
+    for key, (offset, size) in layout.items():
+        shm.buf[offset:offset + size] = buffers[key]
+    return shm, layout
+
+
+def _read_shared_buffers(shm_name, layout, unlink=False):
+    """Lê (copiando) os buffers de um bloco criado por _write_shared_buffers"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        return {key: bytes(shm.buf[offset:offset + size]) for key, (offset, size) in layout.items()}
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+def _unlink_shared(shm_name):
+    """Libera um bloco pelo nome (sem erro se ele não existe ou já foi liberado)"""
+    try:
+        shm = shared_memory.SharedMemory(name=shm_name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _render_in_worker(shm_name, layout, out_name, products_data, dual_version, layout_config, theme_config, desconto_a_vista,
+                      theme_key=None, renditions=()):
+    """
+    Executado dentro do processo de render
+
+    Args:
+        out_name (str): nome do bloco de saída, escolhido pelo processo web para
+            poder liberá-lo se desistir da tarefa
+
+    Returns:
+        tuple: (nome do bloco de saída, layout) - o processo web lê e libera o bloco
+    """
+    # Import tardio: o módulo é carregado uma vez por processo (pré-carregado pelo forkserver)
+    from app.utils.image_processor import image_processor
+
+    inputs = _read_shared_buffers(shm_name, layout)
+    ctx = image_processor.create_render_context(layout_config, theme_config, desconto_a_vista)
+    outputs = image_processor.render_outputs(
+        ctx, inputs['original'], inputs.get('theme'), products_data, dual_version, theme_key, renditions
+    )
+
+    shm, out_layout = _write_shared_buffers(outputs, name=out_name)
+    shm.close()
+    return shm.name, out_layout
+
+
+def _warm_up(_index):
+    """Força o carregamento de Pillow/fontes no processo de render"""
+    from app.utils.image_processor import image_processor
+    return os.getpid()
+
+
+class ProcessRenderEngine:
+    """Pool de processos de render com handoff por memória compartilhada"""
+
+    def __init__(self, processes=None):
+        self.processes = processes or config.RENDER_PROCESSES or os.cpu_count() or 1
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        """Cria o pool na primeira renderização (depois do fork do gunicorn)"""
+        if self._pool is not None:
+            return self._pool
+        with self._lock:
+            if self._pool is None:
+                # forkserver: processos saem de um servidor "limpo" (sem as threads do worker
+                # web) que já importou Pillow/fontes. Windows não tem - cai pra spawn.
+                methods = multiprocessing.get_all_start_methods()
+                if 'forkserver' in methods:
+                    mp_context = multiprocessing.get_context('forkserver')
+                    mp_context.set_forkserver_preload(['app.utils.image_processor'])
+                else:
+                    mp_context = multiprocessing.get_context('spawn')
+
+                pool = mp_context.Pool(processes=self.processes)
+                # Pré-aquece todos os processos antes da primeira tarefa de verdade
+                pids = pool.map(_warm_up, range(self.processes), chunksize=1)
+                logger.info(f"Motor de render em processos iniciado: {self.processes} processos ({len(set(pids))} aquecidos)")
+                self._pool = pool
+        return self._pool
+
+    def render(self, original_data, theme_data, products_data, dual_version=False,
+               layout_config=None, theme_config=None, desconto_a_vista=5, theme_key=None, renditions=()):
+        """
+        Renderiza num processo de render (mesma saída de ImageProcessor.render_outputs)
+
+        Returns:
+            dict: Imagens codificadas ('final', 'normal', 'debug', 'rendition:<nome>')
+        """
+        pool = self._get_pool()
+        out_name = f"render-{os.getpid()}-{uuid.uuid4().hex[:16]}"
+        abandoned = threading.Event()
+
+        def release_if_abandoned(_result):
+            # Resultado que chegou depois do timeout: ninguém vai ler o bloco de saída
+            if abandoned.is_set():
+                _unlink_shared(out_name)
+
+        shm, layout = _write_shared_buffers({'original': original_data, 'theme': theme_data})
+        try:
+            async_result = pool.apply_async(
+                _render_in_worker,
+                (shm.name, layout, out_name, products_data, dual_version, layout_config, theme_config,
+                 desconto_a_vista, theme_key, renditions),
+                callback=release_if_abandoned
+            )
+            out_name, out_layout = async_result.get(timeout=config.TASK_TIMEOUT)
+            return _read_shared_buffers(out_name, out_layout, unlink=True)
+        except BaseException:
+            # Timeout ou erro: libera o bloco de saída agora (se o processo de render já o
+            # criou) ou quando o resultado atrasado chegar (callback acima)
+            abandoned.set()
+            _unlink_shared(out_name)
+            raise
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+# Instância global (o pool só é criado se RENDER_MODE=process)
+render_engine = ProcessRenderEngine()
@@ -0,0 +1,161 @@
+"""
+Pool de renderização com tamanho fixo e fila limitada
+Substitui a thread-por-requisição: sob rajada a vazão estabiliza em vez de
+estourar memória, e o excesso é rejeitado com uma dica de Retry-After
+"""
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from app import config
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class QueueFullError(Exception):
+    """Fila de renderização cheia - a requisição deve ser recusada (HTTP 429)"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Fila de renderização cheia, tente novamente em {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RenderPool:
+    """Executor com N threads fixas e fila de espera limitada"""
+
+    def __init__(self, max_workers=None, max_queue_size=None, retry_after=None):
+        self.max_workers = max_workers or config.RENDER_WORKERS
+        self.max_queue_size = max_queue_size or config.RENDER_QUEUE_SIZE
+        self.min_retry_after = retry_after or config.RENDER_RETRY_AFTER
+
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._lock = threading.Lock()
+        self._workers = []
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._deferred = 0
+        # Média móvel da duração de cada tarefa (segundos) - base do Retry-After
+        self._avg_duration = None
+
+    def _ensure_started(self):
+        """Sobe as threads na primeira submissão (depois do fork do gunicorn)"""
+        if self._workers:
+            return
+        with self._lock:
+            if self._workers:
+                return
+            for idx in range(self.max_workers):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"render-worker-{idx}",
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+            logger.info(f"Pool de renderização iniciado: {self.max_workers} workers, fila de {self.max_queue_size}")
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Enfileira uma tarefa sem bloquear
+
+        Returns:
+            concurrent.futures.Future: resultado da tarefa
+
+        Raises:
+            QueueFullError: se a fila estiver cheia
+        """
+        future = self._enqueue(fn, args, kwargs)
+        if future is None:
+            with self._lock:
+                self._rejected += 1
+            retry_after = self.retry_after()
+            logger.warning(f"Fila de renderização cheia ({self.max_queue_size}), rejeitando (Retry-After={retry_after}s)")
+            raise QueueFullError(retry_after)
+        return future
+
+    def try_submit(self, fn, *args, **kwargs):
+        """
+        Como submit, mas com a fila cheia devolve None em vez de recusar - para quem
+        espera a vez (tarefas de lote): conta como adiada, não como rejeição de cliente
+
+        Returns:
+            concurrent.futures.Future ou None
+        """
+        future = self._enqueue(fn, args, kwargs)
+        if future is None:
+            with self._lock:
+                self._deferred += 1
+        return future
+
+    def _enqueue(self, fn, args, kwargs):
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait((future, fn, args, kwargs))
+        except queue.Full:
+            return None
+        return future
+
+    def _worker_loop(self):
+        while True:
+            future, fn, args, kwargs = self._queue.get()
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                with self._lock:
+                    self._in_flight += 1
+                started = time.monotonic()
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                    failed = False
+                except BaseException as e:
+                    logger.error(f"Erro não tratado no pool de renderização: {e}", exc_info=True)
+                    future.set_exception(e)
+                    failed = True
+
+                duration = time.monotonic() - started
+                with self._lock:
+                    self._in_flight -= 1
+                    if failed:
+                        self._failed += 1
+                    else:
+                        self._completed += 1
+                    if self._avg_duration is None:
+                        self._avg_duration = duration
+                    else:
+                        self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            finally:
+                self._queue.task_done()
+
+    def retry_after(self):
+        """Estimativa (segundos) de quando haverá vaga na fila"""
+        with self._lock:
+            avg_duration = self._avg_duration
+            backlog = self._queue.qsize() + self._in_flight
+        if not avg_duration:
+            return self.min_retry_after
+        estimate = math.ceil(backlog / self.max_workers * avg_duration)
+        return max(self.min_retry_after, estimate)
+
+    def stats(self):
+        """Profundidade da fila e tarefas em execução (para monitoramento)"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self.max_queue_size,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "deferred": self._deferred,
+                "avg_duration_seconds": round(self._avg_duration, 3) if self._avg_duration else None,
+            }
+
+# Instância global
+render_pool = RenderPool()
@@ -0,0 +1,122 @@
+"""
+Renditions: várias saídas (tamanho, recorte, qualidade) de uma mesma tarefa
+Ex.: Stories 9:16 em 1080px, recorte 3:4 para o feed e miniatura para o admin,
+todas a partir do mesmo decode e do mesmo frame com tema. Cada rendition
+recebe a legenda medida de novo na escala dela (fontes e paddings
+proporcionais à largura) e vira um arquivo {task_id}_{nome} (.jpg, .webp ou .avif)
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from app import config
+
+NAME_PATTERN = re.compile(r'^[a-z0-9][a-z0-9-]{0,31}$')
+RESERVED_NAMES = {'normal', 'final', 'debug'}
+MIN_WIDTH = 16
+MAX_ASPECT_RATIO = 4  # lado maior / lado menor
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """Uma saída extra: largura final, proporção do recorte e qualidade do encode"""
+
+    name: str
+    width: int
+    aspect: Optional[Tuple[int, int]] = None  # (largura, altura); None = proporção da foto
+    quality: Optional[int] = None  # None = qualidade padrão do formato
+
+    def output_key(self):
+        """Chave no dict de render_outputs"""
+        return f"rendition:{self.name}"
+
+
+def _parse_aspect(raw):
+    """'9:16' -> (9, 16)"""
+    if raw is None:
+        return None
+    match = re.match(r'^\s*(\d{1,3})\s*:\s*(\d{1,3})\s*$', raw) if isinstance(raw, str) else None
+    if not match:
+        raise ValueError(f"proporção '{raw}' inválida (use 'L:A', ex: '9:16')")
+    aspect = (int(match.group(1)), int(match.group(2)))
+    if min(aspect) == 0:
+        raise ValueError(f"proporção '{raw}' inválida")
+    if max(aspect) / min(aspect) > MAX_ASPECT_RATIO:
+        raise ValueError(f"proporção '{raw}' fora do limite (máximo {MAX_ASPECT_RATIO}:1)")
+    return aspect
+
+
+def parse_renditions(raw):
+    """
+    Lista `renditions` do payload -> tupla de Rendition
+
+    Args:
+        raw (list): [{"name": "stories", "width": 1080, "aspect": "9:16", "quality": 85}, ...]
+
+    Returns:
+        tuple: Rendition, na ordem pedida (vazia se raw for None)
+
+    Raises:
+        ValueError: item inválido (mensagem pronta para o cliente)
+    """
+    if raw is None:
+        return ()
+    if not isinstance(raw, list):
+        raise ValueError("'renditions' deve ser uma lista")
+    if len(raw) > config.MAX_RENDITIONS:
+        raise ValueError(f"Máximo de {config.MAX_RENDITIONS} renditions por requisição")
+
+    renditions, names = [], set()
+    for idx, item in enumerate(raw):
+        if not isinstance(item, dict):
+            raise ValueError(f"Rendition no índice {idx} deve ser um objeto")
+        name = item.get('name')
+        if not isinstance(name, str) or not NAME_PATTERN.match(name) or name in RESERVED_NAMES:
+            raise ValueError(f"Rendition {idx}: 'name' deve ter letras minúsculas, números ou '-' (até 32), e não pode ser {sorted(RESERVED_NAMES)}")
+        if name in names:
+            raise ValueError(f"Rendition {idx}: nome '{name}' repetido")
+        names.add(name)
+
+        width = item.get('width')
+        if isinstance(width, bool) or not isinstance(width, int) or not MIN_WIDTH <= width <= config.MAX_RENDITION_WIDTH:
+            raise ValueError(f"Rendition '{name}': 'width' deve ser inteiro entre {MIN_WIDTH} e {config.MAX_RENDITION_WIDTH}")
+
+        quality = item.get('quality')
+        if quality is not None and (isinstance(quality, bool) or not isinstance(quality, int) or not 1 <= quality <= 95):
+            raise ValueError(f"Rendition '{name}': 'quality' deve ser inteiro entre 1 e 95")
+
+        try:
+            aspect = _parse_aspect(item.get('aspect'))
+        except ValueError as e:
+            raise ValueError(f"Rendition '{name}': {e}")
+        renditions.append(Rendition(name, width, aspect, quality))
+    return tuple(renditions)
+
+
+def crop_box(frame_size, aspect=None):
+    """
+    Maior recorte centralizado do frame com a proporção pedida
+
+    Args:
+        frame_size (tuple): (largura, altura) do frame
+        aspect (tuple): (largura, altura) da proporção, ou None para o frame inteiro
+
+    Returns:
+        tuple: (x0, y0, x1, y1)
+    """
+    width, height = frame_size
+    if aspect is None:
+        return (0, 0, width, height)
+    aspect_w, aspect_h = aspect
+    if width * aspect_h > height * aspect_w:
+        # Frame mais largo que a proporção: corta as laterais
+        box_w, box_h = max(1, round(height * aspect_w / aspect_h)), height
+    else:
+        box_w, box_h = width, max(1, round(width * aspect_h / aspect_w))
+    x0, y0 = (width - box_w) // 2, (height - box_h) // 2
+    return (x0, y0, x0 + box_w, y0 + box_h)
+
+
+def output_size(rendition, box):
+    """Tamanho final (largura pedida, altura pela proporção do recorte)"""
+    box_w, box_h = box[2] - box[0], box[3] - box[1]
+    return rendition.width, max(1, round(rendition.width * box_h / box_w))
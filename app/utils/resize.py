@@ -0,0 +1,44 @@
+"""
+Estágio de redimensionamento
+Cada perfil (RESIZE_PROFILES) define o filtro final e o reducing_gap do Pillow:
+com reducing_gap, a imagem passa antes por um reduce() inteiro (média de
+blocos, muito barato) até ficar a no máximo `gap` vezes o tamanho final, e só
+então o filtro de qualidade roda sobre poucos pixels. O perfil vem do
+layout_config (perfilRedimensionamento) ou do padrão RESIZE_PROFILE
+"""
+from PIL import Image
+from app import config
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RESAMPLE_FILTERS = {
+    'lanczos': Image.Resampling.LANCZOS,
+    'bicubic': Image.Resampling.BICUBIC,
+    'hamming': Image.Resampling.HAMMING,
+    'bilinear': Image.Resampling.BILINEAR,
+    'box': Image.Resampling.BOX,
+}
+
+
+def resolve_profile(name=None):
+    """
+    Nome do perfil -> (filtro, reducing_gap)
+    Perfil desconhecido cai no padrão (com aviso) em vez de falhar a tarefa
+    """
+    name = name or config.RESIZE_PROFILE
+    profile = config.RESIZE_PROFILES.get(name)
+    if profile is None:
+        logger.warning(f"⚠️ Perfil de redimensionamento desconhecido '{name}', usando '{config.RESIZE_PROFILE}'")
+        profile = config.RESIZE_PROFILES[config.RESIZE_PROFILE]
+    filter_name, reducing_gap = profile
+    return RESAMPLE_FILTERS[filter_name], reducing_gap
+
+
+def resize(image, size, profile=None, box=None):
+    """
+    Redimensiona `image` para `size` com o perfil pedido
+    `box` (x0, y0, x1, y1) recorta e redimensiona numa operação só, sem crop() intermediário
+    """
+    resample, reducing_gap = resolve_profile(profile)
+    return image.resize(size, resample, box=box, reducing_gap=reducing_gap)
@@ -0,0 +1,258 @@
+"""
+Armazenamento das imagens geradas (TEMP_IMAGES_DIR)
+- Subdiretórios pelo hash do task_id (<xx>/{task_id}[_sufixo].ext): os arquivos
+  de uma tarefa ficam juntos e nenhum diretório cresce sem limite
+- Escrita atômica (temporário no mesmo diretório + rename): quem lê, inclusive o
+  nginx via X-Accel-Redirect, nunca vê arquivo pela metade
+- Um resultado pode ser baixado quantas vezes for preciso até expirar
+  (MAX_TEMP_IMAGE_AGE desde a gravação - a data de modificação do arquivo)
+- Limite em disco (RESULT_STORE_MAX_MB) com despejo LRU pelo último download (a
+  data de acesso do arquivo, gravada explicitamente a cada entrega)
+
+Uma thread por processo varre o diretório a cada SWEEP_INTERVAL (um processo de
+cada vez, por lock de arquivo); quando a tarefa fica sem arquivos, o status dela
+é removido
+
+Substitui a remoção pós-download (marcadores .served + SERVED_FILE_GRACE): apagar
+o arquivo logo depois da entrega quebrava novas tentativas de download e o
+acesso por renditions/webhook; a validade passou a ser só o TTL e o limite em disco
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from app import config
+from app.utils.logger import get_logger
+from app.utils.encoders import encoder_for_extension
+from app.utils.task_manager import task_manager
+
+try:
+    import fcntl
+except ImportError:  # Windows - sem lock entre processos
+    fcntl = None
+
+logger = get_logger(__name__)
+
+TMP_PREFIX = '.tmp-'
+TMP_MAX_AGE = 3600  # temporário de uma escrita interrompida
+
+
+def task_files(status_data):
+    """Arquivos de uma tarefa concluída (final, normal do modo duplo, renditions)"""
+    files = {status_data.get('final_path'), status_data.get('normal_path'),
+             *(status_data.get('renditions') or {}).values()}
+    files.discard(None)
+    return files
+
+
+def _task_id_of(filename):
+    """{task_id}[_sufixo].ext -> task_id (DEBUG_{task_id}.jpg não tem status)"""
+    if filename.startswith('DEBUG_'):
+        return None
+    return filename.split('.', 1)[0].partition('_')[0]
+
+
+class ResultStore:
+    """Gravação, acesso e varredura (expiração + limite em disco) dos resultados"""
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pid = None
+        self._expired = 0
+        self._evicted = 0
+        self._sweeps = 0
+        self._disk_bytes = None
+        self._files = None
+
+    @property
+    def directory(self):
+        return self.root or config.TEMP_IMAGES_DIR
+
+    @property
+    def budget(self):
+        return self.max_bytes if self.max_bytes is not None else config.RESULT_STORE_MAX_BYTES
+
+    # ---------- caminhos e arquivos ----------
+
+    def path_for(self, task_id, filename):
+        shard = hashlib.sha256(task_id.encode('utf-8')).hexdigest()[:2]
+        return os.path.join(self.directory, shard, filename)
+
+    def relative_path(self, path):
+        """Caminho relativo a TEMP_IMAGES_DIR (send_from_directory e X-Accel-Redirect)"""
+        return os.path.relpath(path, self.directory).replace(os.sep, '/')
+
+    def put(self, task_id, filename, data, created_at=None):
+        """
+        Grava um resultado da tarefa (temporário + rename)
+
+        Args:
+            created_at (float): início da validade (padrão: agora); uma conversão
+                de formato usa a do original, para expirarem juntos
+
+        Returns:
+            str: caminho do arquivo
+        """
+        path = self.path_for(task_id, filename)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=TMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            if created_at is not None:
+                os.utime(tmp_path, (time.time(), created_at))
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        return path
+
+    def touch(self, path):
+        """Registra o download para o LRU (só a data de acesso; a de modificação é a validade)"""
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError as e:
+            logger.warning(f"Erro ao registrar acesso a {os.path.basename(path)}: {e}")
+
+    # ---------- varredura ----------
+
+    def start(self):
+        """Sobe a thread de varredura (chamada barata; uma vez por processo)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='result-store', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(config.SWEEP_INTERVAL)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Erro na varredura dos resultados: {e}")
+
+    def sweep(self, now=None):
+        """
+        Remove os resultados expirados e, acima do limite em disco, os acessados
+        há mais tempo até ficar em 90% do limite
+
+        Returns:
+            int: arquivos removidos (0 se outro processo já estava varrendo)
+        """
+        if fcntl is None:
+            return self._sweep(now or time.time())
+        with open(os.path.join(self.directory, '.sweep.lock'), 'a+') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return 0  # outro worker já está varrendo
+            try:
+                return self._sweep(now or time.time())
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _scan(self):
+        """(atime, mtime, tamanho, caminho, nome) de cada arquivo nos subdiretórios (e na raiz, do layout antigo)"""
+        files = []
+        pending = [self.directory]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if directory == self.directory:
+                            pending.append(entry.path)
+                        continue
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_atime, st.st_mtime, st.st_size, entry.path, entry.name))
+        return files
+
+    def _sweep(self, now):
+        max_age = config.MAX_TEMP_IMAGE_AGE.total_seconds()
+        expired, evicted, touched_tasks = 0, 0, set()
+        kept = []
+        for atime, mtime, size, path, name in self._scan():
+            if name.startswith(TMP_PREFIX):
+                if now - mtime >= TMP_MAX_AGE:
+                    self._remove(path)
+                continue
+            if encoder_for_extension(os.path.splitext(name)[1]) is None:
+                continue  # não é resultado nosso
+            if now - mtime >= max_age:
+                if self._remove(path):
+                    expired += 1
+                    touched_tasks.add(_task_id_of(name))
+                continue
+            kept.append((atime, size, path, name))
+
+        total = sum(size for _, size, _, _ in kept)
+        if total > self.budget:
+            target = int(self.budget * 0.9)
+            for _, size, path, name in sorted(kept):
+                if total <= target:
+                    break
+                if self._remove(path):
+                    evicted += 1
+                    touched_tasks.add(_task_id_of(name))
+                total -= size
+
+        touched_tasks.discard(None)
+        for task_id in touched_tasks:
+            self._release_task(task_id)
+
+        with self._lock:
+            self._expired += expired
+            self._evicted += evicted
+            self._sweeps += 1
+            self._disk_bytes = total
+            self._files = len(kept) - evicted
+        if expired or evicted:
+            logger.info(f"🧹 Resultados: {expired} expirado(s) e {evicted} despejado(s) ({total} bytes em disco)")
+        return expired + evicted
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _release_task(self, task_id):
+        """Remove o status da tarefa quando nenhum arquivo dela sobrou no disco"""
+        status_data = task_manager.get_task_status(task_id)
+        if status_data['status'] != 'COMPLETED':
+            return
+        if not any(os.path.exists(path) for path in task_files(status_data)):
+            task_manager.delete_task_status(task_id)
+            logger.info(f"Status da tarefa removido: {task_id}")
+
+    def stats(self):
+        """Contadores deste processo; disco conforme a última varredura feita aqui"""
+        with self._lock:
+            return {
+                "disk_bytes": self._disk_bytes,
+                "files": self._files,
+                "max_bytes": self.budget,
+                "expired": self._expired,
+                "evicted": self._evicted,
+                "sweeps": self._sweeps,
+            }
+
+# Instância global
+result_store = ResultStore()
@@ -0,0 +1,107 @@
+"""
+Avisos de mudança de status das tarefas (long-poll e SSE)
+Quem espera (GET /api/v1/status/<id>?wait=N ou o stream /events) se inscreve
+no task_id e dorme até o TaskManager publicar o novo status, em vez de reler o
+task store em loop. Sem Redis os avisos são do próprio processo; com Redis vão
+por pub/sub, e chegam a todos os workers web mesmo quando quem atualiza o status
+é outro worker ou um worker RQ
+"""
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CHANNEL_PREFIX = 'task-events:'
+
+
+class TaskEvents:
+    """Inscrições por task_id; publish() acorda todas as inscrições da tarefa"""
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client
+        self._lock = threading.Lock()
+        self._subscribers = {}  # task_id -> set de queue.Queue
+        self._listener_pid = None
+
+    @contextmanager
+    def subscribe(self, task_id):
+        """
+        Inscrição num task_id (use com `with`; inscreva-se antes de ler o status
+        para não perder um aviso entre a leitura e a espera)
+
+        Yields:
+            queue.Queue: recebe o dict de status a cada mudança
+        """
+        if self.redis_client is not None:
+            self._ensure_listener()
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(task_id, set()).add(events)
+        try:
+            yield events
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(task_id)
+                if subscribers is not None:
+                    subscribers.discard(events)
+                    if not subscribers:
+                        del self._subscribers[task_id]
+
+    def publish(self, task_id, data):
+        """Avisa as inscrições do task_id (com Redis, as de todos os processos)"""
+        if self.redis_client is not None:
+            try:
+                self.redis_client.publish(f"{CHANNEL_PREFIX}{task_id}", json.dumps(data))
+                return
+            except Exception as e:
+                logger.warning(f"Falha ao publicar evento da tarefa {task_id} no Redis: {e}")
+        self._dispatch(task_id, data)
+
+    def waiting(self):
+        """Número de inscrições ativas neste processo (métricas)"""
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def _dispatch(self, task_id, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, ()))
+        for events in subscribers:
+            events.put(data)
+
+    def _ensure_listener(self):
+        """Sobe a thread do pub/sub na primeira inscrição (uma por processo, refeita depois de um fork)"""
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            threading.Thread(target=self._listen, name='task-events', daemon=True).start()
+
+    def _listen(self):
+        """Repassa os eventos do Redis para as inscrições locais; reconecta se a conexão cair"""
+        delay = 1
+        while True:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                delay = 1
+                for message in pubsub.listen():
+                    if message.get('type') != 'pmessage':
+                        continue
+                    task_id = message['channel'][len(CHANNEL_PREFIX):]
+                    self._dispatch(task_id, json.loads(message['data']))
+            except Exception as e:
+                logger.warning(f"Pub/sub de eventos de tarefa caiu: {e}. Reconectando em {delay}s")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
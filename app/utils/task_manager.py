@@ -1,94 +1,402 @@
 """
 Gerenciador de tarefas de processamento
-Suporta armazenamento em memória, arquivo JSON ou Redis
+Suporta armazenamento em Redis, SQLite (padrão) ou memória
 """
 import json
 import os
+import queue
+import sqlite3
+import threading
+import time
 from datetime import datetime
 from app import config
 from app.utils.logger import get_logger
+from app.utils.task_events import TaskEvents, CHANNEL_PREFIX
 
 logger = get_logger(__name__)
 
-# Dicionário em memória (fallback se Redis não estiver disponível)
+# Dicionário em memória (fallback se nem Redis nem SQLite estiverem disponíveis)
 _tasks_in_memory = {}
 
-# Arquivo para persistência
+# Status que não mudam mais (long-poll e SSE param de esperar)
+FINAL_STATUSES = ('COMPLETED', 'FAILED', 'NOT_FOUND')
+
+# Registro de um lote (/api/v1/batches) no mesmo store, sob "batch:{batch_id}"
+BATCH_PREFIX = 'batch:'
+
+# Parâmetros por consulta IN (...) no SQLite / chaves por pipeline no Redis
+SQL_CHUNK = 500
+
+# Redis: um hash por tarefa, expirando em 24h
+REDIS_KEY_PREFIX = 'task:'
+REDIS_TASK_TTL = 86400
+_JSON_FIELDS = {'renditions', 'task_ids', 'jobs', 'lease_until'}  # campos não-string guardados como JSON no hash
+
+# Arquivo JSON antigo - importado uma vez para o SQLite, se existir
 TASKS_FILE = os.path.join(os.path.dirname(__file__), '../../tasks_db.json')
 
-def _load_tasks_from_file():
-    """Carrega tarefas do arquivo JSON"""
-    try:
-        if os.path.exists(TASKS_FILE):
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_updated_at ON tasks(updated_at);
+"""
+
+class _SQLiteStore:
+    """
+    Tabela de tarefas em SQLite (modo WAL)
+    Leitura/escrita por chave primária, seguro entre threads e entre os workers
+    do gunicorn; o índice em updated_at evita varrer tudo na limpeza
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        self._import_legacy_file(conn)
+
+    def _connection(self):
+        """Uma conexão por thread (e por processo, depois de um fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _import_legacy_file(self, conn):
+        """Migra o tasks_db.json antigo (uma vez só, depois renomeia o arquivo)"""
+        if not os.path.exists(TASKS_FILE):
+            return
+        try:
             with open(TASKS_FILE, 'r') as f:
-                return json.load(f)
-    except Exception as e:
-        logger.warning(f"Erro ao carregar tarefas do arquivo: {e}")
-    return {}
-
-def _save_tasks_to_file(tasks):
-    """Salva tarefas em arquivo JSON"""
-    try:
-        with open(TASKS_FILE, 'w') as f:
-            json.dump(tasks, f)
-    except Exception as e:
-        logger.error(f"Erro ao salvar tarefas no arquivo: {e}")
+                tasks = json.load(f)
+            self.put_many(tasks)
+            os.replace(TASKS_FILE, TASKS_FILE + '.migrated')
+            logger.info(f"{len(tasks)} tarefas importadas de {TASKS_FILE} para o SQLite")
+        except Exception as e:
+            logger.warning(f"Erro ao importar tarefas do arquivo JSON: {e}")
+
+    def get(self, task_id):
+        row = self._connection().execute(
+            "SELECT data FROM tasks WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, task_id, data):
+        self._connection().execute(
+            "INSERT INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(task_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (task_id, json.dumps(data), time.time())
+        )
+
+    def put_many(self, tasks):
+        """Insere várias tarefas numa única transação"""
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(task_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                [(task_id, json.dumps(data), now) for task_id, data in tasks.items()]
+            )
+
+    def get_many(self, task_ids):
+        """Várias tarefas por chave primária (consultas em blocos de SQL_CHUNK)"""
+        conn = self._connection()
+        found = {}
+        for start in range(0, len(task_ids), SQL_CHUNK):
+            chunk = task_ids[start:start + SQL_CHUNK]
+            rows = conn.execute(
+                f"SELECT task_id, data FROM tasks WHERE task_id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update((task_id, json.loads(data)) for task_id, data in rows)
+        return found
+
+    def delete(self, task_id):
+        self._connection().execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def delete_many(self, task_ids):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany("DELETE FROM tasks WHERE task_id = ?", [(task_id,) for task_id in task_ids])
+
+    def delete_older_than(self, max_age_seconds):
+        """Remove tarefas não atualizadas há mais de max_age_seconds (usa o índice)"""
+        cursor = self._connection().execute(
+            "DELETE FROM tasks WHERE updated_at < ?", (time.time() - max_age_seconds,)
+        )
+        return cursor.rowcount
+
+    def all(self):
+        rows = self._connection().execute("SELECT task_id, data FROM tasks").fetchall()
+        return {task_id: json.loads(data) for task_id, data in rows}
+
+    def with_prefix(self, prefix):
+        """Registros cuja chave começa com prefix (faixa na chave primária, sem varrer a tabela)"""
+        rows = self._connection().execute(
+            "SELECT task_id, data FROM tasks WHERE task_id >= ? AND task_id < ?",
+            (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        ).fetchall()
+        return {task_id: json.loads(data) for task_id, data in rows}
+
+    def compare_and_update(self, task_id, field, expected, updates):
+        """
+        Atualiza campos do registro só se data[field] ainda for `expected`
+        (None em updates remove o campo). Devolve True se atualizou
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            data = json.loads(row[0]) if row else None
+            if data is None or data.get(field) != expected:
+                conn.execute("ROLLBACK")
+                return False
+            for key, value in updates.items():
+                if value is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = value
+            conn.execute(
+                "UPDATE tasks SET data = ?, updated_at = ? WHERE task_id = ?", (json.dumps(data), time.time(), task_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+class _RedisStore:
+    """
+    Tarefas em hashes do Redis (task:{task_id}), com TTL de REDIS_TASK_TTL
+    Mesma interface do _SQLiteStore; leituras e escritas de várias chaves vão num
+    pipeline só, e a listagem usa SCAN (KEYS travava o Redis com muitas tarefas).
+    Chaves antigas (string JSON, de antes dos hashes) ainda são lidas até expirarem
+    """
+
+    def __init__(self, client):
+        from redis.exceptions import ResponseError
+        self.client = client
+        self._wrong_type = ResponseError  # HGETALL numa chave antiga (string)
+
+    @staticmethod
+    def _key(task_id):
+        return f"{REDIS_KEY_PREFIX}{task_id}"
+
+    @staticmethod
+    def _encode(data):
+        """dict -> campos do hash (None fica de fora; listas/dicts em JSON)"""
+        return {
+            field: json.dumps(value) if field in _JSON_FIELDS else value
+            for field, value in data.items() if value is not None
+        }
+
+    @staticmethod
+    def _decode(fields):
+        return {field: json.loads(value) if field in _JSON_FIELDS else value for field, value in fields.items()}
+
+    def _read_legacy(self, task_id):
+        raw = self.client.get(self._key(task_id))
+        return json.loads(raw) if raw else None
+
+    def get(self, task_id):
+        try:
+            fields = self.client.hgetall(self._key(task_id))
+        except self._wrong_type:
+            return self._read_legacy(task_id)  # WRONGTYPE: chave antiga em string
+        return self._decode(fields) if fields else None
+
+    def get_many(self, task_ids):
+        pipeline = self.client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipeline.hgetall(self._key(task_id))
+        found = {}
+        for task_id, fields in zip(task_ids, pipeline.execute(raise_on_error=False)):
+            if isinstance(fields, self._wrong_type):
+                data = self._read_legacy(task_id)
+                if data is not None:
+                    found[task_id] = data
+            elif fields:
+                found[task_id] = self._decode(fields)
+        return found
+
+    def _write(self, pipeline, task_id, data):
+        key = self._key(task_id)
+        # DEL antes do HSET: campos da transição anterior (ex.: error) não sobram
+        pipeline.delete(key)
+        pipeline.hset(key, mapping=self._encode(data))
+        pipeline.expire(key, REDIS_TASK_TTL)
+
+    def put(self, task_id, data, publish=False):
+        """Grava a tarefa (MULTI/EXEC); com publish=True o evento do pub/sub vai no mesmo round trip"""
+        pipeline = self.client.pipeline(transaction=True)
+        self._write(pipeline, task_id, data)
+        if publish:
+            pipeline.publish(f"{CHANNEL_PREFIX}{task_id}", json.dumps(data))
+        pipeline.execute()
+
+    def put_many(self, tasks):
+        pipeline = self.client.pipeline(transaction=True)
+        for task_id, data in tasks.items():
+            self._write(pipeline, task_id, data)
+        pipeline.execute()
+
+    def delete(self, task_id, publish=False):
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.delete(self._key(task_id))
+        if publish:
+            pipeline.publish(f"{CHANNEL_PREFIX}{task_id}", json.dumps({"status": "NOT_FOUND", "task_id": task_id}))
+        pipeline.execute()
+
+    def delete_many(self, task_ids):
+        if task_ids:
+            self.client.delete(*[self._key(task_id) for task_id in task_ids])
+
+    def delete_older_than(self, max_age_seconds):
+        """Nada a fazer: cada chave expira sozinha (REDIS_TASK_TTL)"""
+        return 0
+
+    def all(self):
+        return self.with_prefix('')
+
+    def with_prefix(self, prefix):
+        """Varre com SCAN (não bloqueia o Redis) e lê em lotes pipelinados"""
+        task_ids = [key[len(REDIS_KEY_PREFIX):] for key in self.client.scan_iter(match=f"{REDIS_KEY_PREFIX}{prefix}*", count=1000)]
+        tasks = {}
+        for start in range(0, len(task_ids), SQL_CHUNK):
+            tasks.update(self.get_many(task_ids[start:start + SQL_CHUNK]))
+        return tasks
+
+    def compare_and_update(self, task_id, field, expected, updates):
+        """Mesmo contrato do _SQLiteStore, com WATCH/MULTI (False se outro cliente mexeu na chave)"""
+        from redis.exceptions import WatchError
+        key = self._key(task_id)
+        with self.client.pipeline(transaction=True) as pipeline:
+            try:
+                pipeline.watch(key)
+                current = pipeline.hget(key, field)
+                if current is not None and field in _JSON_FIELDS:
+                    current = json.loads(current)
+                if not pipeline.exists(key) or current != expected:
+                    return False
+                pipeline.multi()
+                removed = [name for name, value in updates.items() if value is None]
+                if removed:
+                    pipeline.hdel(key, *removed)
+                kept = {name: value for name, value in updates.items() if value is not None}
+                if kept:
+                    pipeline.hset(key, mapping=self._encode(kept))
+                pipeline.execute()
+            except WatchError:
+                return False
+        return True
+
+def image_url(task_id, extension, suffix=None):
+    """URL pública de uma saída: {task_id}{ext}, {task_id}_normal{ext} ou {task_id}_{rendition}{ext}"""
+    name = f"{task_id}_{suffix}" if suffix else task_id
+    return f"{config.BASE_IMAGE_URL}/{name}{extension}"
+
+def file_extension(path):
+    """Extensão de um arquivo salvo (.jpg se não houver)"""
+    extension = os.path.splitext(path)[1] if path else ''
+    return extension or '.jpg'
+
+def public_status(task_id, status_data):
+    """Status de uma tarefa existente como o cliente vê (rota de status, stream SSE e webhooks)"""
+    response = {
+        "status": status_data["status"],
+        "task_id": task_id,
+        "timestamp": status_data.get("timestamp")
+    }
+
+    if status_data["status"] == "COMPLETED":
+        response["final_image_url"] = image_url(task_id, file_extension(status_data.get("final_path")))
+        # Se houver versão normal (sem tema), incluir também
+        if status_data.get("normal_path"):
+            response["normal_image_url"] = image_url(task_id, file_extension(status_data["normal_path"]), "normal")
+        if status_data.get("renditions"):
+            response["renditions"] = {
+                name: image_url(task_id, file_extension(path), name) for name, path in status_data["renditions"].items()
+            }
+    elif status_data["status"] == "FAILED":
+        response["error_message"] = status_data.get("error")
+    return response
 
 class TaskManager:
-    """Gerenciador de tarefas com suporte a Redis, arquivo e memória"""
-    
-    def __init__(self):
+    """Gerenciador de tarefas com suporte a Redis, SQLite e memória"""
+
+    def __init__(self, db_path=None):
         self.redis_client = None
         self.use_redis = False
-        self.use_file = True
-        
-        # Carregar tarefas do arquivo na inicialização
-        global _tasks_in_memory
-        _tasks_in_memory = _load_tasks_from_file()
-        
+        self.store = None
+
         if config.USE_REDIS:
             try:
                 import redis
-                self.redis_client = redis.Redis(
+                # Pool explícito e compartilhado pelas threads do worker; com todas as
+                # conexões em uso, espera até REDIS_POOL_TIMEOUT em vez de falhar
+                pool = redis.BlockingConnectionPool(
                     host=config.REDIS_HOST,
                     port=config.REDIS_PORT,
                     db=config.REDIS_DB,
                     password=config.REDIS_PASSWORD,
-                    decode_responses=True
+                    decode_responses=True,
+                    max_connections=config.REDIS_MAX_CONNECTIONS,
+                    timeout=config.REDIS_POOL_TIMEOUT,
+                    socket_connect_timeout=config.REDIS_POOL_TIMEOUT,
+                    health_check_interval=30
                 )
+                self.redis_client = redis.Redis(connection_pool=pool)
                 # Testa a conexão
                 self.redis_client.ping()
+                self.store = _RedisStore(self.redis_client)
                 self.use_redis = True
-                self.use_file = False
-                logger.info("Conectado ao Redis com sucesso")
+                logger.info(f"Conectado ao Redis com sucesso (pool de {config.REDIS_MAX_CONNECTIONS} conexões)")
             except Exception as e:
-                logger.warning(f"Falha ao conectar ao Redis: {e}. Usando arquivo/memória como fallback.")
+                logger.warning(f"Falha ao conectar ao Redis: {e}. Usando SQLite/memória como fallback.")
+                self.redis_client = None
                 self.use_redis = False
-    
+
+        if not self.use_redis:
+            try:
+                self.store = _SQLiteStore(db_path or config.TASKS_DB_PATH)
+            except Exception as e:
+                logger.warning(f"Falha ao abrir o SQLite de tarefas: {e}. Usando memória como fallback.")
+                self.store = None
+
+        # Avisos de mudança de status (pub/sub do Redis, ou só deste processo)
+        self.events = TaskEvents(self.redis_client if self.use_redis else None)
+
     def get_task_status(self, task_id):
         """Obtém o status de uma tarefa"""
+        if task_id.startswith(BATCH_PREFIX):
+            return {"status": "NOT_FOUND"}
         try:
-            if self.use_redis:
-                data = self.redis_client.get(f"task:{task_id}")
-                if data:
-                    return json.loads(data)
+            if self.store:
+                data = self.store.get(task_id)
             else:
-                # Sempre recarregar do arquivo para garantir que temos dados atualizados
-                global _tasks_in_memory
-                _tasks_in_memory = _load_tasks_from_file()
-                
-                if task_id in _tasks_in_memory:
-                    logger.info(f"✅ Tarefa encontrada no arquivo: {task_id}")
-                    return _tasks_in_memory[task_id]
-                else:
-                    logger.warning(f"❌ Tarefa NÃO encontrada: {task_id}")
+                data = _tasks_in_memory.get(task_id)
+
+            if data:
+                logger.debug(f"✅ Tarefa encontrada: {task_id}")
+                return data
+            else:
+                logger.warning(f"❌ Tarefa NÃO encontrada: {task_id}")
         except Exception as e:
             logger.error(f"Erro ao obter status da tarefa {task_id}: {e}")
-        
+
         return {"status": "NOT_FOUND"}
-    
-    def update_task_status(self, task_id, status, final_path=None, normal_path=None, error_message=None):
-        """Atualiza o status de uma tarefa"""
+
+    def update_task_status(self, task_id, status, final_path=None, normal_path=None, error_message=None, renditions=None):
+        """Atualiza o status de uma tarefa (renditions: {nome: caminho} das saídas extras)"""
         try:
             data = {
                 "status": status,
@@ -96,80 +404,232 @@ class TaskManager:
                 "timestamp": datetime.now().isoformat(),
                 "final_path": final_path,
                 "normal_path": normal_path,
+                "renditions": renditions,
                 "error": error_message
             }
-            
+
             if self.use_redis:
-                # Armazena com TTL de 24 horas
-                self.redis_client.setex(
-                    f"task:{task_id}",
-                    86400,  # 24 horas em segundos
-                    json.dumps(data)
-                )
+                # Hash + TTL + evento no pub/sub num round trip só
+                self.store.put(task_id, data, publish=True)
             else:
-                global _tasks_in_memory
-                _tasks_in_memory[task_id] = data
-                # Salvar em arquivo para persistência
-                _save_tasks_to_file(_tasks_in_memory)
-            
+                if self.store:
+                    self.store.put(task_id, data)
+                else:
+                    _tasks_in_memory[task_id] = data
+                self.events.publish(task_id, data)
+
             logger.info(f"Status da tarefa {task_id} atualizado para: {status}")
         except Exception as e:
             logger.error(f"Erro ao atualizar status da tarefa {task_id}: {e}")
-    
+
     def delete_task_status(self, task_id):
         """Deleta o status de uma tarefa"""
         try:
             if self.use_redis:
-                self.redis_client.delete(f"task:{task_id}")
+                self.store.delete(task_id, publish=True)
             else:
-                global _tasks_in_memory
-                if task_id in _tasks_in_memory:
-                    del _tasks_in_memory[task_id]
-                    # Salvar em arquivo
-                    _save_tasks_to_file(_tasks_in_memory)
-            
+                if self.store:
+                    self.store.delete(task_id)
+                else:
+                    _tasks_in_memory.pop(task_id, None)
+                self.events.publish(task_id, {"status": "NOT_FOUND", "task_id": task_id})
+
             logger.info(f"Status da tarefa {task_id} deletado")
         except Exception as e:
             logger.error(f"Erro ao deletar status da tarefa {task_id}: {e}")
-    
+
+    def create_batch(self, batch_id, task_ids):
+        """
+        Grava o lote e as tarefas dele (PENDING) de uma vez só: uma transação no
+        SQLite, um pipeline no Redis (em vez de um update_task_status por tarefa)
+        """
+        now = datetime.now().isoformat()
+        records = {
+            task_id: {
+                "status": "PENDING",
+                "task_id": task_id,
+                "timestamp": now,
+                "final_path": None,
+                "normal_path": None,
+                "renditions": None,
+                "error": None
+            }
+            for task_id in task_ids
+        }
+        records[BATCH_PREFIX + batch_id] = {"batch_id": batch_id, "task_ids": list(task_ids), "timestamp": now}
+
+        if self.store:
+            self.store.put_many(records)
+        else:
+            _tasks_in_memory.update(records)
+        logger.info(f"Lote {batch_id} criado com {len(task_ids)} tarefas")
+
+    def get_batch(self, batch_id):
+        """
+        Registro do lote e o status atual de cada tarefa dele
+
+        Returns:
+            tuple: (registro do lote ou None, {task_id: status} - NOT_FOUND se sumiu)
+        """
+        key = BATCH_PREFIX + batch_id
+        try:
+            if self.store:
+                batch = self.store.get(key)
+                if batch is None:
+                    return None, {}
+                found = self.store.get_many(batch["task_ids"])
+            else:
+                batch = _tasks_in_memory.get(key)
+                if batch is None:
+                    return None, {}
+                found = {task_id: _tasks_in_memory[task_id] for task_id in batch["task_ids"] if task_id in _tasks_in_memory}
+        except Exception as e:
+            logger.error(f"Erro ao obter o lote {batch_id}: {e}")
+            return None, {}
+        return batch, {task_id: found.get(task_id, {"status": "NOT_FOUND"}) for task_id in batch["task_ids"]}
+
+    def start_batch_feed(self, batch_id, jobs, lease_until):
+        """
+        Guarda no registro do lote as tarefas a despachar e o lease deste processo:
+        no pool local o lote é alimentado aos poucos, e se o processo cair outro
+        retoma as tarefas que ficaram para trás quando o lease vencer
+
+        Returns:
+            bool: False sem store compartilhado (a alimentação fica só em memória)
+        """
+        if not self.store:
+            return False
+        try:
+            return self.store.compare_and_update(
+                BATCH_PREFIX + batch_id, 'lease_until', None,
+                {'jobs': [[task_id, list(args)] for task_id, args in jobs], 'lease_until': lease_until}
+            )
+        except Exception as e:
+            logger.error(f"Erro ao gravar a alimentação do lote {batch_id}: {e}")
+            return False
+
+    def renew_batch_lease(self, batch_id, lease_until, new_lease_until):
+        """
+        Renova (ou, com o lease vencido de outro processo, toma) a alimentação do lote
+
+        Returns:
+            bool: False se outro processo renovou/tomou antes (ou sem store compartilhado)
+        """
+        if not self.store:
+            return False
+        try:
+            return self.store.compare_and_update(
+                BATCH_PREFIX + batch_id, 'lease_until', lease_until, {'lease_until': new_lease_until}
+            )
+        except Exception as e:
+            logger.error(f"Erro ao renovar o lease do lote {batch_id}: {e}")
+            return False
+
+    def finish_batch_feed(self, batch_id, lease_until):
+        """Todas as tarefas do lote já foram despachadas e terminaram: tira jobs e lease do registro"""
+        if not self.store:
+            return
+        try:
+            self.store.compare_and_update(
+                BATCH_PREFIX + batch_id, 'lease_until', lease_until, {'jobs': None, 'lease_until': None}
+            )
+        except Exception as e:
+            logger.error(f"Erro ao encerrar a alimentação do lote {batch_id}: {e}")
+
+    def unfed_batches(self):
+        """Lotes do pool local ainda em alimentação: {batch_id: registro (com jobs e lease_until)}"""
+        if not self.store:
+            return {}
+        try:
+            records = self.store.with_prefix(BATCH_PREFIX)
+        except Exception as e:
+            logger.error(f"Erro ao listar lotes: {e}")
+            return {}
+        return {record["batch_id"]: record for record in records.values() if record.get("jobs")}
+
+    def get_tasks(self, task_ids):
+        """Status de várias tarefas ({task_id: status}; as que não existem ficam de fora)"""
+        try:
+            if self.store:
+                return self.store.get_many(list(task_ids))
+            return {task_id: _tasks_in_memory[task_id] for task_id in task_ids if task_id in _tasks_in_memory}
+        except Exception as e:
+            logger.error(f"Erro ao obter tarefas: {e}")
+            return {}
+
+    def delete_batch(self, batch_id, task_ids):
+        """Remove o lote e as tarefas dele (lote recusado pela fila)"""
+        keys = [BATCH_PREFIX + batch_id] + list(task_ids)
+        try:
+            if self.store:
+                self.store.delete_many(keys)
+            else:
+                for key in keys:
+                    _tasks_in_memory.pop(key, None)
+        except Exception as e:
+            logger.error(f"Erro ao deletar o lote {batch_id}: {e}")
+
+    def wait_for_change(self, task_id, since=None, timeout=0):
+        """
+        Long-poll: espera o status da tarefa deixar de ser `since`
+
+        Args:
+            task_id (str): ID da tarefa
+            since (str): status que o cliente já conhece (None = o status atual)
+            timeout (float): espera máxima em segundos
+
+        Returns:
+            dict: status atual (o mesmo de get_task_status), mudado ou não
+        """
+        deadline = time.monotonic() + timeout
+        with self.events.subscribe(task_id) as events:
+            data = self.get_task_status(task_id)
+            since = since or data['status']
+            while data['status'] == since and data['status'] not in FINAL_STATUSES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    data = events.get(timeout=min(remaining, config.STATUS_RECHECK_INTERVAL))
+                except queue.Empty:
+                    # Sem aviso: relê o store (atualizações de outros processos quando não há Redis)
+                    data = self.get_task_status(task_id)
+        return data
+
     def cleanup_old_tasks(self, max_age_hours=24):
-        """Remove tarefas antigas (apenas em memória)"""
-        if not self.use_redis:
-            try:
+        """Remove tarefas antigas (no Redis o TTL já cuida disso)"""
+        if self.use_redis:
+            return
+        try:
+            if self.store:
+                removed = self.store.delete_older_than(max_age_hours * 3600)
+            else:
                 current_time = datetime.now()
-                tasks_to_delete = []
-                
-                for task_id, data in _tasks_in_memory.items():
-                    task_time = datetime.fromisoformat(data.get('timestamp', ''))
-                    age = (current_time - task_time).total_seconds() / 3600
-                    
-                    if age > max_age_hours:
-                        tasks_to_delete.append(task_id)
-                
+                tasks_to_delete = [
+                    task_id for task_id, data in _tasks_in_memory.items()
+                    if (current_time - datetime.fromisoformat(data.get('timestamp', ''))).total_seconds() / 3600 > max_age_hours
+                ]
                 for task_id in tasks_to_delete:
                     del _tasks_in_memory[task_id]
-                    logger.info(f"Tarefa antiga {task_id} removida durante limpeza")
-                
-                if tasks_to_delete:
-                    logger.info(f"Limpeza concluída: {len(tasks_to_delete)} tarefas removidas")
-            except Exception as e:
-                logger.error(f"Erro na limpeza de tarefas antigas: {e}")
-    
+                removed = len(tasks_to_delete)
+
+            if removed:
+                logger.info(f"Limpeza concluída: {removed} tarefas removidas")
+        except Exception as e:
+            logger.error(f"Erro na limpeza de tarefas antigas: {e}")
+
     def get_all_tasks(self):
         """Retorna todas as tarefas (para monitoramento)"""
         try:
-            if self.use_redis:
-                keys = self.redis_client.keys("task:*")
-                tasks = {}
-                for key in keys:
-                    task_id = key.replace("task:", "")
-                    tasks[task_id] = json.loads(self.redis_client.get(key))
-                return tasks
+            if self.store:
+                tasks = self.store.all()
             else:
-                return _tasks_in_memory.copy()
+                tasks = _tasks_in_memory.copy()
         except Exception as e:
             logger.error(f"Erro ao obter todas as tarefas: {e}")
             return {}
+        # Registros de lote (batch:{id}) ficam no mesmo store mas não são tarefas
+        return {task_id: data for task_id, data in tasks.items() if not task_id.startswith(BATCH_PREFIX)}
 
 # Instância global
 task_manager = TaskManager()
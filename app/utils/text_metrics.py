@@ -0,0 +1,207 @@
+"""
+Memoização de medidas de texto
+As mesmas strings ("Tam: ESGOTADO", "X", preços, descrições) são medidas várias
+vezes por tarefa - largura, altura e desenho medem tudo de novo, e o modo duplo
+mede tudo duas vezes. Aqui cada (fonte, texto) é medido uma vez por processo,
+com limite LRU, junto com constantes pré-calculadas por fonte.
+
+Rasterizar o texto (FreeType) é a parte mais cara do render. A máscara de uma
+linha não depende da cor nem da posição inteira - só da fonte, do texto e da
+fração da posição - então texto e sombra, as duas versões do modo duplo e
+tarefas seguidas com os mesmos textos reaproveitam a mesma máscara
+"""
+import math
+import threading
+from collections import OrderedDict
+from app import config
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Texto de referência que limita a largura da descrição (ver _split_description)
+DESCRIPTION_REFERENCE_TEXT = "Tam: ESGOTADO"
+
+
+def _font_key(font):
+    """Identidade estável da fonte: arquivo/tamanho para TrueType, objeto para o resto"""
+    path = getattr(font, 'path', None)
+    if isinstance(path, str):
+        return ('truetype', path, font.size, getattr(font, 'index', 0), getattr(font, 'layout_engine', None))
+    # Fonte sem arquivo (load_default): a própria instância fica guardada junto no cache,
+    # então o id não pode ser reaproveitado enquanto a entrada existir
+    return ('object', id(font))
+
+
+class FontMetrics:
+    """Constantes de uma fonte usadas pelo layout (calculadas uma vez por fonte)"""
+
+    __slots__ = ('x_height', 'description_max_width', 'ascent', 'descent')
+
+    def __init__(self, x_height, description_max_width, ascent, descent):
+        self.x_height = x_height
+        self.description_max_width = description_max_width
+        self.ascent = ascent
+        self.descent = descent
+
+
+class TextMeasurer:
+    """Cache LRU thread-safe de caixas delimitadoras de texto"""
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or config.TEXT_BBOX_CACHE_SIZE
+        self._bboxes = OrderedDict()
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _measure(self, draw, text, font):
+        """
+        Calcula a caixa delimitadora de um texto
+        Compatível com diferentes versões do Pillow
+        """
+        try:
+            # Tenta a API mais recente (Pillow 8.0+)
+            return draw.textbbox((0, 0), text, font=font)
+        except (AttributeError, TypeError):
+            # Fallback para versões antigas
+            width, height = draw.textsize(text, font=font)
+            return (0, 0, width, height)
+
+    def bbox(self, draw, text, font):
+        """Caixa delimitadora (x0, y0, x1, y1) de um texto, memoizada por (fonte, texto)"""
+        key = (_font_key(font), getattr(draw, 'fontmode', None), text)
+        with self._lock:
+            entry = self._bboxes.get(key)
+            if entry is not None:
+                self._bboxes.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        bbox = self._measure(draw, text, font)
+
+        with self._lock:
+            self._bboxes[key] = (font, bbox)
+            while len(self._bboxes) > self.max_size:
+                self._bboxes.popitem(last=False)
+        return bbox
+
+    def font_metrics(self, draw, font):
+        """FontMetrics da fonte (altura do "X", largura de referência, ascent/descent)"""
+        key = (_font_key(font), getattr(draw, 'fontmode', None))
+        metrics = self._metrics.get(key)
+        if metrics is not None:
+            return metrics[1]
+
+        x_bbox = self.bbox(draw, "X", font)
+        ref_bbox = self.bbox(draw, DESCRIPTION_REFERENCE_TEXT, font)
+        try:
+            ascent, descent = font.getmetrics()
+        except Exception:
+            ascent, descent = None, None
+        metrics = FontMetrics(
+            x_height=x_bbox[3] - x_bbox[1],
+            description_max_width=ref_bbox[2] - ref_bbox[0],
+            ascent=ascent,
+            descent=descent,
+        )
+        with self._lock:
+            # Poucas fontes por processo (limitadas pelo cache de fontes) - sem LRU aqui
+            if len(self._metrics) >= config.FONT_CACHE_SIZE * 4:
+                self._metrics.clear()
+            self._metrics[key] = (font, metrics)
+        return metrics
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._bboxes),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "fonts_with_metrics": len(self._metrics),
+            }
+
+
+class TextRasterCache:
+    """
+    Cache LRU thread-safe das máscaras de texto já rasterizadas
+    Usa APIs internas do Pillow (ImageDraw._getink, draw.draw.draw_bitmap, conferidas
+    no Pillow 10.1): se alguma sumir ou mudar de assinatura numa atualização, o
+    cache se desliga sozinho e o texto volta a sair por draw.text
+    """
+
+    def __init__(self, max_size=None):
+        # 0 desliga o cache (draw.text direto)
+        self.max_size = config.TEXT_RASTER_CACHE_SIZE if max_size is None else max_size
+        self._supported = True
+        self._masks = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def draw_text(self, draw, xy, text, font, fill):
+        """
+        Mesmo resultado de draw.text(xy, text, font=font, fill=fill), rasterizando
+        cada (fonte, texto, fração da posição) uma vez só
+        """
+        if self.max_size <= 0 or not self._supported or '\n' in text or not hasattr(font, 'getmask2'):
+            draw.text(xy, text, font=font, fill=fill)
+            return
+        try:
+            self._draw_cached(draw, xy, text, font, fill)
+        except (AttributeError, TypeError, IndexError) as e:
+            # API interna do Pillow diferente da esperada: desliga o cache de vez.
+            # Nada foi desenhado ainda quando a falha vem daqui (draw_bitmap é o último passo)
+            self._supported = False
+            logger.warning(f"⚠️ Cache de rasterização de texto desligado (Pillow incompatível): {e}")
+            draw.text(xy, text, font=font, fill=fill)
+
+    def _draw_cached(self, draw, xy, text, font, fill):
+        ink = draw._getink(fill)[0]
+        if ink is None:
+            draw.text(xy, text, font=font, fill=fill)
+            return
+
+        mode = draw.fontmode
+        start = (math.modf(xy[0])[0], math.modf(xy[1])[0])
+        key = (_font_key(font), mode, text, start)
+        with self._lock:
+            entry = self._masks.get(key)
+            if entry is not None:
+                self._masks.move_to_end(key)
+                self.hits += 1
+        if entry is None:
+            mask, offset = font.getmask2(text, mode, ink=ink, start=start)
+            entry = (font, mask, offset)
+            with self._lock:
+                self.misses += 1
+                self._masks[key] = entry
+                while len(self._masks) > self.max_size:
+                    self._masks.popitem(last=False)
+
+        _, mask, offset = entry
+        draw.draw.draw_bitmap((int(xy[0]) + offset[0], int(xy[1]) + offset[1]), mask, ink)
+
+    def clear(self):
+        with self._lock:
+            self._masks.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.max_size > 0 and self._supported,
+                "size": len(self._masks),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
+
+# Instâncias globais
+text_measurer = TextMeasurer()
+text_raster_cache = TextRasterCache()
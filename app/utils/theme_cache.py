@@ -0,0 +1,205 @@
+"""
+Cache de temas (overlays PNG)
+As lojas reaproveitam poucos temas em milhares de fotos; aqui cada tema é
+baixado uma vez por worker e revalidado na origem (ETag/If-Modified-Since) só
+depois de THEME_CACHE_TTL, e o overlay já decodificado e redimensionado para o
+tamanho da foto fica em memória - um tema "quente" não custa rede nem resize.
+Tudo sob um orçamento de bytes (THEME_CACHE_MAX_BYTES) com despejo LRU
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import requests
+from app import config
+from app.utils.logger import get_logger
+from app.utils.download_cache import download_cache
+from app.utils.http_client import http_get
+from app.utils.ingest import read_image_response
+
+logger = get_logger(__name__)
+
+
+class ThemeSource:
+    """Bytes de um tema + validadores HTTP da última resposta da origem"""
+
+    __slots__ = ('url', 'data', 'digest', 'etag', 'last_modified', 'validated_at')
+
+    def __init__(self, url, data, etag=None, last_modified=None, digest=None):
+        self.url = url
+        self.data = data
+        self.digest = digest or hashlib.sha256(data).hexdigest()
+        self.etag = etag
+        self.last_modified = last_modified
+        self.validated_at = time.monotonic()
+
+    @property
+    def key(self):
+        """Identifica o conteúdo (muda se a origem devolver outro arquivo na mesma URL)"""
+        return (self.url, self.digest)
+
+
+class ThemeCache:
+    """Cache LRU thread-safe de temas baixados e de overlays já redimensionados"""
+
+    def __init__(self, max_bytes=None, ttl=None):
+        self.max_bytes = max_bytes if max_bytes is not None else config.THEME_CACHE_MAX_BYTES
+        self.ttl = ttl if ttl is not None else config.THEME_CACHE_TTL
+        # ('source', url) -> (ThemeSource, bytes) | ('overlay', url, digest, size) -> (Overlay, bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self.overlay_hits = 0
+        self.overlay_misses = 0
+        self.evictions = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _put(self, key, value, nbytes):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.evictions += 1
+
+    def _drop_overlays(self, url):
+        """Remove os overlays de uma URL cujo conteúdo mudou na origem"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == 'overlay' and key[1] == url]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def _download(self, url, source=None):
+        """
+        GET (condicional se já houver uma versão em cache)
+        Com o cache de downloads em disco ligado, a revalidação HTTP fica com ele
+        (compartilhada entre os workers); aqui só se compara o conteúdo
+
+        Returns:
+            ThemeSource: conteúdo novo, ou None se não mudou
+        """
+        if download_cache.enabled:
+            download = download_cache.fetch(url)
+            if source is not None and download.digest == source.digest:
+                return None
+            return ThemeSource(url, download.data, download.etag, download.last_modified, digest=download.digest)
+
+        headers = {}
+        if source is not None:
+            if source.etag:
+                headers['If-None-Match'] = source.etag
+            if source.last_modified:
+                headers['If-Modified-Since'] = source.last_modified
+        response = http_get(url, headers=headers, stream=True)
+        if response.status_code == 304 and source is not None:
+            response.close()
+            return None
+        with response:  # devolve a conexão ao pool mesmo em erro
+            response.raise_for_status()
+            return ThemeSource(
+                url, read_image_response(response, url),
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+
+    def fetch(self, url):
+        """
+        Bytes do tema (da memória enquanto fresco, revalidado na origem depois do TTL)
+
+        Returns:
+            ThemeSource: conteúdo + chave para overlay()
+
+        Raises:
+            Exception: se o download falhar e não houver cópia em cache
+        """
+        source = self._get(('source', url))
+        if source is not None and time.monotonic() - source.validated_at < self.ttl:
+            self.hits += 1
+            return source
+
+        if source is None:
+            self.misses += 1
+            logger.info(f"🎨 Tema fora do cache, baixando: {url}")
+            source = self._download(url)
+            self._put(('source', url), source, len(source.data))
+            return source
+
+        # Expirado: pergunta à origem se mudou
+        self.revalidations += 1
+        try:
+            fresh = self._download(url, source)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"⚠️ Falha ao revalidar tema {url}: {e}. Usando cópia em cache")
+            return source
+
+        if fresh is None:
+            self.not_modified += 1
+            source.validated_at = time.monotonic()
+            return source
+
+        if fresh.digest != source.digest:
+            logger.info(f"🎨 Tema alterado na origem, descartando overlays antigos: {url}")
+            self._drop_overlays(url)
+        self._put(('source', url), fresh, len(fresh.data))
+        return fresh
+
+    def overlay(self, key, size, build):
+        """
+        Overlay do tema (recortado) para o tamanho exato da foto
+
+        Args:
+            key (tuple): ThemeSource.key (None desliga o cache)
+            size (tuple): (largura, altura) da foto
+            build (callable): build() -> Overlay para um frame de tamanho `size`
+
+        Returns:
+            Overlay: overlay compartilhado - somente leitura, não alterar
+        """
+        if key is None:
+            return build()
+        cache_key = ('overlay',) + tuple(key) + (tuple(size),)
+        overlay = self._get(cache_key)
+        if overlay is not None:
+            self.overlay_hits += 1
+            return overlay
+
+        self.overlay_misses += 1
+        overlay = build()
+        self._put(cache_key, overlay, overlay.nbytes)
+        return overlay
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "not_modified": self.not_modified,
+                "overlay_hits": self.overlay_hits,
+                "overlay_misses": self.overlay_misses,
+                "evictions": self.evictions,
+            }
+
+# Instância global
+theme_cache = ThemeCache()
@@ -1,7 +1,12 @@
 """
 Validadores de entrada e dados
 """
+import ipaddress
+import socket
+from urllib.parse import urlsplit
 from app import config
+from app.utils.renditions import parse_renditions
+from app.utils.encoders import get_encoder
 
 def validate_process_image_payload(data):
     """
@@ -57,8 +62,87 @@ def validate_process_image_payload(data):
         if not (watermark_url.startswith('http://') or watermark_url.startswith('https://')):
             return False, "'watermark_url' deve ser uma URL válida (http/https) ou vazia"
     
+    # Validar formato de saída (opcional, layout_config.formatoSaida)
+    layout_config = data.get('layout_config')
+    if isinstance(layout_config, dict) and layout_config.get('formatoSaida'):
+        try:
+            get_encoder(layout_config['formatoSaida'])
+        except ValueError as e:
+            return False, str(e)
+    
+    # Validar renditions (opcional)
+    try:
+        parse_renditions(data.get('renditions'))
+    except ValueError as e:
+        return False, str(e)
+    
+    # Validar callback_url (opcional, webhook de conclusão)
+    callback_url = data.get('callback_url')
+    if callback_url is not None:
+        error = validate_callback_url(callback_url)
+        if error:
+            return False, error
+    
     return True, None
 
+def validate_callback_url(url):
+    """
+    Valida a URL de webhook (http/https, host em WEBHOOK_ALLOWED_HOSTS se configurado)
+    
+    Returns:
+        str: mensagem de erro, ou None se válida
+    """
+    if not isinstance(url, str) or len(url) > 2048:
+        return "'callback_url' deve ser uma string de até 2048 caracteres"
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return "'callback_url' deve ser uma URL válida (http/https)"
+    if config.WEBHOOK_ALLOWED_HOSTS and parts.hostname not in config.WEBHOOK_ALLOWED_HOSTS:
+        return f"'callback_url': host '{parts.hostname}' não permitido"
+    error = callback_address_error(parts.hostname)
+    if error:
+        return f"'callback_url': {error}"
+    return None
+
+def _allowed_networks():
+    """Redes (CIDR ou IP) de WEBHOOK_PRIVATE_ALLOWLIST; os demais itens são nomes de host"""
+    networks = []
+    for entry in config.WEBHOOK_PRIVATE_ALLOWLIST:
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            pass
+    return networks
+
+def callback_address_error(hostname):
+    """
+    Resolve o host do webhook e recusa endereços internos (privados, loopback,
+    link-local, multicast, reservados) - evita SSRF para a rede local ou para o
+    metadata da nuvem (169.254.169.254). Hosts e redes em WEBHOOK_PRIVATE_ALLOWLIST
+    passam mesmo assim
+    
+    Chamada no envio da tarefa e de novo antes de cada entrega (o DNS pode mudar)
+    
+    Returns:
+        str: motivo da recusa, ou None se o host é permitido
+    """
+    if hostname in config.WEBHOOK_PRIVATE_ALLOWLIST:
+        return None
+    try:
+        infos = socket.getaddrinfo(hostname, None, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as e:
+        return f"host '{hostname}' não resolvido ({e})"
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split('%', 1)[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if address.is_global and not address.is_multicast:
+            continue
+        if any(address in network for network in _allowed_networks()):
+            continue
+        return f"host '{hostname}' aponta para endereço interno ({address})"
+    return None
+
 def validate_product_data(product):
     """
     Valida e retorna dados normalizados de um produto
@@ -0,0 +1,257 @@
+"""
+Webhooks de conclusão (callback_url)
+Quando uma tarefa com callback_url termina (COMPLETED ou FAILED), o status dela
+é lido do task store - que continua sendo a fonte da verdade - e gravado numa
+outbox em SQLite. Uma thread de entrega por processo envia os avisos pela
+sessão HTTP compartilhada, juntando num POST só os que vão para a mesma URL, e
+reagenda as falhas com backoff exponencial. A outbox sobrevive a restarts: o que
+não foi entregue sai quando o processo sobe de novo
+
+Corpo do POST: {"events": [{"event": "task.completed", ...status...}, ...]}
+"""
+import hashlib
+import hmac
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+from app import config
+from app.utils.logger import get_logger
+from app.utils.http_client import http_post
+from app.utils.validators import callback_address_error
+from app.utils.task_manager import task_manager, public_status
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt_at ON outbox(next_attempt_at);
+"""
+
+EVENTS = {'COMPLETED': 'task.completed', 'FAILED': 'task.failed'}
+
+
+class _Outbox:
+    """
+    Avisos pendentes em SQLite (modo WAL), compartilhados entre os processos
+    Uma linha reservada por um processo tem next_attempt_at empurrado para frente
+    (lease): se o processo morrer no meio do envio, ela volta a vencer sozinha
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        """Uma conexão por thread (e por processo, depois de um fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add(self, task_id, url, payload):
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO outbox (task_id, url, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+            (task_id, url, json.dumps(payload), now, now)
+        )
+
+    def claim(self, limit, lease_seconds):
+        """Reserva até `limit` avisos vencidos; devolve [(id, url, payload, attempts)]"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, url, payload, attempts FROM outbox WHERE next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?", (now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                [(now + lease_seconds, row[0]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def delete(self, ids):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def reschedule(self, rows, error):
+        """Nova tentativa para cada (id, próximo horário)"""
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                [(next_attempt_at, error, row_id) for row_id, next_attempt_at in rows]
+            )
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+
+class WebhookDispatcher:
+    """Outbox + thread de entrega (uma por processo, refeita depois de um fork)"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self._outbox = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._executor = None
+        self._delivered = 0
+        self._retried = 0
+        self._dropped = 0
+        self._batches = 0
+
+    @property
+    def outbox(self):
+        if self._outbox is None:
+            with self._lock:
+                if self._outbox is None:
+                    self._outbox = _Outbox(self.db_path or config.WEBHOOK_DB_PATH)
+        return self._outbox
+
+    def notify(self, task_id, callback_url):
+        """
+        Grava o aviso de uma tarefa que terminou (status lido do task store)
+        Não faz I/O de rede: quem envia é a thread de entrega
+        """
+        status_data = task_manager.get_task_status(task_id)
+        event = EVENTS.get(status_data['status'])
+        if event is None:
+            logger.warning(f"Webhook da tarefa {task_id} ignorado: status {status_data['status']}")
+            return
+        try:
+            self.outbox.add(task_id, callback_url, dict(public_status(task_id, status_data), event=event))
+            self._wake.set()
+        except Exception as e:
+            logger.error(f"Erro ao gravar webhook da tarefa {task_id}: {e}")
+
+    def start(self):
+        """Sobe a thread de entrega (chamada barata; uma vez por processo)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._executor = ThreadPoolExecutor(max_workers=config.WEBHOOK_THREADS, thread_name_prefix='webhook')
+            threading.Thread(target=self._run, name='webhook-dispatcher', daemon=True).start()
+
+    def _run(self):
+        while True:
+            woken = self._wake.wait(config.WEBHOOK_POLL_INTERVAL)
+            self._wake.clear()
+            if woken:
+                # Dá tempo de outras tarefas terminarem e irem no mesmo POST
+                time.sleep(config.WEBHOOK_BATCH_WINDOW)
+            try:
+                self._deliver_due()
+            except Exception as e:
+                logger.error(f"Erro na entrega de webhooks: {e}")
+
+    def _deliver_due(self):
+        """Reserva os avisos vencidos, agrupa por URL e envia os lotes em paralelo"""
+        limit = config.WEBHOOK_MAX_BATCH * config.WEBHOOK_THREADS
+        rows = self.outbox.claim(limit, lease_seconds=config.WEBHOOK_TIMEOUT * 2 + 5)
+        if not rows:
+            return
+        by_url = {}
+        for row in rows:
+            by_url.setdefault(row[1], []).append(row)
+        futures = []
+        for url, url_rows in by_url.items():
+            for start in range(0, len(url_rows), config.WEBHOOK_MAX_BATCH):
+                futures.append(self._executor.submit(self._deliver, url, url_rows[start:start + config.WEBHOOK_MAX_BATCH]))
+        wait(futures)
+        if len(rows) == limit:
+            self._wake.set()  # ainda pode haver avisos vencidos
+
+    def _deliver(self, url, rows):
+        body = json.dumps({"events": [json.loads(row[2]) for row in rows]}).encode()
+        headers = {"Content-Type": "application/json"}
+        if config.WEBHOOK_SECRET:
+            signature = hmac.new(config.WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+            headers["X-Webhook-Signature"] = f"sha256={signature}"
+        try:
+            blocked = callback_address_error(urlsplit(url).hostname)
+            if blocked:
+                raise RuntimeError(blocked)  # DNS mudou desde o envio da tarefa
+            response = http_post(url, body, headers=headers, timeout=config.WEBHOOK_TIMEOUT)
+            if not 200 <= response.status_code < 300:
+                raise RuntimeError(f"HTTP {response.status_code}")
+        except Exception as e:
+            self._retry(url, rows, str(e))
+            return
+        self.outbox.delete([row[0] for row in rows])
+        with self._lock:
+            self._delivered += len(rows)
+            self._batches += 1
+        logger.info(f"📨 Webhook entregue: {len(rows)} aviso(s) para {urlsplit(url).hostname}")
+
+    def _retry(self, url, rows, error):
+        """Backoff exponencial com jitter; desiste depois de WEBHOOK_MAX_ATTEMPTS"""
+        now = time.time()
+        retry, dropped = [], []
+        for row_id, _, _, attempts in rows:
+            if attempts + 1 >= config.WEBHOOK_MAX_ATTEMPTS:
+                dropped.append(row_id)
+            else:
+                delay = min(config.WEBHOOK_RETRY_BASE * 2 ** attempts, config.WEBHOOK_RETRY_MAX)
+                retry.append((row_id, now + delay * random.uniform(0.8, 1.2)))
+        if retry:
+            self.outbox.reschedule(retry, error)
+        if dropped:
+            self.outbox.delete(dropped)
+            logger.error(f"Webhook descartado depois de {config.WEBHOOK_MAX_ATTEMPTS} tentativas: "
+                         f"{len(dropped)} aviso(s) para {urlsplit(url).hostname} ({error})")
+        with self._lock:
+            self._retried += len(retry)
+            self._dropped += len(dropped)
+        if retry:
+            logger.warning(f"Falha no webhook para {urlsplit(url).hostname} ({error}); nova tentativa agendada")
+
+    def stats(self):
+        """Pendentes na outbox (todos os processos) e contadores deste processo"""
+        with self._lock:
+            stats = {
+                "delivered": self._delivered,
+                "retried": self._retried,
+                "dropped": self._dropped,
+                "batches": self._batches,
+            }
+        try:
+            stats["pending"] = self.outbox.count()
+        except Exception as e:
+            stats["pending"] = None
+            logger.warning(f"Erro ao contar a outbox de webhooks: {e}")
+        return stats
+
+# Instância global
+webhook_dispatcher = WebhookDispatcher()
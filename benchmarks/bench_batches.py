@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark do envio de uma coleção: N POSTs em /api/v1/process-image contra um
+POST em /api/v1/batches
+
+Mede só o lado da API (validação, escrita no task store, agendamento e log): o
+render é trocado por um agendamento vazio, para o tempo não ser dominado pela
+renderização, que é igual nos dois fluxos. Mostra tempo total, requisições,
+transações no task store e linhas de log INFO.
+
+Uso:
+    python benchmarks/bench_batches.py [--jobs 200] [--runs 3]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_dual import make_products  # noqa: E402
+
+
+class CountingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    # Task store descartável (não suja o tasks_db.sqlite3 de desenvolvimento)
+    from app import config
+    config.TASKS_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_batches_"), "tasks.sqlite3")
+    config.USE_REDIS = False
+    import app.main as api
+    from app.utils.task_manager import task_manager
+
+    # Log: só contar as linhas INFO (nada vai para o console/arquivo)
+    handler = CountingHandler()
+    root = logging.getLogger()
+    for logger in [root] + [logging.getLogger(name) for name in list(logging.root.manager.loggerDict)]:
+        for existing in list(getattr(logger, 'handlers', [])):
+            logger.removeHandler(existing)
+        if isinstance(logger, logging.Logger):
+            logger.propagate = True
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+    # Agendamento vazio (mede só a API)
+    api.submit_render_task = lambda *a, **kw: None
+    api.submit_batch = lambda jobs: None
+
+    # Transações no task store
+    writes = [0]
+    for method in ("update_task_status", "create_batch"):
+        original = getattr(task_manager, method)
+
+        def counting(*a, _original=original, **kw):
+            writes[0] += 1
+            return _original(*a, **kw)
+        setattr(task_manager, method, counting)
+
+    jobs = [{
+        "products": make_products(3),
+        "original_image_url": f"https://example.com/colecao/foto-{i}.jpg",
+        "theme_url": "https://example.com/temas/verao.png",
+    } for i in range(args.jobs)]
+    client = api.app.test_client()
+
+    def individual():
+        for job in jobs:
+            assert client.post("/api/v1/process-image", json=job).status_code == 202
+        return len(jobs)
+
+    def batch():
+        assert client.post("/api/v1/batches", json={"jobs": jobs}).status_code == 202
+        return 1
+
+    print(f"{args.jobs} tarefas (3 produtos cada), {args.runs} execuções")
+    print(f"{'Fluxo':<22} {'tempo':>9} {'requisições':>12} {'transações':>11} {'linhas INFO':>12}")
+    for name, flow in (("N x /process-image", individual), ("1 x /batches", batch)):
+        flow()
+        timings = []
+        for _ in range(args.runs):
+            writes[0], handler.count = 0, 0
+            started = time.perf_counter()
+            requests_made = flow()
+            timings.append(time.perf_counter() - started)
+        print(f"{name:<22} {statistics.median(timings) * 1000:>7.0f}ms {requests_made:>12} "
+              f"{writes[0]:>11} {handler.count:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Benchmark da composição tema + blocos (render_outputs)
+
+Compara o caminho antigo - foto em RGBA, Image.new + dois paste do frame
+inteiro para o tema, copy() antes de desenhar, alpha_composite sobre branco e
+convert("RGB") antes do encode - com a composição por região (foto em RGB,
+tema recortado colado só na sua caixa). Conta os frames inteiros alocados
+(toda imagem nova do tamanho da foto) e mede tempo e pico de memória (VmHWM),
+cada caminho num subprocesso próprio, com o tema já pronto nos dois.
+
+Uso:
+    python benchmarks/bench_compositing.py [--runs 10] [--modes simples,duplo]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+PRODUCTS = [
+    {"Referencia": "REF-1", "DescricaoFinal": "Camiseta Premium Algodão", "Preco": 99.9,
+     "PrecoPromocional": 79.9, "TamanhosDisponiveis": "P, M, G", "NumeracaoUtilizada": "52"},
+    {"Referencia": "REF-2", "DescricaoFinal": "Calça Jeans", "Preco": 149.9,
+     "PrecoPromocional": 119.9, "TamanhosDisponiveis": "38, 40", "NumeracaoUtilizada": "40"},
+]
+
+
+def make_inputs(workdir):
+    """Foto JPEG 1080x1440 e tema PNG com moldura translúcida (~30% do frame)"""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rnd = random.Random(3)
+    photo = Image.new("RGB", (1080, 1440), (200, 190, 180))
+    draw = ImageDraw.Draw(photo)
+    for _ in range(300):
+        x, y = rnd.randrange(1080), rnd.randrange(1440)
+        draw.ellipse([x, y, x + rnd.randrange(30, 300), y + rnd.randrange(30, 300)],
+                     fill=(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    photo = photo.filter(ImageFilter.GaussianBlur(2))
+
+    theme = Image.new("RGBA", (1080, 1440), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(theme)
+    draw.rectangle([0, 0, 1080, 200], fill=(200, 20, 60, 200))  # faixa superior
+    draw.rectangle([0, 1200, 1080, 1440], fill=(200, 20, 60, 160))  # rodapé
+    draw.text((40, 60), "PROMOÇÃO", fill=(255, 255, 255, 255))
+
+    paths = {}
+    for name, image, fmt in (("photo", photo, "JPEG"), ("theme", theme, "PNG")):
+        buffer = BytesIO()
+        image.save(buffer, fmt)
+        paths[name] = os.path.join(workdir, f"{name}.{fmt.lower()}")
+        with open(paths[name], "wb") as f:
+            f.write(buffer.getvalue())
+    return paths
+
+
+def render_old(processor, ctx, photo_data, theme_image, products, dual):
+    """Caminho antigo de render_outputs (frames RGBA inteiros)"""
+    from PIL import Image, ImageDraw
+
+    base = processor._decode_image(photo_data).convert("RGBA")
+    height = base.height
+    no_theme = base.copy() if dual else None
+
+    composite = Image.new("RGBA", base.size)
+    composite.paste(base, (0, 0))
+    composite.paste(theme_image, (0, 0), theme_image)
+    base = composite
+
+    outputs = {}
+    if dual:
+        normal = no_theme.copy()
+        draw = ImageDraw.Draw(normal)
+        processor._draw_layout_plan(draw, ctx, processor.build_layout_plan(draw, ctx, products, bottom_y=height - ctx.padding_y))
+        outputs['normal'] = processor._encode(normal.convert("RGB"), ctx)
+        background = Image.new("RGBA", base.size, (255, 255, 255, 255))
+        promo = Image.alpha_composite(background, base).convert("RGB")
+    else:
+        promo = base.copy()
+    draw = ImageDraw.Draw(promo)
+    processor._draw_layout_plan(draw, ctx, processor.build_layout_plan(draw, ctx, products, bottom_y=height - ctx.padding_y))
+    if dual:
+        outputs['debug'] = processor._encode(promo, ctx, 95)
+    outputs['final'] = processor._encode(promo.convert("RGB"), ctx)
+    return outputs
+
+
+def peak_rss_kb():
+    """Pico de memória do processo (KB) - VmHWM, zerado no exec (ver bench_decode.py)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child(method, mode, photo_path, theme_path, runs):
+    """Executado no subprocesso: tempo, pico de memória e frames alocados por render"""
+    logging.disable(logging.CRITICAL)
+    from PIL import Image
+    from app.utils.image_processor import image_processor
+    from app.utils.theme_cache import theme_cache
+    from app.utils.validators import validate_product_data
+
+    with open(photo_path, "rb") as f:
+        photo_data = f.read()
+    with open(theme_path, "rb") as f:
+        theme_data = f.read()
+    dual = mode == "duplo"
+    ctx = image_processor.create_render_context()
+    products = [validate_product_data(p) for p in PRODUCTS]
+    frame_size = image_processor._decode_image(photo_data).size
+
+    # Tema já pronto nos dois caminhos (como com o cache de temas quente)
+    if method == "old":
+        theme_image = image_processor._decode_image(theme_data, keep_alpha=True)
+        render = lambda: render_old(image_processor, ctx, photo_data, theme_image, products, dual)
+    else:
+        theme_key = ("bench", "tema")
+        theme_cache.overlay(theme_key + (ctx.resize_profile,), frame_size,
+                            lambda: image_processor._prepare_theme_overlay(theme_data, frame_size, ctx.resize_profile))
+        render = lambda: image_processor.render_outputs(ctx, photo_data, theme_data, PRODUCTS, dual, theme_key=theme_key)
+
+    baseline_kb = peak_rss_kb()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - started)
+    peak_mb = (peak_rss_kb() - baseline_kb) / 1024
+
+    # Contar imagens novas do tamanho do frame (copy, convert, new, alpha_composite...)
+    allocations = []
+    original_new = Image.Image._new
+
+    def counting_new(self, im):
+        image = original_new(self, im)
+        if image.size == frame_size:
+            allocations.append(len(image.getbands()))
+        return image
+
+    Image.Image._new = counting_new
+    render()
+    Image.Image._new = original_new
+    frames = len(allocations)
+    frame_mb = sum(allocations) * frame_size[0] * frame_size[1] / 1024 / 1024
+
+    print(json.dumps({
+        "seconds": statistics.median(timings),
+        "frames": frames,
+        "frame_mb": frame_mb,
+        "peak_mb": peak_mb,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--modes", default="simples,duplo")
+    parser.add_argument("--child", nargs=4, metavar=("METHOD", "MODE", "PHOTO", "THEME"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(*args.child, args.runs)
+
+    paths = make_inputs(tempfile.mkdtemp(prefix="bench_compositing_"))
+    print(f"{'Modo':<8} {'Caminho':<8} {'tempo':>9} {'frames':>7} {'alocado':>9} {'pico RSS':>9}")
+    for mode in args.modes.split(","):
+        results = {}
+        for method in ("old", "new"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--runs", str(args.runs), "--child", method, mode, paths["photo"], paths["theme"]],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[method] = json.loads(output.strip().splitlines()[-1])
+        for method, label in (("old", "antes"), ("new", "depois")):
+            r = results[method]
+            print(f"{mode:<8} {label:<8} {r['seconds'] * 1000:>7.1f}ms {r['frames']:>7} "
+                  f"{r['frame_mb']:>7.1f}MB {r['peak_mb']:>7.1f}MB")
+        print(f"{mode:<8} ganho    {results['old']['seconds'] / results['new']['seconds']:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark da decodificação das fotos de celular (JPEG e HEIC 3024x4032)
+
+Compara o caminho antigo - decodificar na resolução nativa, converter para
+RGBA e só então LANCZOS até 1080px - com ImageProcessor._decode_image
+(draft DCT no JPEG, resize em RGB antes da conversão). Cada medição roda num
+subprocesso próprio para o pico de memória (VmHWM) não se misturar.
+
+Uso:
+    python benchmarks/bench_decode.py [--runs 5] [--formats jpeg,heic]
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def make_photo(fmt, width=3024, height=4032):
+    """Foto sintética com conteúdo variado, no formato pedido"""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rnd = random.Random(42)
+    image = Image.new("RGB", (width, height), (200, 190, 180))
+    draw = ImageDraw.Draw(image)
+    for _ in range(400):
+        x, y = rnd.randrange(width), rnd.randrange(height)
+        size_x, size_y = rnd.randrange(30, 500), rnd.randrange(30, 500)
+        draw.ellipse([x, y, x + size_x, y + size_y], fill=(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    image = image.filter(ImageFilter.GaussianBlur(2))
+    buffer = BytesIO()
+    if fmt == "heic":
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+        image.save(buffer, "HEIF", quality=85)
+    else:
+        image.save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def decode_old(data):
+    """Caminho antigo: RGBA na resolução nativa + LANCZOS"""
+    from PIL import Image
+
+    image = Image.open(BytesIO(data)).convert("RGBA")
+    if image.width > 1080:
+        image = image.resize((1080, round(image.height * (1080 / image.width))), Image.Resampling.LANCZOS)
+    return image
+
+
+def psnr(a, b):
+    """PSNR (dB) entre duas imagens do mesmo tamanho, sem numpy"""
+    from PIL import ImageChops
+
+    histogram = ImageChops.difference(a.convert("RGB"), b.convert("RGB")).histogram()
+    mse = sum(count * (i % 256) ** 2 for i, count in enumerate(histogram)) / (a.width * a.height * 3)
+    return float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def peak_rss_kb():
+    """
+    Pico de memória do processo (KB). VmHWM é zerado no exec; o ru_maxrss herda o
+    pico do processo pai que fez o fork, o que estragaria a medição no subprocesso
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child(method, path, runs):
+    """Executado no subprocesso: mede tempo e pico de memória de um método"""
+    logging.disable(logging.CRITICAL)
+    from app.utils.image_processor import image_processor
+
+    with open(path, "rb") as f:
+        data = f.read()
+    baseline_kb = peak_rss_kb()
+
+    decode = decode_old if method == "old" else image_processor._decode_image
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        image = decode(data)
+        timings.append(time.perf_counter() - started)
+        del image
+
+    peak_kb = peak_rss_kb()
+    print(json.dumps({"seconds": statistics.median(timings), "peak_mb": (peak_kb - baseline_kb) / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--formats", default="jpeg,heic")
+    parser.add_argument("--child", nargs=2, metavar=("METHOD", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child[0], args.child[1], args.runs)
+
+    logging.disable(logging.CRITICAL)
+    from app.utils.image_processor import image_processor
+
+    workdir = tempfile.mkdtemp(prefix="bench_decode_")
+    print(f"{'Formato':<8} {'Caminho':<8} {'tempo':>10} {'pico RSS':>10} {'PSNR':>9}")
+    for fmt in args.formats.split(","):
+        data = make_photo(fmt)
+        path = os.path.join(workdir, f"photo.{fmt}")
+        with open(path, "wb") as f:
+            f.write(data)
+
+        quality = psnr(decode_old(data), image_processor._decode_image(data))
+        results = {}
+        for method in ("old", "new"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--runs", str(args.runs), "--child", method, path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[method] = json.loads(output.strip().splitlines()[-1])
+
+        for method, label in (("old", "antes"), ("new", "depois")):
+            r = results[method]
+            shown_psnr = "-" if method == "old" else f"{quality:.1f}dB"
+            print(f"{fmt:<8} {label:<8} {r['seconds'] * 1000:>8.1f}ms {r['peak_mb']:>8.1f}MB {shown_psnr:>9}")
+        print(f"{fmt:<8} ganho    {results['old']['seconds'] / results['new']['seconds']:>9.2f}x "
+              f"{results['old']['peak_mb'] / max(results['new']['peak_mb'], 0.1):>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
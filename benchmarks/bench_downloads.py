@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos downloads de uma tarefa (foto original + tema)
+
+Sobe um servidor HTTP local que simula a origem (Supabase storage) com
+latência injetada: um atraso por conexão nova (DNS + TCP + TLS) e outro por
+requisição (tempo até o primeiro byte). Compara o esquema antigo - requests.get
+sem sessão, original e tema um depois do outro - com a sessão keep-alive
+compartilhada e os dois downloads em paralelo.
+
+Uso:
+    python benchmarks/bench_downloads.py [--jobs 20] [--connect-ms 120] [--latency-ms 80]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_handler(files, connect_delay, request_delay):
+    class LatencyHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive
+
+        def setup(self):
+            # Conexão nova: simula DNS + handshake TCP/TLS
+            time.sleep(connect_delay)
+            super().setup()
+
+        def do_GET(self):
+            body = files.get(self.path)
+            time.sleep(request_delay)
+            if body is None:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return LatencyHandler
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--connect-ms", type=float, default=120)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--original-kb", type=int, default=2500)
+    parser.add_argument("--theme-kb", type=int, default=300)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    import requests
+    from app.utils.http_client import http_get, submit_download
+
+    files = {
+        '/original.jpg': os.urandom(args.original_kb * 1024),
+        '/theme.png': os.urandom(args.theme_kb * 1024),
+    }
+    handler = make_handler(files, args.connect_ms / 1000, args.latency_ms / 1000)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def old_job():
+        # Antes: requests.get sem sessão, um download depois do outro
+        original = requests.get(base + '/original.jpg', stream=True, timeout=30).content
+        theme = requests.get(base + '/theme.png', stream=True, timeout=30).content
+        return len(original) + len(theme)
+
+    def new_job():
+        # Depois: sessão keep-alive do worker, tema em paralelo com o original
+        theme_future = submit_download(lambda: http_get(base + '/theme.png').content)
+        original = http_get(base + '/original.jpg').content
+        return len(original) + len(theme_future.result())
+
+    results = {}
+    for name, job in (("antes (requests.get, sequencial)", old_job), ("depois (sessão + paralelo)", new_job)):
+        job()  # aquece (na versão nova, abre as conexões do pool)
+        timings = []
+        for _ in range(args.jobs):
+            started = time.perf_counter()
+            job()
+            timings.append(time.perf_counter() - started)
+        results[name] = timings
+
+    print(f"Origem simulada: +{args.connect_ms:.0f}ms por conexão nova, +{args.latency_ms:.0f}ms por requisição, "
+          f"original {args.original_kb}KB + tema {args.theme_kb}KB, {args.jobs} tarefas")
+    print(f"{'Modo':<36} {'média':>10} {'p50':>10} {'p95':>10}")
+    for name, timings in results.items():
+        print(f"{name:<36} {statistics.mean(timings) * 1000:>8.1f}ms "
+              f"{percentile(timings, 50) * 1000:>8.1f}ms {percentile(timings, 95) * 1000:>8.1f}ms")
+    old_mean, new_mean = (statistics.mean(t) for t in results.values())
+    print(f"Ganho: {old_mean / new_mean:.2f}x no tempo de download por tarefa")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
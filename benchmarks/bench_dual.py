@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark do modo duplo (versão normal + promocional)
+
+Compara o fluxo antigo - cópia da base, medir e posicionar todos os produtos,
+codificar a normal, medir de novo os produtos em oferta, codificar o DEBUG em
+qualidade 95 e só então a promocional, tudo em sequência - com
+ImageProcessor.render_outputs (medidas e máscaras de texto compartilhadas,
+encode da normal em paralelo com o desenho/encode da promocional, DEBUG só com
+SAVE_DEBUG_IMAGES). "cache frio" limpa as máscaras de texto a cada execução
+(só o compartilhamento dentro da tarefa); "cache quente" é o regime de tarefas
+seguidas com os mesmos textos. Mostra tempo de CPU (todas as threads), tempo
+de parede e o que iria para o disco.
+
+Uso:
+    python benchmarks/bench_dual.py [--runs 20] [--products 4]
+"""
+import argparse
+import logging
+import random
+import statistics
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_inputs():
+    """Foto JPEG 1080x1440 e tema PNG translúcido"""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rnd = random.Random(5)
+    photo = Image.new("RGB", (1080, 1440), (210, 200, 190))
+    draw = ImageDraw.Draw(photo)
+    for _ in range(300):
+        x, y = rnd.randrange(1080), rnd.randrange(1440)
+        draw.ellipse([x, y, x + rnd.randrange(30, 300), y + rnd.randrange(30, 300)],
+                     fill=(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    photo = photo.filter(ImageFilter.GaussianBlur(2))
+    theme = Image.new("RGBA", (1080, 1440), (0, 0, 0, 0))
+    ImageDraw.Draw(theme).rectangle([0, 0, 1080, 220], fill=(200, 20, 60, 190))
+
+    encoded = []
+    for image, fmt in ((photo, "JPEG"), (theme, "PNG")):
+        buffer = BytesIO()
+        image.save(buffer, fmt)
+        encoded.append(buffer.getvalue())
+    return encoded
+
+
+def make_products(count):
+    products = []
+    for idx in range(count):
+        products.append({
+            "Referencia": f"REF-{idx}", "DescricaoFinal": f"Blusa Manga Longa Tricô Modelo {idx}",
+            "Preco": 129.9 + idx, "PrecoPromocional": 99.9 + idx if idx % 2 == 0 else 0,
+            "TamanhosDisponiveis": "P, M, G", "NumeracaoUtilizada": "M",
+        })
+    return products
+
+
+def render_old(processor, ctx, photo_data, theme_data, products_data, theme_key):
+    """Fluxo antigo do modo duplo (sequencial, medindo duas vezes, com DEBUG)"""
+    from PIL import ImageDraw
+    from app.utils.validators import validate_product_data
+
+    base = processor._decode_image(photo_data, ctx.resize_profile)
+    height = base.height
+    normal = base.copy()
+    processor._apply_theme_data(ctx, base, theme_data, theme_key, matte=True)
+    products = [validate_product_data(p) for p in products_data]
+
+    outputs = {}
+    draw = ImageDraw.Draw(normal)
+    processor._draw_layout_plan(draw, ctx, processor.build_layout_plan(draw, ctx, products, bottom_y=height - ctx.padding_y))
+    outputs['normal'] = processor._encode(normal, ctx)
+
+    promo = [p for p in products if p['PrecoPromocional'] > 0]
+    draw = ImageDraw.Draw(base)
+    processor._draw_layout_plan(draw, ctx, processor.build_layout_plan(draw, ctx, promo, bottom_y=height - ctx.padding_y))
+    outputs['debug'] = processor._encode(base, ctx, 95)
+    outputs['final'] = processor._encode(base, ctx)
+    return outputs
+
+
+def measure(render, runs, before_each=None):
+    cpu, wall, outputs = [], [], None
+    for _ in range(runs):
+        if before_each:
+            before_each()
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        outputs = render()
+        cpu.append(time.process_time() - cpu_started)
+        wall.append(time.perf_counter() - wall_started)
+    return statistics.median(cpu), statistics.median(wall), outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--products", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    from app import config
+    from app.utils.image_processor import image_processor
+    from app.utils.text_metrics import text_raster_cache
+
+    photo_data, theme_data = make_inputs()
+    products = make_products(args.products)
+    ctx = image_processor.create_render_context()
+    theme_key = ("bench", "tema")
+    config.SAVE_DEBUG_IMAGES = False
+
+    render_new = lambda: image_processor.render_outputs(ctx, photo_data, theme_data, products, True, theme_key)
+    raster_size = text_raster_cache.max_size
+    results = {}
+
+    text_raster_cache.max_size = 0  # fluxo antigo: draw.text direto
+    render_old(image_processor, ctx, photo_data, theme_data, products, theme_key)  # aquece (fontes, overlay do tema)
+    results["antes"] = measure(lambda: render_old(image_processor, ctx, photo_data, theme_data, products, theme_key), args.runs)
+
+    text_raster_cache.max_size = raster_size
+    render_new()  # aquece as threads de encode
+    results["depois (cache frio)"] = measure(render_new, args.runs, before_each=text_raster_cache.clear)
+    results["depois (cache quente)"] = measure(render_new, args.runs)
+
+    print(f"{args.products} produtos ({(args.products + 1) // 2} em oferta), {args.runs} execuções, "
+          f"{config.ENCODE_THREADS} threads de encode")
+    print(f"{'Fluxo':<22} {'CPU':>9} {'parede':>9} {'arquivos':>9} {'gravado':>9} {'ganho CPU':>10}")
+    old_cpu = results["antes"][0]
+    for name, (cpu, wall, outputs) in results.items():
+        written = sum(len(data) for data in outputs.values())
+        print(f"{name:<22} {cpu * 1000:>7.1f}ms {wall * 1000:>7.1f}ms {len(outputs):>9} "
+              f"{written / 1024:>7.0f}KB {old_cpu / cpu:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
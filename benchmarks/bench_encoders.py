@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos formatos de saída (app/utils/encoders.py)
+
+Codifica o mesmo frame final (foto + tema + legenda, 1080x1440) em cada
+variante - JPEG como hoje (sem optimize), JPEG otimizado, JPEG progressivo,
+WebP e AVIF (se o libheif tiver encoder AV1) - e mostra tempo de encode,
+tamanho do arquivo, tamanho relativo ao JPEG de hoje e PSNR contra o frame.
+
+Uso:
+    python benchmarks/bench_encoders.py [--runs 5]
+"""
+import argparse
+import logging
+import statistics
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_dual import make_inputs, make_products  # noqa: E402
+from bench_resize import psnr  # noqa: E402
+
+# (rótulo, formato, overrides de config, qualidade)
+VARIANTS = [
+    ("jpeg q90 (antes)", "jpeg", {"JPEG_OPTIMIZE": False, "JPEG_PROGRESSIVE": False}, 90),
+    ("jpeg q90 otimizado", "jpeg", {"JPEG_OPTIMIZE": True, "JPEG_PROGRESSIVE": False}, 90),
+    ("jpeg q90 progressivo", "jpeg", {"JPEG_OPTIMIZE": True, "JPEG_PROGRESSIVE": True}, 90),
+    ("jpeg q80 progressivo", "jpeg", {"JPEG_OPTIMIZE": True, "JPEG_PROGRESSIVE": True}, 80),
+    ("webp q80 method 0", "webp", {"WEBP_METHOD": 0}, 80),
+    ("webp q80 method 4", "webp", {"WEBP_METHOD": 4}, 80),
+    ("webp q80 method 6", "webp", {"WEBP_METHOD": 6}, 80),
+    ("avif q60 speed 8", "avif", {"AVIF_SPEED": 8}, 60),
+    ("avif q60 speed 6", "avif", {"AVIF_SPEED": 6}, 60),
+]
+
+
+def make_frame(processor):
+    """Frame RGB pronto para o encode (mesmo caminho do render_outputs)"""
+    from PIL import ImageDraw
+    from app.utils.validators import validate_product_data
+
+    photo_data, theme_data = make_inputs()
+    ctx = processor.create_render_context()
+    frame = processor._decode_image(photo_data, ctx.resize_profile)
+    processor._apply_theme_data(ctx, frame, theme_data, ("bench", "tema"))
+    products = [validate_product_data(p) for p in make_products(3)]
+    draw = ImageDraw.Draw(frame)
+    processor._draw_layout_plan(draw, ctx, processor.build_layout_plan(draw, ctx, products, bottom_y=frame.height - ctx.padding_y))
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    from PIL import Image
+    from app import config
+    from app.utils.encoders import ENCODERS, is_available
+    from app.utils.image_processor import image_processor
+
+    frame = make_frame(image_processor)
+    print(f"Frame {frame.width}x{frame.height}, {args.runs} execuções")
+    print(f"{'Variante':<22} {'encode':>9} {'tamanho':>9} {'vs antes':>9} {'PSNR':>8}")
+    baseline = None
+    for label, name, overrides, quality in VARIANTS:
+        if not is_available(name):
+            print(f"{label:<22} {'indisponível neste servidor':>38}")
+            continue
+        saved = {key: getattr(config, key) for key in overrides}
+        for key, value in overrides.items():
+            setattr(config, key, value)
+        try:
+            timings, data = [], None
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                data = ENCODERS[name].encode(frame, quality)
+                timings.append(time.perf_counter() - started)
+        finally:
+            for key, value in saved.items():
+                setattr(config, key, value)
+
+        baseline = baseline or len(data)
+        decoded = Image.open(BytesIO(data)).convert("RGB")
+        print(f"{label:<22} {statistics.median(timings) * 1000:>7.1f}ms {len(data) / 1024:>7.0f}KB "
+              f"{len(data) / baseline * 100:>8.0f}% {psnr(frame, decoded):>6.1f}dB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark do backend Redis do TaskManager: strings JSON + KEYS (antes) contra
+hashes + pipeline + SCAN (app/utils/task_manager.py, _RedisStore)
+
+Contra um redis-server local (o DB escolhido é APAGADO no início e no fim):
+grava --tasks tarefas com as 3 transições de sempre (PENDING, PROCESSING,
+COMPLETED, cada uma com o evento do pub/sub), lê o status de todas, lê um lote
+de --batch tarefas e lista tudo (GET /api/v1/tasks). Mostra operações por
+segundo e o tempo da listagem. --fakeredis roda sem servidor (só para conferir o
+script: sem rede, os round trips não custam nada e os números não valem).
+
+Uso:
+    python benchmarks/bench_redis_store.py [--tasks 10000] [--batch 200] [--host localhost] [--port 6379] [--db 15]
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+TRANSITIONS = ("PENDING", "PROCESSING", "COMPLETED")
+
+
+class LegacyStore:
+    """Redis como era: uma string JSON por tarefa, um comando por round trip, KEYS na listagem"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def put(self, task_id, data):
+        self.client.setex(f"task:{task_id}", 86400, json.dumps(data))
+        self.client.publish(f"task-events:{task_id}", json.dumps(data))
+
+    def get(self, task_id):
+        raw = self.client.get(f"task:{task_id}")
+        return json.loads(raw) if raw else None
+
+    def get_many(self, task_ids):
+        return {task_id: self.get(task_id) for task_id in task_ids}
+
+    def all(self):
+        return {key[len("task:"):]: json.loads(self.client.get(key)) for key in self.client.keys("task:*")}
+
+
+class NewStore:
+    """_RedisStore com o evento no mesmo pipeline, como o TaskManager usa"""
+
+    def __init__(self, client):
+        from app.utils.task_manager import _RedisStore
+        self.store = _RedisStore(client)
+
+    def put(self, task_id, data):
+        self.store.put(task_id, data, publish=True)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+
+def record(task_id, status):
+    return {
+        "status": status, "task_id": task_id, "timestamp": datetime.now().isoformat(),
+        "final_path": f"/srv/temp_processed_images/{task_id}.jpg" if status == "COMPLETED" else None,
+        "normal_path": None, "renditions": None, "error": None,
+    }
+
+
+def run(store, client, task_ids, batch):
+    client.flushdb()
+    results = {}
+    started = time.perf_counter()
+    for status in TRANSITIONS:
+        for task_id in task_ids:
+            store.put(task_id, record(task_id, status))
+    results["escritas/s"] = len(task_ids) * len(TRANSITIONS) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for task_id in task_ids:
+        assert store.get(task_id)["status"] == "COMPLETED"
+    results["leituras/s"] = len(task_ids) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    rounds = 20
+    for _ in range(rounds):
+        assert len(store.get_many(task_ids[:batch])) == batch
+    results["lote (ms)"] = (time.perf_counter() - started) / rounds * 1000
+
+    started = time.perf_counter()
+    assert len(store.all()) == len(task_ids)
+    results["listagem (ms)"] = (time.perf_counter() - started) * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=15)
+    parser.add_argument("--fakeredis", action="store_true")
+    args = parser.parse_args()
+
+    if args.fakeredis:
+        import fakeredis
+        client = fakeredis.FakeRedis(decode_responses=True)
+    else:
+        import redis
+        client = redis.Redis(connection_pool=redis.BlockingConnectionPool(
+            host=args.host, port=args.port, db=args.db, decode_responses=True, max_connections=4
+        ))
+        client.ping()
+
+    task_ids = [f"bench-{i:06d}" for i in range(args.tasks)]
+    print(f"{args.tasks} tarefas, lote de {args.batch}, {'fakeredis' if args.fakeredis else f'{args.host}:{args.port}/{args.db}'}")
+    columns = ("escritas/s", "leituras/s", "lote (ms)", "listagem (ms)")
+    print(f"{'Backend':<26}" + "".join(f"{name:>15}" for name in columns))
+    try:
+        for name, store in (("antes (JSON, KEYS)", LegacyStore(client)), ("depois (hash, pipeline)", NewStore(client))):
+            results = run(store, client, task_ids, args.batch)
+            print(f"{name:<26}" + "".join(f"{results[column]:>15.1f}" for column in columns))
+    finally:
+        client.flushdb()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark do motor de renderização: imagens/segundo x número de workers
+
+Compara RENDER_MODE=thread (N threads no mesmo processo, limitadas pelo GIL)
+com RENDER_MODE=process (N processos de render via memória compartilhada).
+Não usa rede: a foto de teste é gerada em memória (JPEG 3024x4032, como as
+fotos de celular) e entregue direto ao estágio de CPU.
+
+Uso:
+    python benchmarks/bench_render_engine.py [--jobs 24] [--workers 1,2,4]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PRODUCTS = [
+    {
+        "Referencia": "REF-001",
+        "DescricaoFinal": "Camiseta Premium Algodão",
+        "Preco": 99.90,
+        "PrecoPromocional": 79.90,
+        "PrecoPromocionalAVista": 75.90,
+        "TamanhosDisponiveis": "P, M, G",
+        "NumeracaoUtilizada": "M",
+    },
+    {
+        "Referencia": "REF-002",
+        "DescricaoFinal": "Calça Jeans Slim",
+        "Preco": 149.90,
+        "TamanhosDisponiveis": "38/40/42",
+        "NumeracaoUtilizada": "40",
+    },
+]
+
+
+def make_photo(width=3024, height=4032):
+    """Gera uma foto sintética (JPEG) com conteúdo variado"""
+    from PIL import Image, ImageDraw
+
+    rnd = random.Random(42)
+    image = Image.new("RGB", (width, height))
+    draw = ImageDraw.Draw(image)
+    for _ in range(300):
+        x, y = rnd.randrange(width), rnd.randrange(height)
+        size_x, size_y = rnd.randrange(50, 600), rnd.randrange(50, 600)
+        draw.ellipse([x, y, x + size_x, y + size_y], fill=(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def run_threads(processor, photo, jobs, workers):
+    ctx = processor.create_render_context()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda _: processor.render_outputs(ctx, photo, None, PRODUCTS), range(jobs)))
+    return jobs / (time.perf_counter() - started)
+
+
+def run_processes(photo, jobs, workers):
+    from app.utils.render_engine import ProcessRenderEngine
+
+    engine = ProcessRenderEngine(processes=workers)
+    engine.render(photo, None, PRODUCTS)  # sobe e aquece o pool fora da medição
+    try:
+        started = time.perf_counter()
+        # Uma thread por processo, como as threads do pool de renderização fariam
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda _: engine.render(photo, None, PRODUCTS), range(jobs)))
+        return jobs / (time.perf_counter() - started)
+    finally:
+        engine.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=24)
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, 4, os.cpu_count() or 1})))
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    from app.utils.image_processor import image_processor
+
+    photo = make_photo()
+    worker_counts = [int(n) for n in args.workers.split(",")]
+
+    print(f"Núcleos: {os.cpu_count()} | tarefas por medição: {args.jobs} | foto: {len(photo) // 1024} KB")
+    print(f"{'workers':>8} | {'thread (img/s)':>15} | {'process (img/s)':>16} | {'ganho':>6}")
+    print("-" * 56)
+    for workers in worker_counts:
+        thread_rate = run_threads(image_processor, photo, args.jobs, workers)
+        process_rate = run_processes(photo, args.jobs, workers)
+        print(f"{workers:>8} | {thread_rate:>15.2f} | {process_rate:>16.2f} | {process_rate / thread_rate:>5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
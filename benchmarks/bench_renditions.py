@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark das renditions (várias saídas numa tarefa só)
+
+Compara o fluxo de hoje - uma tarefa por formato (Stories 9:16, feed 3:4,
+miniatura), cada uma baixando/decodificando/compondo/desenhando a imagem
+inteira, e o formato final saindo de um decode + recorte + resize + novo
+encode do JPEG pronto (com a legenda encolhida junto) - com uma tarefa só
+com `renditions`: um decode, um frame com tema, legenda medida por escala e
+encodes em paralelo. Mostra tempo de CPU, tempo de parede e bytes gerados.
+
+Uso:
+    python benchmarks/bench_renditions.py [--runs 10]
+"""
+import argparse
+import logging
+import statistics
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_dual import make_inputs, make_products  # noqa: E402
+
+RENDITIONS = [
+    {"name": "stories", "width": 1080, "aspect": "9:16"},
+    {"name": "feed", "width": 1080, "aspect": "3:4", "quality": 85},
+    {"name": "thumb", "width": 240, "quality": 75},
+]
+
+
+def render_separate(processor, ctx, photo_data, theme_data, products, theme_key, renditions):
+    """Uma tarefa por formato; o formato sai do JPEG pronto"""
+    from PIL import Image
+    from app.utils.renditions import crop_box, output_size
+    from app.utils.resize import resize
+
+    outputs = {'final': processor.render_outputs(ctx, photo_data, theme_data, products, False, theme_key)['final']}
+    for rendition in renditions:
+        rendered = processor.render_outputs(ctx, photo_data, theme_data, products, False, theme_key)['final']
+        image = Image.open(BytesIO(rendered))
+        image.load()
+        box = crop_box(image.size, rendition.aspect)
+        outputs[rendition.name] = processor._encode(resize(image, output_size(rendition, box), box=box), ctx, rendition.quality)
+    return outputs
+
+
+def measure(render, runs):
+    cpu, wall, outputs = [], [], None
+    for _ in range(runs):
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        outputs = render()
+        cpu.append(time.process_time() - cpu_started)
+        wall.append(time.perf_counter() - wall_started)
+    return statistics.median(cpu), statistics.median(wall), outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    from app.utils.image_processor import image_processor
+    from app.utils.renditions import parse_renditions
+
+    photo_data, theme_data = make_inputs()
+    products = make_products(3)
+    renditions = parse_renditions(RENDITIONS)
+    ctx = image_processor.create_render_context()
+    theme_key = ("bench", "tema")
+
+    separate = lambda: render_separate(image_processor, ctx, photo_data, theme_data, products, theme_key, renditions)
+    single = lambda: image_processor.render_outputs(ctx, photo_data, theme_data, products, False, theme_key, renditions)
+    separate()
+    single()  # aquece fontes escaladas, overlay do tema e threads de encode
+
+    results = {"antes (4 tarefas)": measure(separate, args.runs), "depois (1 tarefa)": measure(single, args.runs)}
+
+    print(f"Principal + {len(renditions)} renditions ({', '.join(r.name for r in renditions)}), {args.runs} execuções")
+    print(f"{'Fluxo':<20} {'CPU':>9} {'parede':>9} {'gerado':>9} {'ganho CPU':>10}")
+    old_cpu = results["antes (4 tarefas)"][0]
+    for name, (cpu, wall, outputs) in results.items():
+        written = sum(len(data) for data in outputs.values())
+        print(f"{name:<20} {cpu * 1000:>7.1f}ms {wall * 1000:>7.1f}ms {written / 1024:>7.0f}KB {old_cpu / cpu:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos perfis de redimensionamento (RESIZE_PROFILES)
+
+Para cada fonte típica - foto JPEG de celular (com e sem draft), PNG grande
+e tema RGBA redimensionado para o tamanho da foto - mede o tempo de cada perfil
+e a PSNR contra o resultado de hoje (perfil 'qualidade', LANCZOS puro).
+Acima de ~45dB a diferença não é visível; abaixo de ~35dB começa a aparecer.
+
+Uso:
+    python benchmarks/bench_resize.py [--runs 5] [--profiles qualidade,equilibrado,rapido]
+"""
+import argparse
+import logging
+import math
+import random
+import statistics
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_source(fmt, width, height, alpha=False):
+    """Imagem sintética com bordas nítidas e gradientes (onde os filtros diferem)"""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rnd = random.Random(7)
+    image = Image.new("RGBA" if alpha else "RGB", (width, height), (0, 0, 0, 0) if alpha else (230, 225, 220))
+    draw = ImageDraw.Draw(image)
+    for _ in range(250):
+        x, y = rnd.randrange(width), rnd.randrange(height)
+        w, h = rnd.randrange(20, 400), rnd.randrange(20, 400)
+        color = (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256), rnd.randrange(120, 256))
+        if rnd.random() < 0.5:
+            draw.rectangle([x, y, x + w, y + h], fill=color)
+        else:
+            draw.ellipse([x, y, x + w, y + h], fill=color)
+    for i in range(0, width, 9):
+        draw.line([(i, 0), (i, height // 8)], fill=(20, 20, 20, 255), width=2)  # texturas finas (aliasing)
+    if not alpha:
+        image = image.filter(ImageFilter.GaussianBlur(1))
+    buffer = BytesIO()
+    image.save(buffer, fmt, **({"quality": 92} if fmt == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+def flatten(image):
+    """RGBA -> RGB sobre cinza: o RGB sob alpha=0 não aparece no resultado final"""
+    from PIL import Image
+
+    if image.mode != "RGBA":
+        return image.convert("RGB")
+    background = Image.new("RGB", image.size, (128, 128, 128))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def psnr(a, b):
+    """PSNR (dB) entre duas imagens do mesmo tamanho, sem numpy"""
+    from PIL import ImageChops
+
+    a, b = flatten(a), flatten(b)
+    histogram = ImageChops.difference(a, b).histogram()
+    mse = sum(count * (i % 256) ** 2 for i, count in enumerate(histogram)) / (a.width * a.height * 3)
+    return float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def timed(fn, runs):
+    timings, result = [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profiles", default="qualidade,equilibrado,rapido")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    from app import config
+    from app.utils.image_processor import image_processor
+
+    from PIL import Image
+    from app.utils.compositing import composite_overlay
+
+    def apply_theme(overlay):
+        # O overlay vem recortado - compor num frame cinza para comparar o resultado visível
+        return composite_overlay(Image.new("RGB", overlay.frame_size, (128, 128, 128)), overlay)
+
+    profiles = args.profiles.split(",")
+    photo_jpeg = make_source("JPEG", 3024, 4032)
+    photo_png = make_source("PNG", 2160, 2880)
+    theme_png = make_source("PNG", 2160, 3840, alpha=True)
+
+    cases = [
+        ("JPEG 3024x4032 (draft)", lambda p: image_processor._decode_image(photo_jpeg, p), True),
+        ("JPEG 3024x4032 (sem draft)", lambda p: image_processor._decode_image(photo_jpeg, p), False),
+        ("PNG 2160x2880", lambda p: image_processor._decode_image(photo_png, p), True),
+        ("Tema RGBA 2160x3840 -> 1080x1440", lambda p: apply_theme(image_processor._prepare_theme_overlay(theme_png, (1080, 1440), p)), True),
+    ]
+
+    print(f"{'Fonte':<34} {'Perfil':<12} {'tempo':>9} {'ganho':>7} {'PSNR':>9}")
+    for name, run, draft in cases:
+        config.DECODE_DRAFT = draft
+        reference_time, reference = None, None
+        for profile in profiles:
+            seconds, image = timed(lambda: run(profile), args.runs)
+            if reference is None:
+                reference_time, reference = seconds, image
+            quality = psnr(reference, image)
+            shown = "idêntico" if quality == float("inf") else f"{quality:.1f}dB"
+            print(f"{name:<34} {profile:<12} {seconds * 1000:>7.1f}ms {reference_time / seconds:>6.2f}x {shown:>9}")
+    config.DECODE_DRAFT = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark do long-poll (?wait=) contra o polling do status a intervalo fixo
+
+Simula tarefas que passam por PENDING -> PROCESSING -> COMPLETED (tempos de
+render sorteados) e clientes consultando o status pelo cliente de teste do
+Flask: polling a cada --poll-ms, como o supabase-edge-function.ts fazia, e
+long-poll com ?wait=. Mostra o atraso entre o COMPLETED e o cliente saber
+dele, as requisições por tarefa e as leituras do task store por tarefa.
+
+Uso:
+    python benchmarks/bench_status_wait.py [--tasks 20] [--poll-ms 2000]
+"""
+import argparse
+import logging
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def simulate_task(task_manager, task_id, render_seconds, completed_at):
+    """Transições que o job_queue faria, com o render durando render_seconds"""
+    task_manager.update_task_status(task_id, "PENDING")
+    time.sleep(0.05)
+    task_manager.update_task_status(task_id, "PROCESSING")
+    time.sleep(render_seconds)
+    task_manager.update_task_status(task_id, "COMPLETED", final_path=f"/tmp/{task_id}.jpg")
+    completed_at[task_id] = time.perf_counter()
+
+
+def poll(client, task_id, query, interval):
+    """Consulta até COMPLETED; devolve (momento em que soube, requisições)"""
+    requests_made = 0
+    while True:
+        requests_made += 1
+        status = client.get(f"/api/v1/status/{task_id}{query}").get_json()
+        if status["status"] == "COMPLETED":
+            return time.perf_counter(), requests_made
+        if interval:
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--poll-ms", type=int, default=2000)
+    parser.add_argument("--wait", type=int, default=25)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    from app.main import app
+    from app.utils.task_manager import task_manager
+
+    client = app.test_client()
+    reads = [0]
+    original_get = task_manager.get_task_status
+
+    def counting_get(*a, **kw):
+        reads[0] += 1
+        return original_get(*a, **kw)
+    task_manager.get_task_status = counting_get
+
+    rng = random.Random(42)
+    render_times = [rng.uniform(0.5, 4.0) for _ in range(args.tasks)]
+    flows = {
+        f"polling {args.poll_ms}ms": ("", args.poll_ms / 1000),
+        f"long-poll wait={args.wait}": (f"?wait={args.wait}", 0),
+    }
+    print(f"{args.tasks} tarefas simultâneas, render entre 0.5s e 4s")
+    print(f"{'Fluxo':<22} {'atraso mediano':>15} {'atraso máx':>11} {'requisições':>12} {'leituras':>9}")
+    for name, (query, interval) in flows.items():
+        completed_at, reads[0] = {}, 0
+        task_ids = [f"bench-wait-{name[:4]}-{i}" for i in range(args.tasks)]
+        with ThreadPoolExecutor(max_workers=args.tasks * 2) as pool:
+            for task_id, seconds in zip(task_ids, render_times):
+                pool.submit(simulate_task, task_manager, task_id, seconds, completed_at)
+            time.sleep(0.02)  # tarefas criadas antes da primeira consulta
+            results = list(pool.map(lambda t: poll(client, t, query, interval), task_ids))
+        delays = [(known - completed_at[t]) * 1000 for t, (known, _) in zip(task_ids, results)]
+        print(f"{name:<22} {statistics.median(delays):>13.0f}ms {max(delays):>9.0f}ms "
+              f"{statistics.mean(r for _, r in results):>12.1f} {reads[0] / args.tasks:>9.1f}")
+        for task_id in task_ids:
+            task_manager.delete_task_status(task_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark do /api/v1/render (síncrono) contra o fluxo 202 -> status -> download
+
+Sobe um servidor HTTP local com a foto e o tema (cache de downloads desligado
+para os dois fluxos pagarem o mesmo download) e mede, pelo cliente de teste do
+Flask, a latência até ter os bytes da imagem de um produto na mão, as
+requisições feitas e as escritas no task store. O fluxo assíncrono consulta o
+status a cada --poll-ms, como os clientes fazem hoje.
+
+Uso:
+    python benchmarks/bench_sync_render.py [--runs 10] [--poll-ms 100]
+"""
+import argparse
+import functools
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_dual import make_inputs, make_products  # noqa: E402
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_inputs():
+    """Foto e tema num servidor HTTP local; devolve a URL base"""
+    workdir = tempfile.mkdtemp(prefix="bench_sync_render_")
+    photo, theme = make_inputs()
+    for name, data in (("photo.jpg", photo), ("theme.png", theme)):
+        with open(os.path.join(workdir, name), "wb") as f:
+            f.write(data)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=workdir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run_async(client, payload, poll):
+    """POST /process-image, consulta o status até COMPLETED, baixa a imagem"""
+    requests_made = 1
+    accepted = client.post("/api/v1/process-image", json=payload).get_json()
+    while True:
+        time.sleep(poll)
+        requests_made += 1
+        status = client.get(accepted["status_url"]).get_json()
+        if status["status"] in ("COMPLETED", "FAILED"):
+            break
+    url = status["final_image_url"]
+    image = client.get(url[url.index("/processed_images"):]).data
+    return image, requests_made + 1
+
+
+def run_sync(client, payload):
+    response = client.post("/api/v1/render?deadline_ms=10000", json=payload)
+    assert response.status_code == 200, response.status_code
+    return response.data, 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--poll-ms", type=int, default=100)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    from app import config
+    config.DOWNLOAD_CACHE_ENABLED = False
+    from app.main import app
+    from app.utils.task_manager import task_manager
+
+    base_url = serve_inputs()
+    payload = {
+        "products": [dict(p, PrecoPromocional=0) for p in make_products(1)],  # modo simples: uma imagem
+        "original_image_url": f"{base_url}/photo.jpg",
+        "theme_url": f"{base_url}/theme.png",
+    }
+    client = app.test_client()
+
+    # Contar escritas no task store (update/delete de status)
+    writes = [0]
+    for method in ("update_task_status", "delete_task_status"):
+        original = getattr(task_manager, method)
+
+        def counting(*a, _original=original, **kw):
+            writes[0] += 1
+            return _original(*a, **kw)
+        setattr(task_manager, method, counting)
+
+    flows = {
+        "202 + status + GET": lambda: run_async(client, payload, args.poll_ms / 1000),
+        "/api/v1/render": lambda: run_sync(client, payload),
+    }
+    print(f"1 produto, {args.runs} execuções, polling a cada {args.poll_ms}ms")
+    print(f"{'Fluxo':<20} {'latência':>10} {'requisições':>12} {'escritas status':>16} {'bytes':>9}")
+    for name, flow in flows.items():
+        flow()  # aquece fontes, pool e threads de encode
+        timings, writes[0] = [], 0
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            image, requests_made = flow()
+            timings.append(time.perf_counter() - started)
+        print(f"{name:<20} {statistics.median(timings) * 1000:>8.0f}ms {requests_made:>12} "
+              f"{writes[0] / args.runs:>16.1f} {len(image) / 1024:>7.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
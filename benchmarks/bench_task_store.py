@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark do armazenamento de tarefas (SQLite WAL) com muitas tarefas gravadas
+
+Mede consultas de status/segundo (o polling do edge function), transições de
+status/segundo e o tempo da limpeza de tarefas antigas, e compara com o
+esquema antigo de arquivo JSON (reler/reescrever tudo a cada chamada).
+
+Uso:
+    python benchmarks/bench_task_store.py [--tasks 100000] [--polls 20000]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def fake_task(task_id):
+    return {
+        "status": "COMPLETED",
+        "task_id": task_id,
+        "timestamp": "2024-01-15T10:30:00",
+        "final_path": f"/tmp/{task_id}.jpg",
+        "normal_path": None,
+        "error": None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--polls", type=int, default=20000)
+    parser.add_argument("--json-polls", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    from app import config
+    config.USE_REDIS = False
+    from app.utils.task_manager import TaskManager
+
+    workdir = tempfile.mkdtemp(prefix="bench_tasks_")
+    manager = TaskManager(db_path=os.path.join(workdir, "tasks.sqlite3"))
+    task_ids = [f"task-{i}" for i in range(args.tasks)]
+
+    started = time.perf_counter()
+    manager.store.put_many({task_id: fake_task(task_id) for task_id in task_ids})
+    print(f"Carga inicial: {args.tasks} tarefas em {time.perf_counter() - started:.2f}s")
+
+    rnd = random.Random(1)
+    started = time.perf_counter()
+    for _ in range(args.polls):
+        manager.get_task_status(rnd.choice(task_ids))
+    sqlite_polls = args.polls / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(args.polls // 4):
+        manager.update_task_status(rnd.choice(task_ids), "PROCESSING")
+    sqlite_updates = (args.polls // 4) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    manager.cleanup_old_tasks(max_age_hours=1)
+    sqlite_cleanup = time.perf_counter() - started
+
+    # Esquema antigo: json.load do arquivo inteiro a cada consulta
+    json_file = os.path.join(workdir, "tasks_db.json")
+    with open(json_file, "w") as f:
+        json.dump({task_id: fake_task(task_id) for task_id in task_ids}, f)
+    started = time.perf_counter()
+    for _ in range(args.json_polls):
+        with open(json_file) as f:
+            json.load(f).get(rnd.choice(task_ids))
+    json_polls = args.json_polls / (time.perf_counter() - started)
+
+    print(f"{'operação':<28} | {'SQLite WAL':>12} | {'JSON antigo':>12}")
+    print("-" * 58)
+    print(f"{'consultas de status/s':<28} | {sqlite_polls:>12.0f} | {json_polls:>12.1f}")
+    print(f"{'atualizações de status/s':<28} | {sqlite_updates:>12.0f} | {'-':>12}")
+    print(f"{'limpeza (s)':<28} | {sqlite_cleanup:>12.4f} | {'-':>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,9 @@ import { corsHeaders } from "https://deno.land/std@0.168.0/http/cors.ts";
 
 // Configurar variáveis de ambiente no console Supabase
 const MICROSERVICE_URL = Deno.env.get("MICROSERVICE_URL") || "http://localhost:5001";
-const MAX_POLLING_ATTEMPTS = 60;  // 2 minutos com 2s de intervalo
-const POLLING_INTERVAL = 2000;    // 2 segundos
+const MAX_POLLING_ATTEMPTS = 10;  // long-poll: cada consulta espera até STATUS_WAIT segundos
+const STATUS_WAIT = 25;           // segundos (o servidor limita a STATUS_MAX_WAIT)
+const POLLING_INTERVAL = 500;     // pausa curta entre uma consulta e a próxima
 
 interface ProductData {
   Referencia: string;
@@ -34,7 +35,7 @@ interface ProcessImageResponse {
   task_id: string;
 }
 
-// Função auxiliar: polling de status
+// Função auxiliar: polling de status (long-poll com ?wait=)
 async function pollStatus(
   taskId: string,
   maxAttempts: number = MAX_POLLING_ATTEMPTS
@@ -45,7 +46,7 @@ async function pollStatus(
 }> {
   for (let attempt = 0; attempt < maxAttempts; attempt++) {
     const statusResponse = await fetch(
-      `${MICROSERVICE_URL}/api/v1/status/${taskId}`
+      `${MICROSERVICE_URL}/api/v1/status/${taskId}?wait=${STATUS_WAIT}`
     );
 
     if (!statusResponse.ok) {
@@ -0,0 +1,13 @@
+"""
+Configuração dos testes: bancos, cache e resultados num diretório temporário,
+definidos antes de importar o app (config lê o ambiente na importação)
+"""
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix='image-service-tests-')
+os.environ.setdefault('USE_REDIS', 'False')
+os.environ.setdefault('TASK_QUEUE_BACKEND', 'thread')
+os.environ.setdefault('TASKS_DB_PATH', os.path.join(_TMP, 'tasks_db.sqlite3'))
+os.environ.setdefault('WEBHOOK_DB_PATH', os.path.join(_TMP, 'webhooks.sqlite3'))
+os.environ.setdefault('DOWNLOAD_CACHE_DIR', os.path.join(_TMP, 'download_cache'))
@@ -0,0 +1,213 @@
+"""
+Alimentação de lotes no pool local: lease no registro do lote, retomada por
+outro processo quando o lease vence, adiamento com a fila cheia e o
+compare-and-set dos registros (SQLite e Redis via fakeredis)
+"""
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from app import config
+from app.utils import job_queue
+from app.utils.render_pool import RenderPool, QueueFullError
+from app.utils.task_manager import TaskManager, _SQLiteStore, _RedisStore
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return _SQLiteStore(str(tmp_path / 'tasks.sqlite3'))
+    return _RedisStore(fakeredis.FakeRedis(decode_responses=True))
+
+
+@pytest.fixture
+def manager(store, tmp_path):
+    manager = TaskManager(db_path=str(tmp_path / 'unused.sqlite3'))
+    manager.store = store
+    return manager
+
+
+class _Pool:
+    """render_pool de mentira: guarda o que foi despachado; as futures terminam quando o teste mandar"""
+
+    def __init__(self):
+        self.submitted = []
+        self.futures = []
+
+    def try_submit(self, fn, task_id, *args):
+        future = Future()
+        self.submitted.append(task_id)
+        self.futures.append(future)
+        return future
+
+    def retry_after(self):
+        return 0.01
+
+    def finish_all(self):
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.set_result(None)
+
+
+def _clock(offset):
+    """Substituto do módulo time em job_queue, adiantado em offset segundos"""
+    return SimpleNamespace(time=lambda: time.time() + offset, sleep=time.sleep)
+
+
+def test_expired_lease_is_adopted_by_another_keeper(manager, monkeypatch):
+    pool = _Pool()
+    monkeypatch.setattr(config, 'BATCH_CONCURRENCY', 10)
+    monkeypatch.setattr(job_queue, 'task_manager', manager)
+    monkeypatch.setattr(job_queue, 'render_pool', pool)
+
+    jobs = [(f"t{i}", ["produtos", f"http://origem/{i}.jpg"]) for i in range(3)]
+    manager.create_batch('b1', [task_id for task_id, _ in jobs])
+    manager.update_task_status('t0', 'COMPLETED')
+
+    # Processo que começou o lote e caiu: o lease dele já venceu
+    assert manager.start_batch_feed('b1', jobs, time.time() - 1)
+    assert not manager.start_batch_feed('b1', jobs, time.time() + 60)
+
+    keeper_a = job_queue._BatchKeeper()
+    monkeypatch.setattr(job_queue, 'batch_keeper', keeper_a)
+    keeper_a._resume_orphans()
+    assert pool.submitted == ['t1', 't2']  # t0 já tinha terminado
+    assert keeper_a.stats() == {"feeding": 1, "resumed": 1}
+    feeder_a = keeper_a._feeders['b1']
+
+    # Com o lease de A em dia, B não mexe no lote
+    keeper_b = job_queue._BatchKeeper()
+    monkeypatch.setattr(job_queue, 'batch_keeper', keeper_b)
+    keeper_b._resume_orphans()
+    assert keeper_b.stats()["resumed"] == 0
+
+    # A travou e não renovou: depois do vencimento B assume
+    monkeypatch.setattr(job_queue, 'time', _clock(config.BATCH_LEASE_SECONDS + 1))
+    keeper_b._resume_orphans()
+    assert keeper_b.stats() == {"feeding": 1, "resumed": 1}
+    assert pool.submitted == ['t1', 't2', 't1', 't2']
+    lease_b = keeper_b._feeders['b1'].lease_until
+    futures_a, futures_b = pool.futures[:2], pool.futures[2:]
+
+    # A volta, não consegue renovar e para de despachar sem encerrar o lote de B
+    monkeypatch.setattr(job_queue, 'batch_keeper', keeper_a)
+    feeder_a.renew()
+    assert keeper_a.stats()["feeding"] == 0
+    for future in futures_a:
+        future.set_result(None)
+    assert manager.unfed_batches()['b1']['lease_until'] == lease_b
+
+    monkeypatch.setattr(job_queue, 'batch_keeper', keeper_b)
+    for future in futures_b:
+        future.set_result(None)
+    assert manager.unfed_batches() == {}
+    assert keeper_b.stats()["feeding"] == 0
+    batch, _ = manager.get_batch('b1')
+    assert 'jobs' not in batch and 'lease_until' not in batch
+
+
+def test_try_submit_defers_without_counting_a_rejection():
+    pool = RenderPool(max_workers=1, max_queue_size=1)
+    started, release = threading.Event(), threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    try:
+        pool.submit(blocker)
+        assert started.wait(5)
+        pool.submit(lambda: None)  # ocupa a única vaga da fila
+
+        assert pool.try_submit(lambda: None) is None
+        assert pool.stats()["deferred"] == 1
+        assert pool.stats()["rejected"] == 0
+
+        with pytest.raises(QueueFullError):
+            pool.submit(lambda: None)
+        assert pool.stats()["rejected"] == 1
+    finally:
+        release.set()
+
+
+def test_batch_feeder_waits_for_room_in_a_full_queue(monkeypatch):
+    pool = RenderPool(max_workers=1, max_queue_size=1)
+    monkeypatch.setattr(pool, 'retry_after', lambda: 0.02)
+    started, release = threading.Event(), threading.Event()
+    done = []
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(job_queue, 'render_pool', pool)
+    monkeypatch.setattr(job_queue, 'image_processor', SimpleNamespace(process_image=lambda task_id, *args: done.append(task_id)))
+    monkeypatch.setattr(job_queue, 'batch_keeper', job_queue._BatchKeeper())
+    monkeypatch.setattr(config, 'BATCH_CONCURRENCY', 2)
+
+    pool.submit(blocker)
+    assert started.wait(5)
+    pool.submit(lambda: None)  # fila cheia por uma requisição avulsa
+
+    job_queue._BatchFeeder('b2', [(f"t{i}", []) for i in range(3)]).start()
+    time.sleep(0.1)
+    assert pool.stats()["deferred"] >= 1
+    release.set()
+
+    deadline = time.time() + 5
+    while len(done) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert sorted(done) == ['t0', 't1', 't2']
+    assert pool.stats()["rejected"] == 0
+
+
+def test_only_one_concurrent_claim_wins(store):
+    for attempt in range(10):
+        key = f"batch:c{attempt}"
+        store.put(key, {"batch_id": f"c{attempt}", "task_ids": []})
+        barrier = threading.Barrier(8)
+        results = {}
+
+        def claim(idx):
+            barrier.wait()
+            results[idx] = store.compare_and_update(key, 'lease_until', None, {'lease_until': idx + 0.5})
+
+        threads = [threading.Thread(target=claim, args=(idx,)) for idx in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        winners = [idx for idx, won in results.items() if won]
+        assert len(winners) == 1
+        assert store.get(key)['lease_until'] == winners[0] + 0.5
+
+
+def test_redis_claim_fails_when_the_record_changes_mid_transaction(monkeypatch):
+    server = fakeredis.FakeServer()
+    store = _RedisStore(fakeredis.FakeRedis(server=server, decode_responses=True))
+    other = _RedisStore(fakeredis.FakeRedis(server=server, decode_responses=True))
+    store.put('batch:w', {"batch_id": "w", "task_ids": []})
+
+    original_pipeline = store.client.pipeline
+
+    def pipeline(*args, **kwargs):
+        watched = original_pipeline(*args, **kwargs)
+        read = watched.hget
+
+        def hget(*hget_args):
+            value = read(*hget_args)
+            # Outro processo toma o lote entre o WATCH e o MULTI
+            assert other.compare_and_update('batch:w', 'lease_until', None, {'lease_until': 2.0})
+            return value
+
+        watched.hget = hget
+        return watched
+
+    monkeypatch.setattr(store.client, 'pipeline', pipeline)
+    assert store.compare_and_update('batch:w', 'lease_until', None, {'lease_until': 1.0}) is False
+    assert other.get('batch:w')['lease_until'] == 2.0
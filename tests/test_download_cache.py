@@ -0,0 +1,200 @@
+"""
+Cache de downloads: single-flight entre threads, lock por URL que some do disco
+enquanto alguém espera, despejo LRU sob evict.lock e conexões devolvidas ao pool
+"""
+import io
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+from PIL import Image
+
+from app.utils.download_cache import DownloadCache
+
+fcntl = pytest.importorskip('fcntl')
+
+
+def _noise_png(seed):
+    """PNG de ruído (conteúdo diferente para cada seed, não comprime)"""
+    pixels = bytes((seed * 131 + i * 7919) % 251 for i in range(48 * 48 * 3))
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (48, 48), pixels).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def origin():
+    """Servidor HTTP local: /img/<n>.png com max-age e um atraso para juntar pedidos simultâneos"""
+    images = {f"/img/{n}.png": _noise_png(n) for n in range(4)}
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            hits.append(self.path)
+            body = images.get(self.path)
+            if body is None:
+                self.send_response(404)
+                self.send_header('Content-Length', '9')
+                self.end_headers()
+                self.wfile.write(b'not found')
+                return
+            time.sleep(0.2)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Cache-Control', 'max-age=300')
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    yield base, images, hits
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DownloadCache(cache_dir=str(tmp_path / 'cache'), max_bytes=10 * 1024 * 1024, default_ttl=300, enabled=True)
+
+
+def test_concurrent_fetches_of_the_same_url_download_once(cache, origin):
+    base, images, hits = origin
+    url = f"{base}/img/0.png"
+    barrier = threading.Barrier(6)
+    results = []
+
+    def fetch():
+        barrier.wait()
+        results.append(cache.fetch(url).data)
+
+    threads = [threading.Thread(target=fetch) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert hits == ['/img/0.png']
+    assert results == [images['/img/0.png']] * 6
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] + stats["hits"] == 5
+
+
+def test_lock_removed_while_waiting_is_not_trusted(cache):
+    """
+    Quem esperava no lock de um arquivo que saiu do caminho não pode entrar
+    junto com quem já pegou o lock do arquivo novo
+    """
+    lock_path = cache._lock_path('k')
+    order = []
+    a_in, a_release = threading.Event(), threading.Event()
+    c_in, c_release = threading.Event(), threading.Event()
+
+    def holder_a():
+        with cache._locked('k'):
+            a_in.set()
+            a_release.wait(5)
+
+    def waiter_b():
+        with cache._locked('k'):
+            order.append('B in')
+
+    def holder_c():
+        with cache._locked('k'):
+            order.append('C in')
+            c_in.set()
+            c_release.wait(5)
+            order.append('C out')
+
+    a = threading.Thread(target=holder_a)
+    a.start()
+    assert a_in.wait(5)
+    b = threading.Thread(target=waiter_b)
+    b.start()
+    time.sleep(0.1)  # B abriu o arquivo antigo e espera o flock
+
+    os.unlink(lock_path)  # despejo apagou o lock
+    c = threading.Thread(target=holder_c)
+    c.start()
+    assert c_in.wait(5)  # C pegou o lock do arquivo novo
+
+    a_release.set()
+    a.join(5)
+    time.sleep(0.2)
+    assert 'B in' not in order  # B ganhou o flock do arquivo antigo, mas não entrou
+
+    c_release.set()
+    for thread in (b, c):
+        thread.join(5)
+    assert order == ['C in', 'C out', 'B in']
+
+
+def test_eviction_runs_under_evict_lock_and_spares_in_flight_files(cache, origin):
+    base, images, _ = origin
+    urls = [f"{base}/img/{n}.png" for n in range(4)]
+    for age, url in enumerate(urls):
+        cache.fetch(url)
+        blob = cache._blob_path(cache._read_meta(cache._url_key(url))['digest'])
+        os.utime(blob, (time.time(), time.time() - 100 + age))  # 0 é o acessado há mais tempo
+
+    # Escritas em andamento em outro worker (temporários de _write_atomic)
+    index_tmp = os.path.join(cache.cache_dir, 'index', '.tmp-inflight')
+    blobs_tmp = os.path.join(cache.cache_dir, 'blobs', 'ab', '.tmp-inflight')
+    os.makedirs(os.path.dirname(blobs_tmp), exist_ok=True)
+    for path in (index_tmp, blobs_tmp):
+        with open(path, 'wb') as f:
+            f.write(b'x' * 1024)
+
+    # Lock da URL mais antiga seguro por outro worker (baixando de novo agora)
+    keys = [cache._url_key(url) for url in urls]
+    held = open(cache._lock_path(keys[0]), 'a+')
+    fcntl.flock(held, fcntl.LOCK_EX)
+
+    newest = sum(len(images[f"/img/{n}.png"]) for n in (2, 3))
+    cache.max_bytes = int(newest / 0.9) + 2
+
+    # Outro worker já está despejando: este não faz nada
+    evicting = open(os.path.join(cache.cache_dir, 'locks', 'evict.lock'), 'a+')
+    fcntl.flock(evicting, fcntl.LOCK_EX)
+    cache._evict_if_needed()
+    assert cache.stats()["evictions"] == 0
+    fcntl.flock(evicting, fcntl.LOCK_UN)
+    evicting.close()
+
+    try:
+        cache._evict_if_needed()
+    finally:
+        fcntl.flock(held, fcntl.LOCK_UN)
+        held.close()
+
+    assert cache.stats()["evictions"] == 2
+    assert [cache._read_meta(key) is not None for key in keys] == [False, False, True, True]
+    assert os.path.exists(cache._lock_path(keys[0]))  # em uso: fica
+    assert not os.path.exists(cache._lock_path(keys[1]))  # sem dono: apagado
+    assert os.path.exists(cache._lock_path(keys[2]))
+    assert os.path.exists(index_tmp) and os.path.exists(blobs_tmp)
+    assert cache.stats()["disk_bytes"] <= cache.max_bytes
+
+
+def test_failed_download_closes_the_streamed_response(cache, origin, monkeypatch):
+    base, _, _ = origin
+    responses = []
+    download = cache._download
+
+    def tracked(url, headers=None):
+        response = download(url, headers)
+        responses.append(response)
+        return response
+
+    monkeypatch.setattr(cache, '_download', tracked)
+    with pytest.raises(requests.HTTPError):
+        cache.fetch(f"{base}/missing.png")
+    assert responses[0].raw.closed
@@ -0,0 +1,26 @@
+"""
+Worker RQ para Produção (TASK_QUEUE_BACKEND=rq)
+Consome a fila de renderização no Redis - rode quantas instâncias quiser,
+independente do número de workers web do gunicorn:
+
+    python worker.py
+"""
+import sys
+import os
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rq import Worker
+from app import config
+from app.utils.job_queue import get_redis_connection
+from app.utils.webhooks import webhook_dispatcher
+
+if __name__ == "__main__":
+    # Entrega dos webhooks no processo principal (os jobs rodam em processos filhos
+    # que só gravam na outbox)
+    webhook_dispatcher.start()
+    connection = get_redis_connection()
+    worker = Worker([config.RQ_QUEUE_NAME], connection=connection)
+    # Scheduler ligado: as novas tentativas (MAX_RETRIES) são agendadas com intervalo
+    worker.work(with_scheduler=True)